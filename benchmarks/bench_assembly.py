@@ -0,0 +1,80 @@
+'''
+Benchmark of the sheet assembly stage of DailyActionsWrangling.
+
+Compares the previous incremental pd.concat loop against assemble_sheets plus
+sort_rows on synthetic sheets (8 sheets x 100k rows by default).
+
+    python benchmarks/bench_assembly.py [rows_per_sheet]
+'''
+import sys
+import time
+import numpy as np
+import pandas as pd
+from src.utils import DAILY_ACTIONS_SHEET_DICT
+from src.data.make_dataset import DailyActionsWrangling
+
+
+def synthetic_sheet(n_rows, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Usuario': rng.integers(0, 500, n_rows).astype(str),
+        'Tipo Usuario': rng.choice(['Enlace', 'Coordinador', 'Delegado'],
+                                   n_rows),
+        'Departamento': rng.integers(0, 33, n_rows).astype(str),
+        'Municipio': rng.integers(0, 1100, n_rows).astype(str),
+        'Actividades rutinarias': rng.integers(0, 10**6, n_rows).astype(str),
+        'Fecha': rng.integers(1, 28, n_rows).astype(str),
+    })
+
+
+def legacy_assemble(sheet_dict, sheets):
+    # Implementación anterior: concat incremental + mapeo de SheetOrder
+    sheet_names = list(sheet_dict.keys())
+    sheet_order = {sheet: i for i, sheet in enumerate(sheet_names)}
+    df = pd.DataFrame()
+    for sheet, df_new in zip(sheet_names, sheets):
+        df_new = df_new.copy()
+        df_new['SheetOrder'] = sheet_order.get(sheet, float('inf'))
+        df = pd.concat([df, df_new], axis=0)
+    df.sort_values(['SheetOrder', 'Departamento', 'Municipio'], inplace=True)
+    df['Acción'] = df['SheetOrder'].map({v: k for k, v in sheet_order.items()})
+    df['Acción'] = df['Acción'].replace(sheet_dict)
+    df.drop(columns=['SheetOrder'], inplace=True)
+    return df
+
+
+def assemble_and_sort(sheet_dict, sheets):
+    # Rows are now sorted after cleaning; sorted here to compare the same work
+    df = DailyActionsWrangling.assemble_sheets(sheet_dict, sheets)
+    return DailyActionsWrangling.sort_rows(df)
+
+
+def timeit(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(n_rows=100_000):
+    sheets = [synthetic_sheet(n_rows, seed)
+              for seed in range(len(DAILY_ACTIONS_SHEET_DICT))]
+
+    legacy_time, legacy = timeit(legacy_assemble, DAILY_ACTIONS_SHEET_DICT,
+                                 sheets)
+    new_time, new = timeit(assemble_and_sort, DAILY_ACTIONS_SHEET_DICT, sheets)
+
+    # Same rows in the same order
+    pd.testing.assert_frame_equal(legacy.reset_index(drop=True).astype(object),
+                                  new.astype(object))
+
+    print(f"{len(sheets)} sheets x {n_rows} rows")
+    print(f"legacy concat loop: {legacy_time:.3f} s")
+    print(f"assemble + sort:    {new_time:.3f} s")
+    print(f"speedup:            {legacy_time / new_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
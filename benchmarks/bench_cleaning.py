@@ -0,0 +1,51 @@
+'''
+Parity check and benchmark of the column cleaning stage.
+
+Every column is cleaned with the per-cell clean_column path and with the
+vectorized clean_series path; the outputs must be identical value by value.
+
+    python benchmarks/bench_cleaning.py [n_rows]
+'''
+import os
+import sys
+import time
+from src.data.make_dataset import DailyActionsWrangling
+
+# The synthetic columns are shared with the tests
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+from synthetic import synthetic_columns  # noqa: E402
+
+
+def check_parity(columns):
+    for name, s in columns.items():
+        legacy = s.apply(DailyActionsWrangling.clean_column)
+        vectorized = DailyActionsWrangling.clean_series(s)
+        legacy_values = legacy.astype(object).tolist()
+        vectorized_values = vectorized.astype(object).tolist()
+        assert all(type(v) is str for v in vectorized_values), name
+        assert ([v.encode() for v in legacy_values]
+                == [v.encode() for v in vectorized_values]), name
+        assert legacy.dtype == vectorized.dtype, name
+
+
+def main(n_rows=1_000_000):
+    columns = synthetic_columns(n_rows)
+    check_parity(synthetic_columns(10_000, seed=7))
+    check_parity(columns)
+    print(f"parity: ok ({len(columns)} columns)")
+
+    for name, s in columns.items():
+        start = time.perf_counter()
+        s.apply(DailyActionsWrangling.clean_column)
+        legacy_time = time.perf_counter() - start
+        start = time.perf_counter()
+        DailyActionsWrangling.clean_series(s)
+        new_time = time.perf_counter() - start
+        print(f"{name:<24} clean_column: {legacy_time:.3f} s"
+              f"   clean_series: {new_time:.3f} s"
+              f"   speedup: {legacy_time / new_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
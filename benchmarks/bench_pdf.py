@@ -0,0 +1,165 @@
+'''
+Benchmark of the PDF export: the previous single-table generate_pdf against
+the paged, streaming src.visualization.pdf_report.generate_pdf, with the
+former fixed column widths and with its automatic ones.
+
+    python benchmarks/bench_pdf.py [--memory] [n_rows ...]
+
+Peak memory is traced with tracemalloc only with --memory, since tracing
+slows reportlab down several times.
+'''
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from io import BytesIO
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import (SimpleDocTemplate, Table, TableStyle, Image,
+                                Paragraph)
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_LEFT
+from src.visualization.batch_reports import page_count
+from src.visualization.pdf_report import format_date, generate_pdf
+
+# Column widths of generate_pdf before they were sized on the data
+FIXED_COL_WIDTHS = [40, 45, 55, 55, 120, 55, 180]
+
+
+def synthetic_report(n_rows, seed=123):
+    rng = np.random.default_rng(seed)
+    words = np.array(['reunión', 'con', 'la', 'comunidad', 'de', 'fe', 'para',
+                      'el', 'seguimiento', 'del', 'plan', 'municipal',
+                      'libertad', 'religiosa'])
+    activities = [' '.join(rng.choice(words, k))
+                  for k in rng.integers(2, 40, n_rows)]
+    days = rng.integers(1, 29, n_rows)
+    months = rng.integers(1, 13, n_rows)
+    return pd.DataFrame({
+        'Elemento esencial LR': rng.choice(
+            ['PPLR', 'Cooperación', 'Participación Política'], n_rows),
+        'Fecha': [f'{d}/{m}/2024' for d, m in zip(days, months)],
+        'Departamento': rng.choice(
+            ['Antioquia', 'Valle del Cauca', 'Norte de Santander'], n_rows),
+        'Municipio': rng.choice(
+            ['Medellín', 'Cali', 'San José de Cúcuta', 'Bello'], n_rows),
+        'Tipo usuario': rng.choice(['Enlace', 'Coordinador departamental'],
+                                   n_rows),
+        'Usuario': rng.choice(['Ana María Pérez', 'Juan Gómez'], n_rows),
+        'Acción diaria': activities,
+    })
+
+
+def legacy_generate_pdf(df):
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter),
+                            leftMargin=5, rightMargin=5, topMargin=15,
+                            bottomMargin=15)
+
+    title_style = ParagraphStyle(
+        'Title',
+        fontName='Times-Bold',
+        fontSize=12,
+        alignment=TA_LEFT,
+        spaceAfter=10
+    )
+
+    subtitle_style = ParagraphStyle(
+        'Subtitle',
+        fontName='Times-Bold',
+        fontSize=10,
+        alignment=TA_LEFT,
+        spaceAfter=10
+    )
+
+    custom_paragraph_style = ParagraphStyle(
+        'Custom',
+        fontName='Times-Roman',
+        fontSize=7,
+        leading=9,
+        alignment=TA_LEFT,
+        wordWrap='CJK',
+        maxLineLength=None,
+    )
+
+    data = [[Paragraph(str(col), custom_paragraph_style)
+             for col in df.columns]]
+    for i, row in df.iterrows():
+        data.append([Paragraph(str(cell), custom_paragraph_style)
+                     for cell in row])
+
+    col_widths = [40, 45, 55, 55, 120, 55, 180]
+
+    table = Table(data, colWidths=col_widths, repeatRows=1)
+
+    style = TableStyle([
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('BOX', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 7),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('WORDWRAP', (0, 0), (-1, -1), 1),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT')
+    ])
+    table.setStyle(style)
+
+    logo = Image("reports/figures/Logo_Partido.jpeg", width=60, height=35)
+
+    title = Paragraph("Acciones de Libertad Religiosa, Consolidado Nacional",
+                      title_style)
+    formatted_date = format_date()
+    subtitle_text = f"Cohorte {formatted_date}"
+    subtitle = Paragraph(subtitle_text, subtitle_style)
+
+    empty_paragraph = Paragraph("<br/><br/>", custom_paragraph_style)
+
+    header_layout = Table([[title, logo], [subtitle, '']], colWidths=[450, 90])
+
+    header_layout.setStyle(TableStyle([
+        ('SPAN', (0, 0), (0, 0)),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ALIGN', (1, 0), (1, 0), 'RIGHT')
+    ]))
+
+    elements = [header_layout, empty_paragraph, table]
+    doc.build(elements)
+    buffer.seek(0)
+    return buffer
+
+
+def measure(func, df, memory=False):
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    buffer = func(df)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return elapsed, peak, buffer.getvalue()
+
+
+def main(sizes, memory=False):
+    for n_rows in sizes:
+        df = synthetic_report(n_rows)
+        for name, func in [('legacy', legacy_generate_pdf),
+                           ('fixed', lambda df: generate_pdf(
+                               df, col_widths=FIXED_COL_WIDTHS)),
+                           ('streaming', generate_pdf)]:
+            elapsed, peak, pdf = measure(func, df, memory)
+            peak = f"  peak {peak:8.1f} MiB" if peak is not None else ''
+            pages = page_count(pdf)
+            print(f"{n_rows:>7} rows  {name:<10} {elapsed:8.2f} s{peak}"
+                  f"  pdf {len(pdf) / 2**20:6.1f} MiB  {pages:>6} pages"
+                  f"  {1000 * elapsed / pages:6.1f} ms/page", flush=True)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    memory = '--memory' in args
+    sizes = [int(n) for n in args if n != '--memory']
+    main(sizes or [1_000, 10_000, 50_000], memory)
@@ -0,0 +1,80 @@
+'''
+Cold-start cost of the app: imports a module in fresh interpreters with
+python -X importtime and reports its import time, the top-level packages
+taking the most of it, and which of HEAVY_MODULES were loaded (they should
+only be imported when their feature is first used).
+
+    python benchmarks/import_time.py [--module streamlit_app] [--repeat 5]
+
+run_benchmarks.py records the same measure as 'import streamlit_app'.
+'''
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the app must not import at start-up
+HEAVY_MODULES = ['reportlab', 'gspread', 'google.auth', 'google_auth_oauthlib',
+                 'xlsxwriter']
+
+
+def import_times(module):
+    '''
+    Import module in a fresh interpreter. Returns its cumulative import time
+    (seconds) and the self and cumulative seconds of every module imported.
+    '''
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own) / 1e6, int(cumulative) / 1e6)
+    return modules[module][1], modules
+
+
+def heavy_modules(modules):
+    return [m for m in HEAVY_MODULES if m in modules]
+
+
+def by_package(modules):
+    '''
+    Self import seconds summed by top-level package, largest first
+    '''
+    totals = defaultdict(float)
+    for name, (own, _) in modules.items():
+        totals[name.split('.')[0]] += own
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='streamlit_app')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    times = [seconds for seconds, _ in runs]
+    best, modules = min(runs, key=lambda run: run[0])
+    print(f"import {args.module}: best {best:.3f} s"
+          f"   mean {sum(times) / len(times):.3f} s")
+    print("\nSlowest packages (self time, best run):")
+    for package, seconds in by_package(modules)[:args.top]:
+        print(f"  {package:<30} {seconds:>7.3f} s")
+    heavy = heavy_modules(modules)
+    print(f"\nHeavy modules loaded: {', '.join(heavy) if heavy else 'none'}")
+    if heavy:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+'''
+Benchmark suite of the daily-actions pipeline and app.
+
+Runs concat_columns and the streamed make_daily_actions_dataset (against a
+fake gspread client), clean_all_columns, the fingerprint deduplication, the
+app's dataset preparation, filter chain, text search and summary roll-ups,
+the dataset profile, the CSV and XLSX exports and generate_pdf on
+synthetic sheets of every size, plus the import time of streamlit_app (see
+import_time.py), and stores the timings as JSON in benchmarks/results so
+runs can be compared.
+
+    python benchmarks/run_benchmarks.py [--sizes 10000 100000 1000000]
+        [--repeat 3] [--pdf-max-rows 100000] [--compare results/<run>.json]
+
+generate_pdf is skipped above --pdf-max-rows (a million rows take tens of
+minutes). With --compare, benchmarks slower than the given run by more
+than --tolerance are reported and the exit status is 1.
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+from import_time import heavy_modules, import_times
+from src.data import collect_data
+from src.data.dedupe import FingerprintSet, drop_duplicate_rows
+from src.data.make_dataset import DataExploring, DailyActionsWrangling
+from src.features.text_index import TextIndex
+from src.instrumentation import max_rss_bytes
+from src.utils import DAILY_ACTIONS_SHEET_DICT
+from src.visualization.pdf_report import generate_pdf
+from src.visualization.table_export import export_csv, export_xlsx
+
+# streamlit_app lives at the repository root, outside the installed
+# package, and the synthetic sheets and fake client with the tests
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'tests')]
+from streamlit_app import prepare_dataset  # noqa: E402
+from synthetic import synthetic_sheets  # noqa: E402
+from fake_gspread import FakeClient  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'results')
+
+# Typed searches: whole words, prefixes, accents and case, rare and common
+# terms
+SEARCH_QUERIES = ['Reunión', 'reunion libertad', 'CAPACITACIÓN pol',
+                  'visita alc', 'soc 12', 'r', 'mesa líderes 5']
+
+# Target of the CSV and XLSX exports, in seconds per 100,000 rows
+EXPORT_TARGET_SECONDS = 1.0
+
+
+def timeit(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return times, result
+
+
+def record(results, benchmark, rows, times, rows_out=None, **extra):
+    entry = {
+        'benchmark': benchmark,
+        'rows': rows,
+        'rows_out': rows_out,
+        'best_seconds': round(min(times), 6),
+        'mean_seconds': round(sum(times) / len(times), 6),
+        'times': [round(t, 6) for t in times],
+        'max_rss_bytes': max_rss_bytes(),
+        **extra
+    }
+    results.append(entry)
+    print(f"{benchmark:<26} {rows:>9} rows"
+          f"   best {entry['best_seconds']:>9.3f} s"
+          f"   mean {entry['mean_seconds']:>9.3f} s   rows out {rows_out}")
+
+
+def export_rate(times, n_rows):
+    '''
+    Best seconds per 100,000 rows of an export, against
+    EXPORT_TARGET_SECONDS
+    '''
+    seconds = min(times) / max(n_rows, 1) * 100_000
+    return {'seconds_per_100k_rows': round(seconds, 6),
+            'target_seconds_per_100k_rows': EXPORT_TARGET_SECONDS}
+
+
+def filter_chain(index, df, departamento):
+    '''
+    The filter chain of render_filters for one departamento: the options of
+    every widget, three municipios and the middle half of the date range
+    '''
+    positions = index.select('Departamento', [departamento])
+    municipios = index.options('Municipio', positions)[:3]
+    positions = index.select('Municipio', municipios, positions)
+    index.options('Tipo usuario', positions)
+    index.options('Usuario', positions)
+    index.options('Elemento esencial LR', positions)
+    bounds = index.bounds('Fecha')
+    if bounds is not None:
+        start, end = pd.Timestamp(bounds[0]), pd.Timestamp(bounds[1])
+        quarter = (end - start) / 4
+        positions = index.select_range('Fecha', start + quarter,
+                                       end - quarter, positions)
+    return df.iloc[positions]
+
+
+def run_size(n_rows, repeat, pdf_max_rows, results):
+    sheets = synthetic_sheets(n_rows)
+    gc = FakeClient(sheets)
+
+    times, raw = timeit(lambda: DailyActionsWrangling.concat_columns(
+        DAILY_ACTIONS_SHEET_DICT, gc=gc), repeat)
+    record(results, 'concat_columns', n_rows, times, len(raw))
+
+    # Fetch, clean and merge sheet by sheet, end to end
+    times, streamed = timeit(
+        lambda: DailyActionsWrangling().make_daily_actions_dataset(gc=gc),
+        repeat)
+    record(results, 'make_dataset', n_rows, times, len(streamed))
+    del streamed
+
+    times, cleaned = timeit(
+        lambda: DailyActionsWrangling.clean_all_columns(raw), repeat)
+    record(results, 'clean_all_columns', n_rows, times, len(cleaned))
+
+    # Deduplication alone, on the cleaned (not yet deduplicated) columns
+    columns = pd.DataFrame({c: DailyActionsWrangling.clean_series(raw[c])
+                            for c in cleaned.columns})
+    times, deduped = timeit(lambda: drop_duplicate_rows(columns), repeat)
+    record(results, 'drop_duplicate_rows', len(columns), times, len(deduped))
+    seen = FingerprintSet()
+    drop_duplicate_rows(columns, seen=seen)
+    times, legacy = timeit(lambda: columns.drop_duplicates(keep='last'),
+                           repeat)
+    record(results, 'drop_duplicates (legacy)', len(columns), times,
+           len(legacy), fingerprint_set_bytes=seen.nbytes)
+    # Released before the next benchmarks (the lambdas above keep columns)
+    columns = deduped = legacy = None
+
+    df = DailyActionsWrangling.format_columns(
+        DailyActionsWrangling.parse_dates(cleaned))
+    times, profile = timeit(lambda: DataExploring().profile(df), repeat)
+    record(results, 'profile', len(df), times, len(profile))
+    times, (data, index, cube) = timeit(lambda: prepare_dataset(df), repeat)
+    record(results, 'prepare_dataset', len(df), times, len(data))
+
+    departamentos = index.options('Departamento')
+    times, filtered = timeit(
+        lambda: [filter_chain(index, data, d) for d in departamentos], repeat)
+    times = [t / len(departamentos) for t in times]
+    record(results, 'filter_chain', len(data), times,
+           int(np.mean([len(f) for f in filtered])))
+
+    text = data['Acción diaria']
+    times, _ = timeit(lambda: TextIndex(text), repeat)
+    record(results, 'text_index', len(data), times)
+    times, matches = timeit(
+        lambda: [index.search('Acción diaria', q) for q in SEARCH_QUERIES],
+        repeat)
+    times = [t / len(SEARCH_QUERIES) for t in times]
+    record(results, 'text_search', len(data), times,
+           int(np.mean([len(m) for m in matches])))
+
+    def summary_queries():
+        cube.rollup(['Departamento'], 'Acción')
+        for departamento in departamentos:
+            cube.rollup(['Municipio'],
+                        filters={'Departamento': [departamento]})
+        return cube.rollup(['Semana'])
+    times, weeks = timeit(summary_queries, repeat)
+    times = [t / (len(departamentos) + 2) for t in times]
+    record(results, 'summary_rollup', len(data), times, len(weeks))
+
+    times, csv = timeit(lambda: export_csv(data), repeat)
+    record(results, 'export_csv', len(data), times, len(data),
+           export_bytes=len(csv), **export_rate(times, len(data)))
+    times, xlsx = timeit(lambda: export_xlsx(data), 1)
+    record(results, 'export_xlsx', len(data), times, len(data),
+           export_bytes=len(xlsx), **export_rate(times, len(data)))
+    del csv, xlsx
+    for entry in results[-2:]:
+        if entry['seconds_per_100k_rows'] > EXPORT_TARGET_SECONDS:
+            print(f"{entry['benchmark']:<26} "
+                  f"{entry['seconds_per_100k_rows']:.3f} s per 100000 rows,"
+                  f" above the target of {EXPORT_TARGET_SECONDS} s")
+
+    if len(data) > pdf_max_rows:
+        print(f"{'generate_pdf':<26} {len(data):>9} rows"
+              f"   skipped (--pdf-max-rows {pdf_max_rows})")
+        return
+    times, pdf = timeit(lambda: generate_pdf(data, report_date='benchmark'), 1)
+    record(results, 'generate_pdf', len(data), times, len(data),
+           pdf_bytes=pdf.getbuffer().nbytes)
+
+
+def run_import_time(repeat, results):
+    runs = [import_times('streamlit_app') for _ in range(repeat)]
+    record(results, 'import streamlit_app', 0,
+           [seconds for seconds, _ in runs],
+           heavy_modules=heavy_modules(runs[0][1]))
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                                capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    '''
+    Print the benchmarks slower than in the baseline run by more than
+    tolerance (relative, on the best time) and return them
+    '''
+    with open(baseline_path) as f:
+        baseline = {(r['benchmark'], r['rows']): r
+                    for r in json.load(f)['results']}
+    regressions = []
+    print(f"\nCompared with {baseline_path}:")
+    for entry in results:
+        previous = baseline.get((entry['benchmark'], entry['rows']))
+        if previous is None:
+            continue
+        ratio = entry['best_seconds'] / max(previous['best_seconds'], 1e-9)
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(entry)
+        print(f"{entry['benchmark']:<26} {entry['rows']:>9} rows   "
+              f"{previous['best_seconds']:>9.3f} s -> "
+              f"{entry['best_seconds']:>9.3f} s   {ratio:.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--pdf-max-rows', type=int, default=100_000)
+    parser.add_argument('--output', default=None,
+                        help='JSON file (default results/<timestamp>.json)')
+    parser.add_argument('--compare', default=None,
+                        help='JSON results of a previous run')
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    args = parser.parse_args()
+
+    # The fake client needs no Sheets quota
+    collect_data.scheduler = collect_data.RequestScheduler(
+        requests_per_minute=10**9, burst=10**6)
+
+    results = []
+    run_import_time(args.repeat, results)
+    for n_rows in args.sizes:
+        run_size(n_rows, args.repeat, args.pdf_max_rows, results)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR,
+        datetime.datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f,
+                  indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
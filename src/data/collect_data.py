@@ -1,21 +1,264 @@
-import gspread
-from google.oauth2.service_account import Credentials
-from src.utils import SPREADSHEET_ID
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from src.utils import (SPREADSHEET_ID, MAX_FETCH_WORKERS, CREDENTIALS_PATHS,
+                       SHEETS_READ_REQUESTS_PER_MINUTE, SHEETS_READ_BURST,
+                       SHEETS_MAX_RETRIES, SHEETS_BACKOFF_BASE,
+                       SHEETS_BACKOFF_MAX)
+from src.instrumentation import stage
 import pandas as pd
 
+# gspread, google-auth and requests are imported where they are first needed:
+# they take a quarter of a second to import and an app loading its dataset
+# from the snapshot never uses them
+
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
-try:
-    creds = Credentials.from_service_account_file(r'src/data/credentials.json', scopes=SCOPES)
-except:
-    creds = Credentials.from_service_account_file(r'../src/data/credentials.json', scopes=SCOPES)
-client = gspread.authorize(creds)
+# HTTP statuses of the Sheets API worth retrying
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Process-wide client and opened workbook, created on first use
+_client = None
+_workbook = None
+_client_lock = threading.Lock()
+
+
+class TokenBucket:
+    '''
+    Token bucket refilled at rate tokens per second, holding up to capacity
+    tokens. acquire blocks until a token is available.
+    '''
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                refill = (now - self.updated) * self.rate
+                self.tokens = min(self.capacity, self.tokens + refill)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class RequestScheduler:
+    '''
+    Runs Sheets API requests within the read quota (token bucket) and
+    retries the transient failures (429, 5xx, connection errors) with
+    exponential backoff and full jitter
+    '''
+
+    def __init__(self, requests_per_minute=SHEETS_READ_REQUESTS_PER_MINUTE,
+                 burst=SHEETS_READ_BURST, max_retries=SHEETS_MAX_RETRIES,
+                 backoff_base=SHEETS_BACKOFF_BASE,
+                 backoff_max=SHEETS_BACKOFF_MAX, sleep=time.sleep):
+        self.bucket = TokenBucket(requests_per_minute / 60, burst, sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+
+    @staticmethod
+    def is_retryable(exc):
+        import gspread
+        import requests
+        if isinstance(exc, gspread.exceptions.APIError):
+            return getattr(exc, 'code', None) in RETRY_STATUS
+        return isinstance(exc, (requests.exceptions.ConnectionError,
+                                requests.exceptions.Timeout))
+
+    def call(self, func, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:
+                if (attempt == self.max_retries
+                        or not RequestScheduler.is_retryable(exc)):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                self.sleep(random.uniform(0, delay))
+
+
+class SingleFlight:
+    '''
+    Coalesces concurrent calls with the same key into one execution whose
+    result (or exception) is shared by every caller
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self.lock:
+            future = self.calls.get(key)
+            leader = future is None
+            if leader:
+                future = self.calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        finally:
+            with self.lock:
+                del self.calls[key]
+        return future.result()
+
+
+# Every Sheets request of the process goes through this scheduler
+scheduler = RequestScheduler()
+_fetches = SingleFlight()
+
+
+def credentials_path():
+    '''
+    ACTIONS_CREDENTIALS if set, otherwise the first of CREDENTIALS_PATHS found
+    '''
+    path = os.environ.get('ACTIONS_CREDENTIALS')
+    if path:
+        return path
+    for path in CREDENTIALS_PATHS:
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(
+        f"No credentials file found in {CREDENTIALS_PATHS}")
 
-def read_google_spreadsheet(sheet_name):
+
+def make_client(path=None):
+    '''
+    Authorized gspread client over a keep-alive session whose connection
+    pool fits the concurrent sheet fetches
+    '''
+    import gspread
+    from google.auth.transport.requests import AuthorizedSession
+    from google.oauth2.service_account import Credentials
+    from requests.adapters import HTTPAdapter
+    creds = Credentials.from_service_account_file(path or credentials_path(),
+                                                  scopes=SCOPES)
+    session = AuthorizedSession(creds)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_FETCH_WORKERS)
+    session.mount('https://', adapter)
+    return gspread.authorize(creds, session=session)
+
+
+def get_client():
+    '''
+    Shared client of the process, authorized on the first call
+    '''
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = make_client()
+        return _client
+
+
+def set_client(gc):
+    '''
+    Replace the shared client (e.g. with a local fake); None resets it so
+    the next call authorizes again
+    '''
+    global _client, _workbook
+    with _client_lock:
+        _client = gc
+        _workbook = None
+
+
+def get_workbook(gc=None):
+    '''
+    Opened workbook. The one of the shared client is opened once and kept,
+    an explicitly given client opens it on every call.
+    '''
+    global _workbook
+    if gc is not None:
+        return scheduler.call(gc.open_by_key, SPREADSHEET_ID)
+    gc = get_client()
+    with _client_lock:
+        if _workbook is None:
+            _workbook = scheduler.call(gc.open_by_key, SPREADSHEET_ID)
+        return _workbook
+
+
+def read_google_spreadsheet(sheet_name, gc=None):
     # Definir el libro
-    workbook = client.open_by_key(SPREADSHEET_ID)
+    workbook = get_workbook(gc)
     # Definir la hoja
-    sheet = workbook.worksheet(sheet_name)
+    sheet = scheduler.call(workbook.worksheet, sheet_name)
     # Convertir los registros en un dataframe
-    df = pd.DataFrame(sheet.get_all_records())
+    df = pd.DataFrame(scheduler.call(sheet.get_all_records))
     return df
+
+
+def read_google_spreadsheets(sheet_names, gc=None,
+                             max_workers=MAX_FETCH_WORKERS):
+    '''
+    Read several sheets of the workbook concurrently. The workbook is opened
+    only once and the DataFrames are returned in the order of sheet_names.
+    Concurrent identical reads share one in-flight fetch (and its frames,
+    which must not be modified in place).
+    '''
+    sheet_names = tuple(sheet_names)
+    key = (id(gc), sheet_names)
+    return _fetches.do(key, _read_google_spreadsheets, sheet_names, gc,
+                       max_workers)
+
+
+def _read_google_spreadsheets(sheet_names, gc, max_workers):
+    frames = dict(iter_google_spreadsheets(sheet_names, gc=gc,
+                                           max_workers=max_workers))
+    return [frames[position] for position in range(len(sheet_names))]
+
+
+def iter_google_spreadsheets(sheet_names, gc=None,
+                             max_workers=MAX_FETCH_WORKERS):
+    '''
+    Read several sheets of the workbook concurrently and yield (position in
+    sheet_names, DataFrame) as each one arrives, so the first sheets can be
+    processed while the others are still downloading. Concurrent reads of
+    the same sheet share one in-flight fetch.
+    '''
+    sheet_names = tuple(sheet_names)
+    # Abrir el libro una sola vez y resolver todas las hojas con una consulta
+    workbook = get_workbook(gc)
+    worksheets = {sheet.title: sheet
+                  for sheet in scheduler.call(workbook.worksheets)}
+    for sheet_name in sheet_names:
+        if sheet_name not in worksheets:
+            import gspread
+            raise gspread.WorksheetNotFound(sheet_name)
+
+    def fetch(sheet_name):
+        with stage('fetch', sheet=sheet_name) as record:
+            records = scheduler.call(worksheets[sheet_name].get_all_records)
+            df = pd.DataFrame(records)
+            record.rows_out = len(df)
+        return df
+
+    def read_sheet(sheet_name):
+        return _fetches.do(('sheet', id(gc), sheet_name), fetch, sheet_name)
+
+    workers = max(1, min(max_workers, len(sheet_names)))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(read_sheet, name): position
+                   for position, name in enumerate(sheet_names)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # A consumer stopping early does not wait for the remaining sheets
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from src.utils import DATASET_TTL, DATASET_RETRY_BACKOFF
+
+logger = logging.getLogger('actions.dataset')
+
+
+class DatasetVersion:
+    '''
+    One loaded dataset, identified by an increasing version number
+    '''
+
+    def __init__(self, version, data, loaded_at):
+        self.version = version
+        self.data = data
+        self.loaded_at = loaded_at
+
+    def age(self, clock=time.monotonic):
+        return clock() - self.loaded_at
+
+
+class DatasetStore:
+    '''
+    Process-wide holder of the current dataset version. The dataset is
+    rebuilt by load(refresh, previous, **options) when it is older than ttl
+    or explicitly invalidated, previous being the data of the version
+    replaced (None on the first load) and options those of a reload, kept
+    until the next refresh goes back to the default load.
+    Only one rebuild runs at a time and callers arriving during a rebuild
+    wait for it and share its result.
+
+    Only the first load runs in the caller of get and raises its errors.
+    Afterwards an expired version is still served while it is rebuilt in a
+    background thread; a failed background rebuild is logged, the current
+    version kept, and the next attempt waits retry_backoff seconds, doubled
+    after every failure (up to ttl).
+    '''
+
+    def __init__(self, load, ttl=DATASET_TTL,
+                 retry_backoff=DATASET_RETRY_BACKOFF, clock=time.monotonic):
+        self.load = load
+        self.ttl = ttl
+        self.retry_backoff = retry_backoff
+        self.clock = clock
+        self.current = None
+        self.options = {}
+        self.stale = False
+        self.failures = 0
+        self.retry_at = None
+        self.updating = None
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+
+    def expired(self, current):
+        return (current is None or self.stale
+                or (self.ttl is not None
+                    and current.age(self.clock) > self.ttl))
+
+    def get(self):
+        '''
+        Current dataset version, loading it first if there is none. An
+        expired version is returned as is while a newer one is built.
+        '''
+        current = self.current
+        if current is None:
+            return self.rebuild(seen=None)
+        if self.expired(current):
+            self.update_in_background(current)
+        return current
+
+    def update_in_background(self, seen):
+        '''
+        Start rebuilding the expired version seen in a background thread,
+        unless one is running already or the last attempt failed too recently
+        '''
+        with self.lock:
+            if self.updating is not None:
+                return
+            if self.retry_at is not None and self.clock() < self.retry_at:
+                return
+            self.updating = threading.Thread(
+                target=self.update, args=(seen,), name='dataset-update',
+                daemon=True)
+            self.updating.start()
+
+    def update(self, seen):
+        try:
+            self.rebuild(seen=seen)
+        except Exception:
+            with self.lock:
+                self.failures += 1
+                delay = self.retry_backoff * 2 ** (self.failures - 1)
+                if self.ttl is not None:
+                    delay = min(delay, self.ttl)
+                self.retry_at = self.clock() + delay
+            logger.exception('Dataset rebuild failed, serving version %d '
+                             'and retrying in %d s', seen.version, delay)
+        finally:
+            with self.lock:
+                self.updating = None
+
+    def refresh(self, seen=None):
+        '''
+        Rebuild the dataset from its source, raising its errors to the
+        caller. If a rebuild newer than the version the caller has seen
+        finishes meanwhile, that one is returned.
+        '''
+        return self.rebuild(seen=seen or self.current, refresh=True)
+
+    def reload(self, seen=None, **options):
+        '''
+        Rebuild the dataset from local data with other load options (e.g. a
+        wider date scope), kept until the next refresh. If a rebuild with
+        the same options finishes meanwhile, that one is returned.
+        '''
+        return self.rebuild(seen=seen or self.current, options=options)
+
+    def invalidate(self, seen=None):
+        '''
+        Mark the current version as stale (unless it is newer than the version
+        the caller has seen), the next get starts rebuilding it
+        '''
+        with self.lock:
+            if seen is None or self.current is seen:
+                self.stale = True
+
+    def rebuild(self, seen, refresh=False, options=None):
+        with self.rebuild_lock:
+            current = self.current
+            # Somebody else rebuilt while this caller was waiting
+            if (current is not seen and current is not None
+                    and not self.expired(current)
+                    and options in (None, self.options)):
+                return current
+            if options is not None:
+                # A reload reads the local data again, only the options change
+                refresh = False
+            else:
+                # Only an explicit refresh skips the local data of the first
+                # load
+                refresh = refresh or current is not None
+                # and every refresh goes back to the default options (e.g.
+                # the recent months), so a wide reload does not stay for good
+                options = {}
+            previous = current.data if current is not None else None
+            data = self.load(refresh, previous, **options)
+            with self.lock:
+                number = current.version + 1 if current is not None else 1
+                self.current = DatasetVersion(number, data, self.clock())
+                self.options = options
+                self.stale = False
+                self.failures = 0
+                self.retry_at = None
+            return self.current
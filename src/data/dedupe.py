@@ -0,0 +1,131 @@
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+
+# Values sampled per column to decide whether to factorize it before hashing
+HASH_SAMPLE_SIZE = 10_000
+
+
+def column_hashes(s):
+    '''
+    64-bit hash of every value of a Series. Repeated values are hashed once
+    (factorized first), mostly distinct ones are hashed directly; both give
+    the same hashes.
+    '''
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        values = s.array
+    else:
+        values = s.to_numpy()
+    sample = s.iloc[::max(1, len(s) // HASH_SAMPLE_SIZE)]
+    categorize = sample.nunique(dropna=False) < len(sample) / 2
+    return pd.util.hash_array(values, categorize=categorize)
+
+
+def frame_digest(df, row_hashes=None):
+    '''
+    Hash of the column names and every value of a DataFrame, from its
+    row_fingerprints (row_hashes, when already computed)
+    '''
+    if row_hashes is None:
+        row_hashes = row_fingerprints(df)
+    digest = hashlib.blake2b(row_hashes.tobytes(), digest_size=16)
+    digest.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def row_fingerprints(df, columns=None):
+    '''
+    64-bit fingerprint of every row over columns (all by default). Equal rows
+    always share a fingerprint, and categorical and object columns with the
+    same values hash alike. Two different rows collide with probability
+    2**-64, about 3e-8 for any pair among a million rows.
+    '''
+    columns = list(df.columns if columns is None else columns)
+    # Column hashes combined as pandas' hash_pandas_object does
+    fingerprints = np.full(len(df), 0x345678, dtype=np.uint64)
+    multiplier = np.uint64(1000003)
+    for i, col in enumerate(columns):
+        fingerprints ^= column_hashes(df[col])
+        fingerprints *= multiplier
+        multiplier += np.uint64(82520 + 2 * (len(columns) - i))
+    fingerprints += np.uint64(97531)
+    return fingerprints
+
+
+class FingerprintSet:
+    '''
+    Sorted set of row fingerprints: 8 bytes per distinct row, whatever the
+    width of the rows. It can be saved and loaded (.npy) to deduplicate
+    loads against the rows already kept by earlier ones: the history keeps
+    one per sheet (see HistoryStore), so the rows appended to a sheet are
+    checked against it instead of the rows themselves, also after a restart.
+    '''
+
+    def __init__(self, fingerprints=()):
+        self.values = np.unique(np.asarray(fingerprints, dtype=np.uint64))
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def contains(self, fingerprints):
+        '''
+        Boolean mask of the fingerprints already in the set
+        '''
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        if not len(self.values):
+            return np.zeros(len(fingerprints), dtype=bool)
+        positions = np.searchsorted(self.values, fingerprints)
+        positions[positions == len(self.values)] = 0
+        return self.values[positions] == fingerprints
+
+    def copy(self):
+        fingerprints = FingerprintSet()
+        fingerprints.values = self.values.copy()
+        return fingerprints
+
+    def add(self, fingerprints):
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        self.values = np.union1d(self.values, fingerprints)
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, self.values)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        Set saved at path, empty if there is none
+        '''
+        if not os.path.exists(path):
+            return cls()
+        fingerprints = cls()
+        fingerprints.values = np.load(path)
+        return fingerprints
+
+
+def drop_duplicate_rows(df, columns=None, seen=None):
+    '''
+    Keep the first row of every fingerprint over columns (all by default).
+    With a FingerprintSet seen, rows whose fingerprint is already in it are
+    dropped too and the fingerprints of the kept rows are added to it, so
+    an incremental load only hashes its new rows.
+    '''
+    fingerprints = row_fingerprints(df, columns)
+    keep = ~pd.Series(fingerprints).duplicated(keep='first').to_numpy()
+    if seen is not None:
+        keep &= ~seen.contains(fingerprints)
+        seen.add(fingerprints[keep])
+    if keep.all():
+        return df.reset_index(drop=True)
+    return df[keep].reset_index(drop=True)
@@ -0,0 +1,170 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+import numpy as np
+import pandas as pd
+from src.utils import (GAZETTEER_PATH, GAZETTEER_MEMO_PATH,
+                       GAZETTEER_MATCH_CUTOFF, GAZETTEER_ALIASES)
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def fold_name(name):
+    '''
+    Comparable form of a place name: no accents, lowercase, words separated
+    by single spaces ('Bogotá, D.C.' -> 'bogota d c')
+    '''
+    name = unicodedata.normalize('NFKD', str(name))
+    name = ''.join(c for c in name if not unicodedata.combining(c)).lower()
+    return ' '.join(re.split(r'[^a-z0-9]+', name)).strip()
+
+
+def closest(name, candidates, cutoff=GAZETTEER_MATCH_CUTOFF):
+    '''
+    Canonical name of the candidate (folded name -> canonical) matching the
+    folded name: equal, the only one containing all its words, or the most
+    similar above cutoff. None if there is no such candidate.
+    '''
+    if name in candidates:
+        return candidates[name]
+    words = set(name.split())
+    containing = [folded for folded in candidates
+                  if words and words <= set(folded.split())]
+    if len(containing) == 1:
+        return candidates[containing[0]]
+    matches = difflib.get_close_matches(name, list(candidates), n=1,
+                                        cutoff=cutoff)
+    return candidates[matches[0]] if matches else None
+
+
+class Gazetteer:
+    '''
+    Canonical Departamento and Municipio names from the DIVIPOLA table.
+    Each distinct raw (Departamento, Municipio) spelling is resolved once:
+    the departamento against the 33 departamentos (and GAZETTEER_ALIASES),
+    the municipio against the municipios of that departamento only, since
+    many names repeat across departamentos. Resolutions, including the
+    failed ones, are memoized in memo_path, so a refresh only resolves the
+    spellings never seen before. Unresolved names are kept as they are.
+    '''
+
+    def __init__(self, path=GAZETTEER_PATH, memo_path=GAZETTEER_MEMO_PATH,
+                 cutoff=GAZETTEER_MATCH_CUTOFF, aliases=GAZETTEER_ALIASES):
+        with open(path, 'rb') as f:
+            content = f.read()
+        table = pd.read_csv(path, dtype=str)
+        self.cutoff = cutoff
+        self.memo_path = memo_path
+        self.departamentos = {fold_name(d): d
+                              for d in table['departamento'].unique()}
+        self.departamentos.update({fold_name(alias): d
+                                   for alias, d in aliases.items()})
+        self.municipios = {
+            departamento: {fold_name(m): m for m in rows['municipio']}
+            for departamento, rows in table.groupby('departamento', sort=False)
+        }
+        # Memos of another table, cutoff or aliases are stale
+        key = json.dumps([cutoff, sorted(aliases.items())]).encode('utf-8')
+        self.version = hashlib.blake2b(content + key,
+                                       digest_size=16).hexdigest()
+        self.memo = self.load_memo()
+        self.lock = threading.Lock()
+
+    def load_memo(self):
+        if self.memo_path is None or not os.path.exists(self.memo_path):
+            return {}
+        with open(self.memo_path, encoding='utf-8') as f:
+            memo = json.load(f)
+        if memo.get('version') != self.version:
+            return {}
+        return {(d, m): (dc, mc) for d, m, dc, mc in memo['entries']}
+
+    def save_memo(self):
+        if self.memo_path is None:
+            return
+        directory = os.path.dirname(self.memo_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        entries = [[d, m, dc, mc] for (d, m), (dc, mc) in self.memo.items()]
+        tmp_path = f'{self.memo_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'entries': entries}, f,
+                      ensure_ascii=False)
+        os.replace(tmp_path, self.memo_path)
+
+    def resolve(self, departamento, municipio):
+        '''
+        Canonical (Departamento, Municipio) of a raw pair, None for the names
+        that could not be resolved or are missing
+        '''
+        if pd.isna(departamento):
+            return None, None
+        departamento = closest(fold_name(departamento), self.departamentos,
+                               self.cutoff)
+        if departamento is None:
+            return None, None
+        if pd.isna(municipio):
+            return departamento, None
+        municipio = closest(fold_name(municipio),
+                            self.municipios[departamento], self.cutoff)
+        return departamento, municipio
+
+    def canonicalize(self, df):
+        '''
+        df with the Departamento and Municipio spellings replaced by their
+        canonical names. Works on the distinct pairs only, and resolves (and
+        memoizes) just the pairs missing from the memo. Missing values stay
+        missing, and pairs holding one are resolved without the memo.
+        '''
+        # Missing values get a code of their own, the -1 sentinel would
+        # collide with the codes of other pairs
+        departamento_codes, departamento_values = pd.factorize(
+            df['Departamento'].astype(object), use_na_sentinel=False)
+        municipio_codes, municipio_values = pd.factorize(
+            df['Municipio'].astype(object), use_na_sentinel=False)
+        # One integer per pair, factorized again into the distinct pairs
+        codes, pair_codes = pd.factorize(
+            departamento_codes.astype(np.int64) * len(municipio_values)
+            + municipio_codes)
+        departamento_codes, municipio_codes = np.divmod(
+            pair_codes, max(len(municipio_values), 1))
+        uniques = list(zip(departamento_values.take(departamento_codes),
+                           municipio_values.take(municipio_codes)))
+        complete = [not pd.isna(d) and not pd.isna(m) for d, m in uniques]
+        with self.lock:
+            missing = [pair for pair, known in zip(uniques, complete)
+                       if known and pair not in self.memo]
+            for departamento, municipio in missing:
+                self.memo[(departamento, municipio)] = self.resolve(
+                    departamento, municipio)
+            if missing:
+                self.save_memo()
+            resolved = [self.memo[pair] if known else self.resolve(*pair)
+                        for pair, known in zip(uniques, complete)]
+
+        departamentos = [d if dc is None else dc
+                         for (d, _), (dc, _) in zip(uniques, resolved)]
+        municipios = [m if mc is None else mc
+                      for (_, m), (_, mc) in zip(uniques, resolved)]
+        return df.assign(**{
+            'Departamento': pd.Series(departamentos, dtype=object)
+            .to_numpy().take(codes),
+            'Municipio': pd.Series(municipios, dtype=object)
+            .to_numpy().take(codes),
+        })
+
+
+def get_gazetteer():
+    '''
+    Shared gazetteer of the process, loaded on first use
+    '''
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            _gazetteer = Gazetteer()
+        return _gazetteer
@@ -0,0 +1,382 @@
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import pandas as pd
+from src.data.dedupe import FingerprintSet, frame_digest
+from src.data.make_dataset import DailyActionsWrangling
+from src.data.snapshot import read_snapshot, write_snapshot
+from src.utils import HISTORY_DIR, HISTORY_RECENT_MONTHS, SNAPSHOT_PATH
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): only one process may use a history
+    fcntl = None
+
+# Partition of the rows without a parsed Fecha, loaded with every scope
+NO_DATE = 'sin_fecha'
+# Lock files: writers take WRITE_LOCK, readers share FILES_LOCK and a
+# commit takes it to replace the manifest and remove the files left out
+WRITE_LOCK = 'write.lock'
+FILES_LOCK = 'files.lock'
+
+
+def month_key(code):
+    return NO_DATE if code < 0 else f'{code // 12:04d}-{code % 12 + 1:02d}'
+
+
+def name_digest(name):
+    return hashlib.blake2b(name.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def read_legacy_snapshot(path=SNAPSHOT_PATH):
+    '''
+    Single-file snapshot of the versions before the history, None if there
+    is none. Snapshots written before Fecha was parsed in the pipeline get
+    it parsed here.
+    '''
+    df = read_snapshot(path)
+    if df is not None and not pd.api.types.is_datetime64_any_dtype(
+            df['Fecha']):
+        df = DailyActionsWrangling.parse_dates(df)
+    return df
+
+
+class HistoryStore:
+    '''
+    The cleaned dataset stored as one snapshot per month of 'Fecha' (plus
+    sin_fecha) and a manifest with the rows, the rows of every 'Acción' and
+    a digest of every partition. A write only rewrites the partitions whose
+    digest changed, and a read only loads the months it is asked for, so
+    the cost of a load follows its scope and not the whole history.
+
+    The manifest also keeps the state of DailyActionsSync: the fingerprint
+    of every raw sheet and the file (under seen/) of the FingerprintSet of
+    its cleaned rows. Files are named after their digest and the ones left
+    out are removed once the new manifest is in place, so a write stopped
+    half-way leaves the previous history and state whole.
+
+    Several processes (the app, the batch reports) may share a history:
+    writers hold a lock on the directory, so they run one at a time, and a
+    read holds a shared lock while it loads the manifest and its files, so
+    no commit removes them meanwhile. A file listed but missing all the
+    same (a history damaged by hand) makes the next sync rebuild it.
+    '''
+
+    def __init__(self, directory=HISTORY_DIR):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.local = threading.local()
+
+    @contextlib.contextmanager
+    def locked(self, name, exclusive):
+        '''
+        flock on the lock file name of the directory, released on exit.
+        Every call opens the file again, so threads lock each other too.
+        '''
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+
+    @contextlib.contextmanager
+    def writing(self):
+        '''
+        Hold the write lock of the history (reentrant within a thread), for
+        a writer reading the stored state before updating it
+        '''
+        if getattr(self.local, 'writing', False):
+            yield
+            return
+        with self.locked(WRITE_LOCK, exclusive=True):
+            self.local.writing = True
+            try:
+                yield
+            finally:
+                self.local.writing = False
+
+    def manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return {'partitions': {}, 'sheets': {}}
+        with open(self.manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest.setdefault('sheets', {})
+        return manifest
+
+    def version(self):
+        '''
+        Digest of the partitions stored, changing with every write
+        '''
+        partitions = json.dumps(self.manifest()['partitions'], sort_keys=True)
+        return hashlib.blake2b(partitions.encode('utf-8'),
+                               digest_size=16).hexdigest()
+
+    def months(self):
+        '''
+        Months stored, oldest first (without NO_DATE)
+        '''
+        return sorted(m for m in self.manifest()['partitions']
+                      if m != NO_DATE)
+
+    def recent_start(self, n_months=HISTORY_RECENT_MONTHS):
+        '''
+        First of the last n_months stored months, None if there are none
+        '''
+        months = self.months()
+        return months[-n_months:][0] if months else None
+
+    def path(self, month, digest):
+        return os.path.join(self.directory, f'{month}.{digest[:16]}.parquet')
+
+    def sheets(self):
+        '''
+        Sheet name -> fingerprint (rows, columns, digest) of the raw sheet
+        whose cleaned rows are stored
+        '''
+        return {sheet: (entry['rows'], tuple(entry['columns']),
+                        entry['digest'])
+                for sheet, entry in self.manifest()['sheets'].items()}
+
+    def missing(self):
+        '''
+        Files listed in the manifest that are not on disk
+        '''
+        manifest = self.manifest()
+        paths = [self.path(month, entry['digest'])
+                 for month, entry in manifest['partitions'].items()]
+        paths += [os.path.join(self.directory, entry['seen'])
+                  for entry in manifest['sheets'].values()]
+        return [path for path in paths if not os.path.exists(path)]
+
+    def load(self, month, entry):
+        '''
+        Rows of the partition of a manifest entry
+        '''
+        path = self.path(month, entry['digest'])
+        df = read_snapshot(path)
+        if df is None:
+            raise FileNotFoundError(
+                f'{path} is listed in {self.manifest_path} but missing')
+        return df
+
+    def seen(self, sheet):
+        '''
+        FingerprintSet of the cleaned rows stored for sheet
+        '''
+        entry = self.manifest()['sheets'][sheet]
+        return FingerprintSet.load(os.path.join(self.directory, entry['seen']))
+
+    @staticmethod
+    def partition(df):
+        '''
+        Month -> rows of df with 'Fecha' in that month, in the order of df
+        '''
+        fecha = df['Fecha']
+        codes = (fecha.dt.year * 12 + fecha.dt.month - 1).fillna(-1)
+        partitions = {}
+        for code, rows in df.groupby(codes.astype('int64').to_numpy(),
+                                     sort=True):
+            month = month_key(code)
+            # Dates that failed to parse are NaT, so their rows are all in
+            # NO_DATE
+            failures = 0
+            if month == NO_DATE:
+                failures = df.attrs.get('fecha_parse_failures', 0)
+            rows.attrs = {'fecha_parse_failures': failures}
+            partitions[month] = rows
+        return partitions
+
+    @staticmethod
+    def select(months, start=None):
+        '''
+        The months from start on (all if None), plus NO_DATE
+        '''
+        return [m for m in months
+                if start is None or m == NO_DATE or m >= start]
+
+    @staticmethod
+    def in_scope(df, start=None):
+        '''
+        Rows of df with 'Fecha' in a month from start on, or without Fecha
+        '''
+        if start is None:
+            return df
+        fecha = df['Fecha']
+        return df[fecha.isna() | (fecha >= pd.Timestamp(f'{start}-01'))]
+
+    @staticmethod
+    def assemble(frames):
+        '''
+        Dataset of several partitions, in the row order of the pipeline
+        (by 'Acción', Departamento and Municipio)
+        '''
+        frames = [f for f in frames if len(f)]
+        if not frames:
+            return None
+        df = DailyActionsWrangling.sort_rows(
+            DailyActionsWrangling.concat_frames(frames))
+        df.attrs = {'fecha_parse_failures': sum(
+            f.attrs.get('fecha_parse_failures', 0) for f in frames)}
+        return df
+
+    def write(self, df):
+        '''
+        Store df as the whole history, rewriting only the partitions that
+        changed. df may come from anywhere, so the sheet state is dropped and
+        the next sync refresh cleans every sheet again. Returns the
+        partitions of df and the months written.
+        '''
+        partitions = HistoryStore.partition(df)
+        failures = {'': df.attrs.get('fecha_parse_failures', 0)}
+        with self.writing():
+            written = self.commit(partitions, {}, failures, {})
+        return partitions, written
+
+    def update(self, changes, sheets, seen, reset=False):
+        '''
+        Apply a sync refresh. changes holds (label, cleaned rows, replace)
+        for every changed sheet, label being its 'Acción': the stored rows of
+        the sheets replaced are dropped and the rows given added. sheets and
+        seen are the fingerprints and FingerprintSets of the changed sheets.
+        Only the months holding rows added or dropped are read and
+        rewritten, unless reset, which replaces the whole history. Returns
+        the partitions rewritten, the months written and the rows dropped
+        (None with reset).
+        '''
+        with self.writing():
+            return self.apply(self.manifest(), changes, sheets, seen, reset)
+
+    def apply(self, manifest, changes, sheets, seen, reset):
+        entries = {} if reset else manifest['partitions']
+        replaced = {label for label, _, replace in changes if replace}
+        added = {}
+        for _, rows, _ in changes:
+            for month, part in HistoryStore.partition(rows).items():
+                added.setdefault(month, []).append(part)
+        touched = set(added) | {m for m, entry in entries.items()
+                                if replaced & set(entry['acciones'])}
+        # Parse failures of every 'Acción' (only the rows without Fecha)
+        failures = entries.get(NO_DATE, {}).get('failures', {})
+        failures = {label: n for label, n in failures.items()
+                    if label not in replaced}
+        for label, rows, _ in changes:
+            n = rows.attrs.get('fecha_parse_failures', 0)
+            failures[label] = failures.get(label, 0) + n
+
+        partitions, removed = {}, []
+        for month in sorted(touched):
+            frames = added.get(month, [])
+            if month in entries:
+                old = self.load(month, entries[month])
+                dropped = old['Acción'].isin(replaced).to_numpy()
+                if dropped.any():
+                    removed.append(old[dropped])
+                frames = [old[~dropped]] + frames
+            df = HistoryStore.assemble(frames)
+            partitions[month] = df
+            if df is not None and month == NO_DATE:
+                df.attrs['fecha_parse_failures'] = sum(failures.values())
+
+        sheet_entries = {} if reset else dict(manifest['sheets'])
+        for sheet, (rows, columns, digest) in sheets.items():
+            name = f'{name_digest(sheet)}.{digest[:16]}.npy'
+            seen[sheet].save(os.path.join(self.directory, 'seen', name))
+            sheet_entries[sheet] = {'rows': rows, 'columns': list(columns),
+                                    'digest': digest,
+                                    'seen': f'seen/{name}'}
+        kept = {m: e for m, e in entries.items() if m not in touched}
+        written = self.commit(partitions, kept, failures, sheet_entries)
+        partitions = {m: df for m, df in partitions.items() if df is not None}
+        return partitions, written, None if reset else removed
+
+    def commit(self, partitions, kept, failures, sheets):
+        '''
+        Write the partitions (month -> rows, None to drop the month) not
+        stored yet, then the manifest of them and of the entries kept, and
+        remove the files no longer listed. Returns the months written.
+        '''
+        entries, written = dict(kept), []
+        for month, rows in partitions.items():
+            if rows is None or not len(rows):
+                entries.pop(month, None)
+                continue
+            digest = frame_digest(rows)
+            acciones = rows['Acción'].value_counts(sort=False)
+            entries[month] = {
+                'rows': len(rows),
+                'digest': digest,
+                'acciones': {str(label): int(n)
+                             for label, n in acciones.items() if n},
+            }
+            if month == NO_DATE:
+                entries[month]['failures'] = failures
+            if not os.path.exists(self.path(month, digest)):
+                write_snapshot(rows, self.path(month, digest),
+                               metadata={'month': month})
+                written.append(month)
+
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = (f'{self.manifest_path}.{os.getpid()}.'
+                    f'{threading.get_ident()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'partitions': dict(sorted(entries.items())),
+                       'sheets': sheets}, f,
+                      indent=1, ensure_ascii=False)
+        listed = {os.path.basename(self.path(month, entry['digest']))
+                  for month, entry in entries.items()}
+        listed.update(entry['seen'] for entry in sheets.values())
+        seen_dir = os.path.join(self.directory, 'seen')
+        # No read is between its manifest and its files while they change
+        with self.locked(FILES_LOCK, exclusive=True):
+            os.replace(tmp_path, self.manifest_path)
+            # Files are removed once the manifest no longer lists them
+            for name in os.listdir(self.directory):
+                if name.endswith('.parquet') and name not in listed:
+                    os.remove(os.path.join(self.directory, name))
+            if os.path.isdir(seen_dir):
+                for name in os.listdir(seen_dir):
+                    if f'seen/{name}' not in listed:
+                        os.remove(os.path.join(seen_dir, name))
+        return written
+
+    def read(self, start=None, partitions=None):
+        '''
+        Dataset of the months from start on (every month if None), None if
+        the store was never written. A store holding no rows in those
+        months (e.g. every sheet empty) gives the dataset without rows. The
+        months in partitions (month -> rows, e.g. those just rewritten by
+        update) are taken from it instead of disk.
+        '''
+        partitions = partitions or {}
+        if not os.path.exists(self.manifest_path):
+            return None
+        with self.locked(FILES_LOCK, exclusive=False):
+            while True:
+                manifest = self.manifest()
+                try:
+                    df = HistoryStore.assemble(
+                        self.frames(manifest, start, partitions))
+                    break
+                except FileNotFoundError:
+                    # A stale manifest (replaced meanwhile by a writer
+                    # without the lock) is read again, a damaged one raises
+                    if self.manifest() == manifest:
+                        raise
+        if df is None:
+            return DailyActionsWrangling.empty_dataset()
+        return df
+
+    def frames(self, manifest, start, partitions):
+        entries = manifest['partitions']
+        for month in HistoryStore.select(sorted(entries), start):
+            if month in partitions:
+                yield partitions[month]
+                continue
+            df = self.load(month, entries[month])
+            snapshot = df.attrs['snapshot']
+            df.attrs['fecha_parse_failures'] = snapshot.get(
+                'fecha_parse_failures', 0)
+            yield df
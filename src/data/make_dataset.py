@@ -1,10 +1,20 @@
 # -*- coding: utf-8 -*-
+import sys
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 import re
-from src.utils import DAILY_ACTIONS_DTYPES_DICT, DAILY_ACTIONS_SHEET_DICT
-from src.data.collect_data import read_google_spreadsheet
-
-# PENDING: Add a datatype formating funtion
+from functools import lru_cache
+from src.utils import (DAILY_ACTIONS_DTYPES_DICT, DAILY_ACTIONS_SHEET_DICT,
+                       CLEANING_PATTERNS, DATE_FORMATS,
+                       PROFILE_CHUNK_SIZE, SHEET_COLUMNS)
+from src.data.collect_data import (iter_google_spreadsheets,
+                                   read_google_spreadsheets)
+from src.data.dedupe import (FingerprintSet, drop_duplicate_rows,
+                             frame_digest, row_fingerprints)
+from src.data.gazetteer import get_gazetteer
+from src.data.profiling import ColumnProfiler
+from src.instrumentation import stage, timed
 
 class DataExploring:
 
@@ -49,6 +59,69 @@ class DataExploring:
         for col, conteo, valor in zip(columnas, conteos, valores):
             print(formato_fila.format(col, conteo, valor))
 
+    def chunks(data, chunk_size=PROFILE_CHUNK_SIZE):
+        '''
+        Chunks of a DataFrame (slices, not copies); the DataFrames of any
+        other iterable, which may also yield (code, DataFrame) pairs
+        '''
+        if isinstance(data, pd.DataFrame):
+            return (data.iloc[start:start + chunk_size]
+                    for start in range(0, len(data), chunk_size))
+        return (item[1] if isinstance(item, tuple) else item
+                for item in data)
+
+    def profile(self, data, sample=None, date_columns=('Fecha',),
+                chunk_size=PROFILE_CHUNK_SIZE, seed=0):
+        '''
+        Profile of a DataFrame, or of an iterable of DataFrames or of
+        (code, DataFrame) pairs (e.g. DailyActionsWrangling.fetch_sheets)
+        read in a single pass: one row per column with its rows, missing
+        values and their rate, distinct count (exact up to
+        PROFILE_EXACT_LIMIT values, HyperLogLog above), exact value counts
+        of low-cardinality columns, top values, and the parse failures of
+        the text date_columns. With sample (a fraction), only that share of
+        the rows of every chunk is profiled.
+        '''
+        rng = np.random.default_rng(seed)
+        profilers = {}
+        rows = 0
+        for chunk in DataExploring.chunks(data, chunk_size):
+            rows += len(chunk)
+            if sample is not None:
+                chunk = chunk[rng.random(len(chunk)) < sample]
+            for columna in chunk.columns:
+                if columna not in profilers:
+                    parse = None
+                    if (columna in date_columns
+                            and not pd.api.types.is_datetime64_any_dtype(
+                                chunk[columna])):
+                        parse = DataExploring.date_parser(columna)
+                    profilers[columna] = ColumnProfiler(columna, parse)
+                profilers[columna].update(chunk[columna])
+
+        profile = pd.DataFrame.from_dict(
+            {c: p.result() for c, p in profilers.items()}, orient='index')
+        if ('Fecha' in profile.index and sample is None
+                and 'fecha_parse_failures' in getattr(data, 'attrs', {})):
+            # Fecha was parsed upstream, its failures are already missing
+            # values
+            failures = data.attrs['fecha_parse_failures']
+            profile.loc['Fecha', 'parse_failures'] = failures
+            present = (profile.loc['Fecha', 'rows']
+                       - profile.loc['Fecha', 'missing'] + failures)
+            profile.loc['Fecha', 'parse_failure_rate'] = (
+                failures / present if present else None)
+        profile.attrs['rows'] = rows
+        profile.attrs['sample'] = sample
+        return profile
+
+    def date_parser(columna, formats=DATE_FORMATS):
+        def parse(values):
+            df = DailyActionsWrangling.parse_dates(
+                pd.DataFrame({columna: values}), columna, formats)
+            return df[columna]
+        return parse
+
 class DailyActionsWrangling:
 
     def rename_columns(df):
@@ -57,48 +130,100 @@ class DailyActionsWrangling:
         
         return df
 
-    def format_columns(df):
+    @timed('format')
+    def format_columns(df, dtypes=DAILY_ACTIONS_DTYPES_DICT):
         '''
         Convert the columns in the DataFrame using the dtypes_dict
         '''
-        df = df.astype(DAILY_ACTIONS_DTYPES_DICT)
+        df = df.astype({c: t for c, t in dtypes.items() if c in df.columns})
         return df
 
-    def concat_columns(sheet_dict):
-        # Create a mapping from sheet names to their order
-        sheet_names = list(sheet_dict.keys())
-        sheet_order = {sheet: i for i, sheet in enumerate(sheet_names)}
-        
-        df = pd.DataFrame()
-        
-        for sheet in sheet_names:
-            df_new = read_google_spreadsheet(sheet_name=sheet)
-            # df_new = DailyActionsWrangling.format_columns(df_new)
-            
-            # Assign a rank based on the sheet name
-            df_new['SheetOrder'] = sheet_order.get(sheet, float('inf'))  # Default to inf if sheet not found
-            
-            df = pd.concat([df, df_new], axis=0)
-        
-        # Sort by SheetOrder, Departamento, and Municipio
-        df.sort_values(['SheetOrder', 'Departamento', 'Municipio'], inplace=True)
-        
-        # Add 'Acción' column based on the sheet name
-        # Map sheet names to their replacement values
-        df['Acción'] = df['SheetOrder'].map({v: k for k, v in sheet_order.items()})
-        df['Acción'] = df['Acción'].replace(sheet_dict)
-        
-        # Drop the 'SheetOrder' column if it's no longer needed
-        df.drop(columns=['SheetOrder'], inplace=True)
+    def memory_report(df_before, df_after):
+        '''
+        Memory (bytes) of every column before and after format_columns
+        '''
+        report = pd.DataFrame({
+            'before': df_before.memory_usage(index=False, deep=True),
+            'after': df_after.memory_usage(index=False, deep=True)
+        })
+        report.loc['Total'] = report.sum()
+        report['ratio'] = (report['after'] / report['before']).round(3)
+        return report
+
+    def concat_frames(frames):
+        '''
+        Concatenate cleaned frames keeping their categorical columns: the
+        categories are unioned first, pd.concat would fall back to object
+        '''
+        frames = list(frames)
+        for col in frames[0].columns:
+            if not all(isinstance(f[col].dtype, pd.CategoricalDtype)
+                       for f in frames):
+                continue
+            if all(f[col].dtype == frames[0][col].dtype for f in frames):
+                continue
+            categories = union_categoricals([f[col] for f in frames],
+                                            ignore_order=True).categories
+            frames = [f.assign(**{col: f[col].cat.set_categories(categories)})
+                      for f in frames]
+        return pd.concat(frames, axis=0, ignore_index=True)
 
+    def prepare_sheet(df_new, code, accion_dtype):
+        '''
+        Tag the rows of a sheet with the 'Acción' category at position code
+        of accion_dtype. Rows are sorted later, once cleaned and deduplicated.
+        '''
+        # Add 'Acción' column based on the sheet position
+        accion = pd.Categorical.from_codes(np.full(len(df_new), code),
+                                           dtype=accion_dtype)
+        return df_new.assign(**{'Acción': accion})
+
+    def complete_sheet(df_new):
+        '''
+        A sheet with only its header (or nothing) has no records and comes
+        as a frame without columns: it gets the SHEET_COLUMNS, so it cleans
+        to an empty frame like any other sheet
+        '''
+        if len(df_new.columns) == 0:
+            df_new = pd.DataFrame({c: pd.Series(dtype=object)
+                                   for c in SHEET_COLUMNS})
+        return df_new
+
+    def accion_dtype(sheet_dict):
+        return pd.CategoricalDtype(list(sheet_dict.values()), ordered=True)
+
+    def empty_dataset(sheet_dict=DAILY_ACTIONS_SHEET_DICT):
+        '''
+        The dataset of sheets without records: the columns and dtypes of the
+        cleaned dataset, no rows
+        '''
+        return DailyActionsWrangling.clean_sheet(
+            DailyActionsWrangling.complete_sheet(pd.DataFrame()), 0,
+            DailyActionsWrangling.accion_dtype(sheet_dict))
+
+    def assemble_sheets(sheet_dict, sheets):
+        '''
+        Stack the sheet DataFrames (given in sheet_dict order) with a single
+        concat. 'Acción' is an ordered categorical built from the sheet_dict
+        values, in the order of the sheets.
+        '''
+        accion_dtype = DailyActionsWrangling.accion_dtype(sheet_dict)
+        rows_in = sum(len(df_new) for df_new in sheets)
+        with stage('assemble', rows_in=rows_in) as record:
+            frames = [
+                DailyActionsWrangling.prepare_sheet(df_new, code, accion_dtype)
+                for code, df_new in enumerate(sheets)]
+            df = pd.concat(frames, axis=0, ignore_index=True)
+            record.rows_out = len(df)
         return df
+
+    def concat_columns(sheet_dict, gc=None):
+        # Fetch every sheet concurrently, keeping the order of sheet_dict
+        sheets = read_google_spreadsheets(list(sheet_dict.keys()), gc=gc)
+        return DailyActionsWrangling.assemble_sheets(sheet_dict, sheets)
     
-    def clean_column(x):
+    def clean_column(x, patterns=CLEANING_PATTERNS):
         x = str(x)
-        # Define patterns for standardizing columns
-        patterns = {
-            r'%20': ' '
-        }
         # Replace street types using regular expressions
         for pattern, replacement in patterns.items():
             x = re.sub(pattern, replacement, x, flags=re.IGNORECASE)
@@ -106,23 +231,307 @@ class DailyActionsWrangling:
         # x = re.sub('#|°|\.|\,', ' ', x)
         return x.strip()        
 
-    def clean_all_columns(df):
-        # Remove duplicated rows
-        df.drop_duplicates(keep='last', inplace=True)
-        df.reset_index(drop=True, inplace=True)
+    @lru_cache(maxsize=None)
+    def compile_patterns(patterns):
+        '''
+        Compile a tuple of (pattern, replacement) pairs, plus a single
+        alternation used to find the values that need any replacement
+        '''
+        compiled = [(re.compile(p, re.IGNORECASE), r) for p, r in patterns]
+        detector = None
+        if patterns:
+            detector = re.compile('|'.join(f'(?:{p})' for p, _ in patterns),
+                                  re.IGNORECASE)
+        return compiled, detector
+
+    def clean_values(values, patterns=CLEANING_PATTERNS):
+        '''
+        Vectorized clean_column over an array of values, returns an object
+        array
+        '''
+        compiled, detector = DailyActionsWrangling.compile_patterns(
+            tuple(patterns.items()))
+        values = pd.Series(values, dtype=object).astype(str)
+        # Only run the replacements on the values matching some pattern
+        if detector is not None:
+            dirty = values.str.contains(detector).to_numpy(dtype=bool)
+            if dirty.any():
+                replaced = values[dirty]
+                for pattern, replacement in compiled:
+                    replaced = replaced.str.replace(pattern, replacement,
+                                                    regex=True)
+                values[dirty] = replaced
+        return values.str.strip().to_numpy(dtype=object)
+
+    def clean_series(s, patterns=CLEANING_PATTERNS):
+        '''
+        Clean a column working on its distinct values only. Categorical columns
+        keep their dtype when the cleaned categories stay unique, and their
+        missing values stay missing (as with Series.apply).
+        '''
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            categories = pd.Index(DailyActionsWrangling.clean_values(
+                s.cat.categories, patterns))
+            if categories.is_unique:
+                return s.cat.rename_categories(categories)
+            # Categories equal once cleaned: back to text
+            codes = s.cat.codes.to_numpy()
+            cleaned = np.where(codes >= 0, categories.to_numpy().take(codes),
+                               np.nan)
+            return pd.Series(cleaned, index=s.index, name=s.name,
+                             dtype=object)
+        values = s
+        if pd.api.types.infer_dtype(s, skipna=False) != 'string':
+            # Mixed values (1 and 1.0, None and nan) must be textified before
+            # factorizing, otherwise they would share a code
+            values = s.astype(object).astype(str)
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        cleaned = DailyActionsWrangling.clean_values(uniques, patterns)
+        return pd.Series(cleaned.take(codes), index=s.index, name=s.name,
+                         dtype=object)
+
+    def sort_rows(df):
+        '''
+        Stable sort by sheet ('Acción' order), Departamento and Municipio
+        (alphabetical, also when they are categoricals)
+        '''
+        def key(s):
+            return s if s.name == 'Acción' else s.astype(object)
+        df = df.sort_values(['Acción', 'Departamento', 'Municipio'],
+                            kind='stable', key=key)
+        return df.reset_index(drop=True)
+
+    def clean_all_columns(df, patterns=CLEANING_PATTERNS, seen=None,
+                          gazetteer=None):
+        '''
+        Keep the report columns, clean them, canonicalize Departamento and
+        Municipio (with gazetteer, the shared DIVIPOLA Gazetteer by default),
+        drop the duplicated rows and sort them. Rows are compared by a
+        fingerprint of their cleaned values, so rows differing only in %20
+        encoding, whitespace or the spelling of a place are duplicates; with
+        a FingerprintSet seen, the rows already in it are dropped as well.
+        '''
+        with stage('select_columns', rows_in=len(df)) as record:
+            df = df[['Acción'] + SHEET_COLUMNS]
+            record.rows_out = len(df)
         # Clean each column
-        for c in df.columns:
-            df[c] = df[c].apply(DailyActionsWrangling.clean_column)
-        df = df[['Acción', 'Fecha', 'Departamento', 'Municipio', 
-                 'Usuario', 'Tipo Usuario', 'Actividades rutinarias']]
+        with stage('clean', rows_in=len(df)) as record:
+            df = pd.DataFrame({
+                c: DailyActionsWrangling.clean_series(df[c], patterns)
+                for c in df.columns})
+            record.rows_out = len(df)
+        # Spelling, accent and case variants of the places to DIVIPOLA names
+        with stage('canonicalize', rows_in=len(df)) as record:
+            df = (gazetteer or get_gazetteer()).canonicalize(df)
+            record.rows_out = len(df)
+        # Remove duplicated rows, keeping the first one
+        with stage('dedupe', rows_in=len(df)) as record:
+            df = drop_duplicate_rows(df, seen=seen)
+            record.rows_out = len(df)
+        with stage('sort', rows_in=len(df)) as record:
+            df = DailyActionsWrangling.sort_rows(df)
+            record.rows_out = len(df)
+        return df
+
+    @timed('parse_dates')
+    def parse_dates(df, column='Fecha', formats=DATE_FORMATS):
+        '''
+        Parse column into datetime64 trying every format in turn, once per
+        distinct value. The number of non-empty values that no format could
+        parse is kept in df.attrs['fecha_parse_failures']
+        '''
+        codes, uniques = pd.factorize(df[column].astype(str),
+                                      use_na_sentinel=False)
+        text = pd.Series(uniques, dtype=object)
+        parsed = pd.Series(pd.NaT, index=text.index, dtype='datetime64[ns]')
+        for fmt in formats:
+            missing = parsed.isna().to_numpy()
+            if not missing.any():
+                break
+            parsed[missing] = pd.to_datetime(text[missing], format=fmt,
+                                             errors='coerce')
+
+        failed = (parsed.isna() & (text != '')).to_numpy()
+        df = df.assign(**{column: parsed.to_numpy().take(codes)})
+        df.attrs['fecha_parse_failures'] = int(failed.take(codes).sum())
         return df
 
-    def make_daily_actions_dataset(self):
+    def clean_sheet(df_new, code, accion_dtype, patterns=CLEANING_PATTERNS,
+                    seen=None):
+        '''
+        Tag, clean, deduplicate, sort and type the raw rows of the sheet at
+        position code
+        '''
+        df_new = DailyActionsWrangling.prepare_sheet(df_new, code,
+                                                     accion_dtype)
+        df_new = DailyActionsWrangling.clean_all_columns(df_new, patterns,
+                                                         seen=seen)
+        df_new = DailyActionsWrangling.parse_dates(df_new)
+        return DailyActionsWrangling.format_columns(df_new)
+
+    # The dataset is built by a pipeline of generators over (code, DataFrame)
+    # pairs, code being the position of the sheet in sheet_dict: every stage
+    # takes any iterable of pairs, so a local source can stand in for Sheets
+
+    def fetch_sheets(sheet_dict, gc=None):
+        '''
+        Yield (code, raw DataFrame) for the sheets of sheet_dict as they arrive
+        '''
+        return iter_google_spreadsheets(list(sheet_dict.keys()), gc=gc)
+
+    def clean_sheets(sheets, sheet_dict, patterns=CLEANING_PATTERNS):
+        '''
+        Clean every (code, raw DataFrame) of sheets as it comes. With
+        fetch_sheets as source, a sheet is cleaned while the following ones
+        are still downloading.
+        '''
+        accion_dtype = DailyActionsWrangling.accion_dtype(sheet_dict)
+        for code, df_new in sheets:
+            df_new = DailyActionsWrangling.complete_sheet(df_new)
+            yield code, DailyActionsWrangling.clean_sheet(
+                df_new, code, accion_dtype, patterns)
+
+    def merge_sheets(cleaned):
+        '''
+        Stack the cleaned sheets in code order. Duplicates never span sheets
+        ('Acción' differs) and rows are sorted by 'Acción' first, so this is
+        the dataset the whole-frame stages would give.
+        '''
+        frames = [df for _, df in sorted(cleaned, key=lambda pair: pair[0])]
+        with stage('merge', rows_in=sum(len(df) for df in frames)) as record:
+            df = DailyActionsWrangling.concat_frames(frames)
+            df.attrs['fecha_parse_failures'] = sum(
+                f.attrs.get('fecha_parse_failures', 0) for f in frames)
+            record.rows_out = len(df)
+        return df
+
+    def make_daily_actions_dataset(self, gc=None, sync=None):
         # df = df.sample(3, random_state=123) # Temporal
         # df = df.head(10) # Temporal
-        df = DailyActionsWrangling.concat_columns(DAILY_ACTIONS_SHEET_DICT)
-        df = DailyActionsWrangling.clean_all_columns(df)
+        with stage('make_dataset', incremental=sync is not None) as record:
+            if sync is not None:
+                # Only re-clean the sheets that changed since the last
+                # refresh, then read the whole history
+                sync.refresh(gc=gc)
+                df = sync.history.read()
+            else:
+                # Each sheet is cleaned as soon as it arrives
+                sheets = DailyActionsWrangling.fetch_sheets(
+                    DAILY_ACTIONS_SHEET_DICT, gc=gc)
+                cleaned = DailyActionsWrangling.clean_sheets(
+                    sheets, DAILY_ACTIONS_SHEET_DICT)
+                df = DailyActionsWrangling.merge_sheets(cleaned)
+            record.rows_out = len(df)
         return df
 
+
+class DailyActionsSync:
+    '''
+    Incremental refresh of the daily-actions history (a HistoryStore, which
+    keeps the fingerprint of every raw sheet and the row fingerprints of its
+    cleaned rows). Only the sheets that changed since the history was last
+    updated, also by another process (refreshes hold the write lock of the
+    history), are cleaned again and only the months of their rows
+    rewritten. When rows were only appended to a sheet, just the new rows
+    are cleaned and checked against the rows already kept.
+    Nothing but the names of the sheets changed by the last refresh is kept
+    in memory.
+    '''
+
+    def __init__(self, history, sheet_dict=DAILY_ACTIONS_SHEET_DICT):
+        self.history = history
+        self.sheet_dict = sheet_dict
+        self.changed = []
+        self.refreshes = 0
+
+    @staticmethod
+    def fingerprint(df, row_hashes=None):
+        '''
+        Row count, column names and digest (frame_digest) of a raw sheet
+        '''
+        return len(df), tuple(df.columns), frame_digest(df, row_hashes)
+
+    @staticmethod
+    def appended(previous, df, row_hashes):
+        '''
+        Whether df is the sheet of fingerprint previous with rows appended
+        '''
+        n_rows, columns, _ = previous
+        head = DailyActionsSync.fingerprint(df.iloc[:n_rows],
+                                            row_hashes[:n_rows])
+        return (len(df) > n_rows and tuple(df.columns) == columns
+                and head == previous)
+
+    def refresh(self, gc=None):
+        '''
+        Update the history from the sheets. Returns the partitions rewritten
+        (month -> rows), the cleaned rows added and those removed (None when
+        the whole history was replaced), to update aggregates.
+        '''
+        sheet_names = list(self.sheet_dict.keys())
+        accion_dtype = DailyActionsWrangling.accion_dtype(self.sheet_dict)
+        # The stored state is read and updated under the write lock, so a
+        # refresh of another process never applies the same changes twice
+        with self.history.writing():
+            stored = self.history.sheets()
+            # Without the state of every sheet, or with files of the history
+            # missing, the history is built again
+            reset = (any(sheet not in stored for sheet in sheet_names)
+                     or bool(self.history.missing()))
+
+            changes, fingerprints, seen = [], {}, {}
+            # Sheets are compared and cleaned as they arrive
+            sheets = DailyActionsWrangling.fetch_sheets(self.sheet_dict, gc=gc)
+            for code, df_new in sheets:
+                sheet = sheet_names[code]
+                df_new = DailyActionsWrangling.complete_sheet(df_new)
+                row_hashes = row_fingerprints(df_new)
+                fingerprint = DailyActionsSync.fingerprint(df_new, row_hashes)
+                previous = None if reset else stored[sheet]
+                if previous == fingerprint:
+                    continue
+                # Duplicates never span sheets ('Acción' differs), so every
+                # sheet can be deduplicated and cleaned on its own
+                appended = (previous is not None
+                            and DailyActionsSync.appended(previous, df_new,
+                                                          row_hashes))
+                if appended:
+                    seen[sheet] = self.history.seen(sheet)
+                    df_new = df_new.iloc[previous[0]:]
+                else:
+                    seen[sheet] = FingerprintSet()
+                df = DailyActionsWrangling.clean_sheet(
+                    df_new, code, accion_dtype, seen=seen[sheet])
+                changes.append((self.sheet_dict[sheet], df, not appended))
+                fingerprints[sheet] = fingerprint
+
+            # Nothing is stored from a refresh failing half-way
+            with stage('write_history',
+                       rows_in=sum(len(df) for _, df, _ in changes)) as record:
+                partitions, written, removed = self.history.update(
+                    changes, fingerprints, seen, reset=reset)
+                record.rows_out = sum(len(partitions[m]) for m in written)
+        # In sheet_dict order, whatever the order the sheets arrived in
+        self.changed = [sheet for sheet in sheet_names
+                        if sheet in fingerprints]
+        self.refreshes += 1
+        return partitions, [df for _, df, _ in changes], removed
+
+
 if __name__ == '__main__':
-    print(DailyActionsWrangling.make_daily_actions_dataset())
+    # python src/data/make_dataset.py [history_dir]
+    # Updates the history with the sheets changed since the last run
+    from src.data.history_store import HistoryStore
+    history = HistoryStore(*sys.argv[1:2])
+    sync = DailyActionsSync(history)
+    partitions, added, removed = sync.refresh()
+    print(f"Hojas actualizadas: {', '.join(sync.changed) or 'ninguna'}")
+    print(f"Meses reescritos: {', '.join(sorted(partitions)) or 'ninguno'}")
+    df = history.read()
+    print(df)
+    print(f"Fechas sin interpretar: {df.attrs['fecha_parse_failures']}")
+    # Memory saved by the dtype plan: the cleaned columns are text before
+    # format_columns
+    unformatted = df.astype({c: object for c in DAILY_ACTIONS_DTYPES_DICT
+                             if c != 'Fecha'})
+    print(DailyActionsWrangling.memory_report(unformatted, df))
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from src.data.dedupe import column_hashes
+from src.utils import PROFILE_EXACT_LIMIT, PROFILE_HLL_PRECISION, PROFILE_TOP_K
+
+
+class HyperLogLog:
+    '''
+    HyperLogLog sketch of the distinct values seen: 2**precision one-byte
+    registers whatever the number of values, with a relative error of about
+    1.04 / sqrt(2**precision). Sketches of the same precision merge.
+    '''
+
+    def __init__(self, precision=PROFILE_HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        '''
+        Add values given by their 64-bit hashes
+        '''
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # Position of the first 1 in the remaining bits (bits + 1 if none)
+        _, length = np.frexp(rest.astype(np.float64))
+        np.maximum.at(self.registers, index,
+                      (bits + 1 - length).astype(np.uint8))
+
+    def add(self, values):
+        self.add_hashes(column_hashes(pd.Series(values)))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        registers = self.registers.astype(np.float64)
+        estimate = alpha * m * m / np.sum(np.exp2(-registers))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class HeavyHitters:
+    '''
+    Mergeable Misra-Gries summary of the most frequent values: keeps at most
+    capacity candidates, whose counts are short of the true ones by at most
+    error. Any value more frequent than error is kept.
+    '''
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype='int64')
+        self.error = 0
+
+    def add_counts(self, counts):
+        '''
+        Add a Series of counts indexed by value
+        '''
+        if len(self.counts):
+            counts = self.counts.add(counts, fill_value=0)
+        if len(counts) > self.capacity:
+            threshold = counts.nlargest(self.capacity + 1).iloc[-1]
+            counts = counts[counts > threshold] - threshold
+            self.error += int(threshold)
+        self.counts = counts.astype('int64')
+
+    def top(self, k):
+        return self.counts.nlargest(k)
+
+
+class ColumnProfiler:
+    '''
+    Single-pass profile of a column fed in chunks: rows, missing values (NA
+    or blank text), exact value counts while there are at most exact_limit
+    distinct values, otherwise a HyperLogLog distinct count and the top_k
+    heavy hitters. With parse (distinct values -> parsed Series, NA where
+    parsing failed), the present values that fail to parse are counted too.
+    '''
+
+    def __init__(self, name, parse=None, exact_limit=PROFILE_EXACT_LIMIT,
+                 top_k=PROFILE_TOP_K, precision=PROFILE_HLL_PRECISION):
+        self.name = name
+        self.parse = parse
+        self.exact_limit = exact_limit
+        self.top_k = top_k
+        self.rows = 0
+        self.missing = 0
+        self.parse_failures = 0 if parse is not None else None
+        self.exact = pd.Series(dtype='int64')
+        self.sketch = HyperLogLog(precision)
+        self.heavy = HeavyHitters(capacity=10 * top_k)
+
+    def update(self, s):
+        self.rows += len(s)
+        # Everything below works on the distinct values of the chunk
+        counts = s.value_counts(dropna=True, sort=False)
+        counts.index = pd.Index(np.asarray(counts.index, dtype=object))
+        counts = counts[counts > 0]
+        blank = counts.index.map(
+            lambda v: isinstance(v, str) and not v.strip())
+        blank = blank.to_numpy(dtype=bool)
+        self.missing += len(s) - int(counts.sum()) + int(counts[blank].sum())
+        counts = counts[~blank]
+
+        self.sketch.add(counts.index)
+        self.heavy.add_counts(counts)
+        if self.exact is not None:
+            self.exact = self.exact.add(counts, fill_value=0).astype('int64')
+            if len(self.exact) > self.exact_limit:
+                self.exact = None
+        if self.parse is not None and len(counts):
+            values = counts.index.to_series(index=range(len(counts)))
+            failed = pd.isna(self.parse(values)).to_numpy()
+            self.parse_failures += int(counts.to_numpy()[failed].sum())
+
+    def result(self):
+        present = self.rows - self.missing
+        exact = self.exact is not None
+        if exact:
+            value_counts = self.exact.sort_values(ascending=False,
+                                                  kind='stable')
+            top = value_counts.head(self.top_k)
+        else:
+            value_counts, top = None, self.heavy.top(self.top_k)
+        return {
+            'rows': self.rows,
+            'missing': self.missing,
+            'missing_rate': self.missing / self.rows if self.rows else None,
+            'distinct': len(self.exact) if exact else self.sketch.count(),
+            'distinct_exact': exact,
+            'value_counts': value_counts.to_dict() if exact else None,
+            'top': list(top.items()),
+            'top_error': 0 if exact else self.heavy.error,
+            'parse_failures': self.parse_failures,
+            'parse_failure_rate': (
+                self.parse_failures / present
+                if self.parse_failures is not None and present else None),
+        }
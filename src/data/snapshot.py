@@ -0,0 +1,64 @@
+import datetime
+import json
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.utils import SNAPSHOT_CATEGORICAL_COLUMNS
+
+# Key of the snapshot header inside the Parquet schema metadata
+SNAPSHOT_METADATA_KEY = b'daily_actions'
+
+
+def write_snapshot(df, path, metadata=None):
+    '''
+    Write the cleaned dataset to a Parquet file with a metadata header. The
+    file is written next to its destination and then moved, so readers never
+    see a partial snapshot.
+    '''
+    header = {
+        'created_at': datetime.datetime.now(
+            datetime.timezone.utc).isoformat(),
+        'rows': len(df),
+        'columns': list(df.columns),
+    }
+    # Pipeline counters kept in attrs (e.g. fecha_parse_failures)
+    header.update({k: v for k, v in df.attrs.items()
+                   if isinstance(v, (int, float, str))})
+    header.update(metadata or {})
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema_metadata = dict(table.schema.metadata or {})
+    schema_metadata[SNAPSHOT_METADATA_KEY] = json.dumps(header).encode('utf-8')
+    table = table.replace_schema_metadata(schema_metadata)
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return header
+
+
+def read_snapshot(path, memory_map=True):
+    '''
+    Load a snapshot written by write_snapshot, or None if there is none. The
+    low-cardinality columns come back as categoricals and the header is kept
+    in df.attrs['snapshot'].
+    '''
+    if not os.path.exists(path):
+        return None
+    schema = pq.read_schema(path)
+    # Columns written as categoricals already keep their categories and order
+    columns = (schema.pandas_metadata or {}).get('columns', [])
+    categoricals = {c['name'] for c in columns
+                    if c['pandas_type'] == 'categorical'}
+    read_dictionary = [c for c in SNAPSHOT_CATEGORICAL_COLUMNS
+                       if c in schema.names and c not in categoricals]
+    table = pq.read_table(path, memory_map=memory_map,
+                          read_dictionary=read_dictionary)
+    # Text columns stay Arrow-backed instead of becoming Python strings
+    with pd.option_context('mode.string_storage', 'pyarrow'):
+        df = table.to_pandas()
+    header = (table.schema.metadata or {}).get(SNAPSHOT_METADATA_KEY)
+    df.attrs['snapshot'] = json.loads(header) if header else {}
+    return df
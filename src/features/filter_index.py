@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from src.features.text_index import TextIndex
+
+
+class FilterIndex:
+    '''
+    Inverted indexes over the filter columns of a DataFrame, built once per
+    dataset load. Every column is factorized into sorted categories and row
+    codes, and the row positions of each category are kept contiguous
+    (CSR layout), so a filter is a lookup plus an intersection of row
+    positions instead of a scan of the frame. Range columns (dates) keep
+    their row positions sorted by value and are queried with searchsorted.
+    Text columns get a token index (TextIndex) for word-prefix search.
+    '''
+
+    def __init__(self, df, columns, range_columns=(), text_columns=()):
+        self.n_rows = len(df)
+        self.categories = {}
+        self.codes = {}
+        self.postings = {}
+        self.values = {}
+        self.sorted_rows = {}
+        self.sorted_values = {}
+        self.text = {col: TextIndex(df[col]) for col in text_columns}
+        for col in range_columns:
+            values = df[col].to_numpy()
+            # Missing values (NaT) sort last and are left out
+            order = np.argsort(values, kind='stable')
+            valid = int((~pd.isna(values)).sum())
+            self.values[col] = values
+            self.sorted_rows[col] = order[:valid]
+            self.sorted_values[col] = values[order[:valid]]
+        for col in columns:
+            values = df[col]
+            # Ordered categoricals keep their order, anything else is sorted
+            if (isinstance(values.dtype, pd.CategoricalDtype)
+                    and not values.cat.ordered):
+                values = values.astype(object)
+            codes, categories = pd.factorize(values, sort=True)
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order],
+                                     np.arange(-1, len(categories) + 1))
+            self.categories[col] = categories
+            self.codes[col] = codes
+            # Missing values (code -1) are left out of the postings
+            self.postings[col] = (order[bounds[1]:], bounds[1:] - bounds[1])
+
+    def options(self, col, positions=None):
+        '''
+        Sorted values of col present in the rows at positions (all rows if
+        None)
+        '''
+        categories = self.categories[col]
+        if positions is None:
+            return categories.tolist()
+        codes = self.codes[col][positions]
+        present = np.bincount(codes[codes >= 0], minlength=len(categories)) > 0
+        return categories[present].tolist()
+
+    def rows(self, col, values):
+        '''
+        Sorted row positions where col takes any of values
+        '''
+        order, bounds = self.postings[col]
+        wanted = self.categories[col].get_indexer(list(values))
+        wanted = wanted[wanted >= 0]
+        if not len(wanted):
+            return np.array([], dtype=np.intp)
+        if len(wanted) == 1:
+            return order[bounds[wanted[0]]:bounds[wanted[0] + 1]]
+        return np.sort(np.concatenate([order[bounds[c]:bounds[c + 1]]
+                                       for c in wanted]))
+
+    def select(self, col, values, positions=None):
+        '''
+        Narrow positions (all rows if None) to the rows where col takes any of
+        values. Works from the postings or from the codes of the current
+        positions, whichever is smaller.
+        '''
+        if positions is None:
+            return self.rows(col, values)
+        order, bounds = self.postings[col]
+        wanted = self.categories[col].get_indexer(list(values))
+        wanted = wanted[wanted >= 0]
+        matches = int((bounds[wanted + 1] - bounds[wanted]).sum())
+        if matches < len(positions):
+            return np.intersect1d(positions, self.rows(col, values),
+                                  assume_unique=True)
+        return positions[np.isin(self.codes[col][positions], wanted)]
+
+    def bounds(self, col):
+        '''
+        Smallest and largest value of a range column, None if it is empty
+        '''
+        values = self.sorted_values[col]
+        return (values[0], values[-1]) if len(values) else None
+
+    def select_range(self, col, start, end, positions=None):
+        '''
+        Narrow positions (all rows if None) to the rows where
+        start <= col < end
+        '''
+        values = self.sorted_values[col]
+        start, end = np.array([start, end], dtype=values.dtype)
+        lo, hi = np.searchsorted(values, [start, end], side='left')
+        if positions is None or hi - lo < len(positions):
+            rows = np.sort(self.sorted_rows[col][lo:hi])
+            if positions is None:
+                return rows
+            return np.intersect1d(positions, rows, assume_unique=True)
+        current = self.values[col][positions]
+        return positions[(current >= start) & (current < end)]
+
+    def select_from(self, col, start, positions=None):
+        '''
+        Narrow positions (all rows if None) to the rows where start <= col or
+        col is missing
+        '''
+        values = self.values[col]
+        keep = ~(values < np.array(start, dtype=values.dtype))
+        rows = np.flatnonzero(keep)
+        return rows if positions is None else positions[keep[positions]]
+
+    def search(self, col, query, positions=None):
+        '''
+        Narrow positions (all rows if None) to the rows where the text col has
+        a word starting with every term of query (accents and case ignored)
+        '''
+        return self.text[col].search(query, positions)
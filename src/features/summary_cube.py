@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+from src.data.make_dataset import DailyActionsWrangling
+from src.utils import SUMMARY_DIMENSIONS, SUMMARY_CUBOIDS
+
+MEASURE = 'Acciones'
+
+
+def week_start(fecha):
+    '''
+    Monday of the week of every date, NaT stays NaT
+    '''
+    fecha = fecha.dt.normalize()
+    return fecha - pd.to_timedelta(fecha.dt.dayofweek, unit='D')
+
+
+def month_start(fecha):
+    '''
+    First day of the month of every date, NaT stays NaT
+    '''
+    fecha = fecha.dt.normalize()
+    return fecha - pd.to_timedelta(fecha.dt.day - 1, unit='D')
+
+
+def aggregate(cells, dimensions):
+    '''
+    Sum the measure of cells by dimensions (missing values are a group too)
+    '''
+    counts = cells.groupby(dimensions, observed=True, dropna=False,
+                           sort=False)[MEASURE].sum()
+    return counts[counts != 0].reset_index()
+
+
+class SummaryCube:
+    '''
+    Counts of actions by Departamento x Municipio x Acción x week x month x
+    Tipo Usuario, built once per dataset, plus the coarser roll-ups of
+    SUMMARY_CUBOIDS. Every query is answered from the smallest cuboid having
+    its dimensions, without touching the rows. The cube is immutable:
+    updated returns a new one, so readers never see a half-applied change.
+    '''
+
+    def __init__(self, cuboids):
+        self.cuboids = cuboids
+
+    @staticmethod
+    def count_rows(df, sign=1):
+        '''
+        Base cells (counts by every dimension) of the rows of a dataset
+        '''
+        keys = df[[d for d in SUMMARY_DIMENSIONS
+                   if d not in ('Semana', 'Mes')]]
+        keys = keys.assign(Semana=week_start(df['Fecha']),
+                           Mes=month_start(df['Fecha']))[SUMMARY_DIMENSIONS]
+        counts = keys.groupby(SUMMARY_DIMENSIONS, observed=True,
+                              dropna=False, sort=False).size()
+        return (counts * sign).rename(MEASURE).reset_index()
+
+    @classmethod
+    def from_cells(cls, cells):
+        cuboids = {tuple(SUMMARY_DIMENSIONS): cells}
+        for dimensions in SUMMARY_CUBOIDS:
+            cuboids[tuple(dimensions)] = aggregate(cells, dimensions)
+        return cls(cuboids)
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls.from_cells(SummaryCube.count_rows(df))
+
+    @property
+    def cells(self):
+        return self.cuboids[tuple(SUMMARY_DIMENSIONS)]
+
+    def updated(self, added=(), removed=()):
+        '''
+        New cube with the rows of the frames added counted and the rows of
+        the frames removed discounted. Costs the size of the cube, not of
+        the dataset.
+        '''
+        deltas = ([SummaryCube.count_rows(df) for df in added]
+                  + [SummaryCube.count_rows(df, sign=-1) for df in removed])
+        if not deltas:
+            return self
+        # Categoricals keep their dtype (and the order of 'Acción')
+        cells = DailyActionsWrangling.concat_frames([self.cells] + deltas)
+        return SummaryCube.from_cells(aggregate(cells, SUMMARY_DIMENSIONS))
+
+    def cuboid(self, dimensions):
+        '''
+        Smallest pre-aggregated cuboid having every one of dimensions
+        '''
+        dimensions = set(dimensions)
+        candidates = [cells for key, cells in self.cuboids.items()
+                      if dimensions <= set(key)]
+        return min(candidates, key=len)
+
+    def select(self, dimensions, filters=None, start=None, end=None,
+               since=None):
+        '''
+        Cells of the smallest cuboid answering a query on dimensions, with
+        filters (dimension -> accepted values, empty means all), the weeks
+        of the dates in [start, end] and the months from since on (the first
+        day of a month, as the history scope; actions without Fecha are
+        kept, as FilterIndex.select_from does) applied
+        '''
+        filters = {d: v for d, v in (filters or {}).items()
+                   if v is not None and len(v)}
+        needed = set(dimensions) | set(filters)
+        if start is not None or end is not None:
+            needed.add('Semana')
+        if since is not None:
+            needed.add('Mes')
+        cells = self.cuboid(needed)
+
+        mask = np.ones(len(cells), dtype=bool)
+        for dimension, values in filters.items():
+            mask &= cells[dimension].isin(values).to_numpy()
+        if start is not None:
+            first = week_start(pd.Series([pd.Timestamp(start)]))[0]
+            mask &= (cells['Semana'] >= first).to_numpy()
+        if end is not None:
+            mask &= (cells['Semana'] <= pd.Timestamp(end)).to_numpy()
+        if since is not None:
+            mask &= ~(cells['Mes'] < pd.Timestamp(since)).to_numpy()
+        return cells if mask.all() else cells[mask]
+
+    def rollup(self, rows, columns=None, filters=None, start=None, end=None,
+               since=None):
+        '''
+        Actions by the dimensions rows, pivoted on the dimension columns if
+        given. Drilling down is adding a dimension to rows and filtering on
+        the value of the level above.
+        '''
+        by = list(rows) + ([columns] if columns else [])
+        cells = self.select(by, filters, start, end, since)
+        counts = cells.groupby(by, observed=True, sort=True)[MEASURE].sum()
+        if columns:
+            return counts.unstack(columns, fill_value=0)
+        return counts.to_frame()
+
+    def total(self, filters=None, start=None, end=None, since=None):
+        return int(self.select([], filters, start, end, since)[MEASURE].sum())
+
+    def options(self, dimension, filters=None):
+        '''
+        Values of dimension having actions under filters, sorted
+        '''
+        cells = self.select([dimension], filters)
+        values = cells[dimension]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            present = values.cat.remove_unused_categories()
+            if present.cat.ordered:
+                return present.cat.categories.tolist()
+            values = present.cat.categories.to_series()
+        return sorted(values.dropna().unique().tolist())
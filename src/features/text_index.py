@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Combining marks left by NFKD, removed to fold accents (á -> a, ñ -> n)
+COMBINING_MARKS = r'\p{Mn}'
+TOKEN_SEPARATOR = r'[^\p{L}\p{N}_]+'
+# Sorts after every character, term + MAX_CHAR bounds the tokens prefixed by
+# term
+MAX_CHAR = '\U0010ffff'
+
+
+def fold(values):
+    '''
+    Lowercase and strip the accents of an Arrow array of strings
+    '''
+    values = pc.utf8_normalize(values, form='NFKD')
+    return pc.utf8_lower(
+        pc.replace_substring_regex(values, COMBINING_MARKS, ''))
+
+
+def expand_ranges(starts, counts):
+    '''
+    Concatenation of range(start, start + count) for every start and count
+    '''
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return np.arange(counts.sum()) + offsets
+
+
+def tokenize(values):
+    '''
+    Tokenize an Arrow array of strings: returns the sorted vocabulary of
+    folded word tokens, and the vocabulary position and the position in
+    values of every token. Only the distinct words are folded and split.
+    '''
+    words = pc.utf8_split_whitespace(values)
+    word_values = pc.list_parent_indices(words).to_numpy()
+    words = pc.dictionary_encode(pc.list_flatten(words))
+
+    # Tokens of every distinct word (a word like 'alcaldía,' is 'alcaldia')
+    pieces = pc.split_pattern_regex(fold(words.dictionary), TOKEN_SEPARATOR)
+    piece_words = pc.list_parent_indices(pieces).to_numpy()
+    pieces = pc.list_flatten(pieces)
+    present = pc.not_equal(pieces, '').to_numpy(zero_copy_only=False)
+    pieces, piece_words = pieces.filter(present), piece_words[present]
+
+    # Sorted vocabulary, and the vocabulary position of every piece
+    pieces = pc.dictionary_encode(pieces)
+    order = pc.array_sort_indices(pieces.dictionary).to_numpy()
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    vocabulary = pieces.dictionary.take(order).to_numpy(zero_copy_only=False)
+    piece_tokens = rank[pieces.indices.to_numpy()]
+
+    # Pieces of every word occurrence
+    occurrences = words.indices.to_numpy()
+    word_bounds = np.searchsorted(piece_words,
+                                  np.arange(len(words.dictionary) + 1))
+    counts = word_bounds[occurrences + 1] - word_bounds[occurrences]
+    tokens = piece_tokens[expand_ranges(word_bounds[occurrences], counts)]
+    return vocabulary, tokens, np.repeat(word_values, counts)
+
+
+def query_terms(query):
+    '''
+    Folded tokens of a search query
+    '''
+    vocabulary, tokens, _ = tokenize(pa.array([query or ''], type=pa.string()))
+    return vocabulary[tokens].tolist()
+
+
+class TextIndex:
+    '''
+    Inverted token index over a text column. Texts are accent folded,
+    lowercased and split into word tokens (once per distinct word); every
+    token of the sorted vocabulary has a sorted int32 array of the rows
+    containing it (CSR layout). A query term matches every token it
+    prefixes, a contiguous range of the vocabulary.
+    '''
+
+    def __init__(self, values):
+        self.n_rows = len(values)
+        codes, texts = pd.factorize(pd.Series(values), use_na_sentinel=True)
+        if isinstance(texts, pd.Index):
+            texts = np.asarray(texts, dtype=object)
+        self.vocabulary, tokens, token_texts = tokenize(
+            pa.array(texts, type=pa.string()))
+
+        # Rows of every distinct text, then of every token occurrence
+        text_order = np.argsort(codes, kind='stable')
+        text_bounds = np.searchsorted(codes[text_order],
+                                      np.arange(len(texts) + 1))
+        counts = text_bounds[token_texts + 1] - text_bounds[token_texts]
+        rows = text_order[expand_ranges(text_bounds[token_texts], counts)]
+
+        # One sort of token * n_rows + row groups the rows by token, sorted,
+        # and puts a token repeated in a text next to itself
+        n_rows = max(self.n_rows, 1)
+        keys = np.repeat(tokens, counts) * n_rows + rows
+        keys.sort()
+        if len(keys):
+            keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+        row_tokens, rows = np.divmod(keys, n_rows)
+        self.rows = rows.astype(np.int32)
+        self.bounds = np.searchsorted(row_tokens,
+                                      np.arange(len(self.vocabulary) + 1))
+
+    def token_range(self, term):
+        '''
+        First and last + 1 vocabulary positions of the tokens starting with
+        term
+        '''
+        lo = np.searchsorted(self.vocabulary, term, side='left')
+        hi = np.searchsorted(self.vocabulary, term + MAX_CHAR, side='left')
+        return lo, hi
+
+    def search(self, query, positions=None):
+        '''
+        Sorted rows (narrowing positions, if given) having, for every term of
+        query, a token starting with it. positions is returned unchanged when
+        query has no terms.
+        '''
+        terms = query_terms(query)
+        if not terms:
+            return positions
+        # Rarest terms first, the candidates only shrink
+        ranges = [self.token_range(term) for term in set(terms)]
+        ranges.sort(key=lambda r: self.bounds[r[1]] - self.bounds[r[0]])
+        result = positions
+        for lo, hi in ranges:
+            if result is not None and not len(result):
+                break
+            postings = self.rows[self.bounds[lo]:self.bounds[hi]]
+            if result is None and hi - lo == 1:
+                result = postings
+                continue
+            # Rows of a term as a mask: no sorting, whatever the tokens matched
+            matched = np.zeros(self.n_rows, dtype=bool)
+            matched[postings] = True
+            if result is None:
+                result = np.flatnonzero(matched)
+            else:
+                result = result[matched[result]]
+        return result.astype(np.intp, copy=False)
@@ -0,0 +1,228 @@
+import cProfile
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from src.utils import PROFILE_FLAG_PATH, PROFILE_OUTPUT_DIR
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger('actions.metrics')
+
+_registry = {}
+_registry_lock = threading.Lock()
+_local = threading.local()
+
+
+class StageRecord:
+    '''
+    Measures of one run of a pipeline stage. rows_out can be set inside the
+    with block once the output is known.
+    '''
+
+    def __init__(self, name, rows_in=None, labels=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.labels = labels or {}
+        self.seconds = None
+        self.peak_bytes = None
+        self.max_rss_bytes = None
+
+    def as_dict(self):
+        return {
+            'stage': self.name,
+            'seconds': round(self.seconds, 6),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'peak_bytes': self.peak_bytes,
+            'max_rss_bytes': self.max_rss_bytes,
+            **self.labels
+        }
+
+
+def enable_logging(stream=None):
+    '''
+    Print the stage records (one JSON object per line) to stream, stderr by
+    default. Safe to call more than once.
+    '''
+    if not any(getattr(h, 'actions_metrics', False) for h in logger.handlers):
+        handler = logging.StreamHandler(stream)
+        handler.actions_metrics = True
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def memory_tracing_enabled():
+    return os.environ.get('ACTIONS_TRACE_MEMORY', '') not in ('', '0')
+
+
+def profiling_enabled():
+    '''
+    Profiling is switched on at runtime with ACTIONS_PROFILE=1 or by creating
+    the PROFILE_FLAG_PATH file, so it needs no redeploy
+    '''
+    return (os.environ.get('ACTIONS_PROFILE', '') not in ('', '0')
+            or os.path.exists(PROFILE_FLAG_PATH))
+
+
+def max_rss_bytes():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def observe(record):
+    '''
+    Log a finished stage as a JSON line and add it to the metrics registry
+    '''
+    logger.info(json.dumps(record.as_dict(), default=str))
+    key = (record.name, tuple(sorted(record.labels.items())))
+    with _registry_lock:
+        metric = _registry.setdefault(key, {
+            'count': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+            'rows_in': 0, 'rows_out': 0})
+        metric['count'] += 1
+        metric['seconds'] += record.seconds
+        metric['max_seconds'] = max(metric['max_seconds'], record.seconds)
+        metric['rows_in'] += record.rows_in or 0
+        metric['rows_out'] += record.rows_out or 0
+
+
+@contextmanager
+def stage(name, rows_in=None, **labels):
+    '''
+    Time a pipeline stage and record its rows in and out. Peak traced memory
+    is measured with ACTIONS_TRACE_MEMORY=1, and the outermost stage of a
+    thread is profiled to PROFILE_OUTPUT_DIR while profiling is enabled.
+    '''
+    record = StageRecord(name, rows_in, labels)
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+
+    trace = memory_tracing_enabled() and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+    profiler = start_profiler() if depth == 0 and profiling_enabled() else None
+
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - start
+        if profiler is not None:
+            dump_profile(profiler, name)
+        if trace:
+            record.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        record.max_rss_bytes = max_rss_bytes()
+        _local.depth = depth
+        observe(record)
+
+
+def timed(name):
+    '''
+    Decorator form of stage for functions taking and returning a DataFrame
+    (or anything with a length)
+    '''
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = None
+            if args and hasattr(args[0], '__len__'):
+                rows_in = len(args[0])
+            with stage(name, rows_in=rows_in) as record:
+                result = func(*args, **kwargs)
+                if hasattr(result, '__len__'):
+                    record.rows_out = len(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def start_profiler():
+    '''
+    cProfile by default, pyinstrument with ACTIONS_PROFILER=pyinstrument
+    when it is installed
+    '''
+    if os.environ.get('ACTIONS_PROFILER') == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning('pyinstrument is not installed, '
+                           'profiling with cProfile')
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def dump_profile(profiler, name):
+    os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(PROFILE_OUTPUT_DIR, f'{name}-{timestamp}')
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        path += '.prof'
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path += '.html'
+        with open(path, 'w') as f:
+            f.write(profiler.output_html())
+    logger.info(json.dumps({'stage': name, 'profile': path}))
+    return path
+
+
+METRIC_FAMILIES = [
+    ('actions_stage_runs_total', 'counter', 'count', '{}'),
+    ('actions_stage_seconds_total', 'counter', 'seconds', '{:.6f}'),
+    ('actions_stage_seconds_max', 'gauge', 'max_seconds', '{:.6f}'),
+    ('actions_stage_rows_in_total', 'counter', 'rows_in', '{}'),
+    ('actions_stage_rows_out_total', 'counter', 'rows_out', '{}'),
+]
+
+
+def metrics_text():
+    '''
+    Prometheus text exposition of the stages recorded by this process
+    '''
+    with _registry_lock:
+        items = sorted((key, dict(metric))
+                       for key, metric in _registry.items())
+    lines = []
+    for family, kind, field, fmt in METRIC_FAMILIES:
+        lines.append(f'# TYPE {family} {kind}')
+        for (name, labels), metric in items:
+            label_text = ','.join([f'stage="{name}"']
+                                  + [f'{k}="{v}"' for k, v in labels])
+            value = fmt.format(metric[field])
+            lines.append(f'{family}{{{label_text}}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path=None):
+    '''
+    Write metrics_text to path (default ACTIONS_METRICS_FILE, if set), e.g.
+    for the node_exporter textfile collector
+    '''
+    path = path or os.environ.get('ACTIONS_METRICS_FILE')
+    if not path:
+        return None
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(metrics_text())
+    os.replace(tmp_path, path)
+    return path
@@ -1,8 +1,29 @@
 import datetime
+import os
+
+# Root of the repository, for the data files shipped with the code
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # The ID and range of a sample spreadsheet.
 SPREADSHEET_ID = '1iizPemP8CqAELa-PAhc7jDmTy1yLAX0Yq_fjStUpqYQ'
 
+# Service-account credentials, searched in order (overridden by the
+# ACTIONS_CREDENTIALS environment variable)
+CREDENTIALS_PATHS = ['src/data/credentials.json',
+                     '../src/data/credentials.json']
+
+# Maximum number of sheets fetched concurrently from the workbook
+MAX_FETCH_WORKERS = 8
+
+# Sheets API read quota (requests per minute) and the burst allowed at once
+SHEETS_READ_REQUESTS_PER_MINUTE = 60
+SHEETS_READ_BURST = 10
+
+# Retries of a failed Sheets request (429 and 5xx) and their backoff (s)
+SHEETS_MAX_RETRIES = 5
+SHEETS_BACKOFF_BASE = 1
+SHEETS_BACKOFF_MAX = 32
+
 DAILY_ACTIONS_SHEET_DICT = {
     'Acciones Diarias PPLR Depurada': 'PPLR',
     'Acciones Diarias Cooperación Depurada': 'Cooperación',
@@ -18,11 +39,120 @@ DAILY_ACTIONS_SHEET_DICT = {
 #     'Acciones Diarias Cooperación Depurada': 'Cooperación'
 # }
 
+# Seconds a loaded dataset is served before it is rebuilt from the sheets
+DATASET_TTL = 600
+# Seconds before retrying a failed background rebuild, doubled after every
+# failure up to DATASET_TTL
+DATASET_RETRY_BACKOFF = 30
+
+# Creating this file turns on stage profiling at runtime (see
+# src/instrumentation.py); the profiles are written to PROFILE_OUTPUT_DIR
+PROFILE_FLAG_PATH = 'data/profile.on'
+PROFILE_OUTPUT_DIR = 'reports/profiles'
+
+# Local snapshot of the cleaned daily-actions dataset
+SNAPSHOT_PATH = 'data/processed/daily_actions.parquet'
+
+# Month partitions of the cleaned dataset (src/data/history_store.py) and
+# the number of recent months the app loads before the user asks for more
+HISTORY_DIR = 'data/processed/history'
+HISTORY_RECENT_MONTHS = 3
+
+# Columns loaded from the snapshot as categoricals
+SNAPSHOT_CATEGORICAL_COLUMNS = ['Acción', 'Departamento', 'Municipio',
+                                'Tipo Usuario', 'Usuario']
+
+# Columns of the daily-actions sheets kept in the dataset ('Acción' is the
+# sheet they come from)
+SHEET_COLUMNS = ['Fecha', 'Departamento', 'Municipio', 'Usuario',
+                 'Tipo Usuario', 'Actividades rutinarias']
+
+# Report columns of the dataset and their display names, in report order
+REPORT_COLUMNS = {
+    'Acción': 'Elemento esencial LR',
+    'Fecha': 'Fecha',
+    'Departamento': 'Departamento',
+    'Municipio': 'Municipio',
+    'Tipo Usuario': 'Tipo usuario',
+    'Usuario': 'Usuario',
+    'Actividades rutinarias': 'Acción diaria'
+}
+
+# Rows per page offered by the app table, the first one is the default
+TABLE_PAGE_SIZES = [100, 250, 500, 1000]
+
+# Dimensions of the summary cube ('Semana' is the Monday of 'Fecha' and
+# 'Mes' its first day of the month, which splits the weeks spanning two
+# months so the months of the history are answered exactly) and the roll-ups
+# kept pre-aggregated, queries use the smallest one covering them
+SUMMARY_DIMENSIONS = ['Departamento', 'Municipio', 'Acción', 'Semana', 'Mes',
+                      'Tipo Usuario']
+SUMMARY_CUBOIDS = [
+    ['Departamento', 'Acción', 'Tipo Usuario'],
+    ['Departamento', 'Municipio', 'Acción', 'Tipo Usuario'],
+    ['Departamento', 'Acción', 'Semana', 'Mes', 'Tipo Usuario'],
+]
+
+# Worker threads rendering PDF exports and number of exports kept in memory
+PDF_WORKERS = 2
+PDF_CACHE_SIZE = 8
+
+# Rows converted and written at a time by the CSV and XLSX exports, and rows
+# of an XLSX sheet (the format allows 1,048,576 with the header)
+EXPORT_CHUNK_SIZE = 50_000
+XLSX_MAX_ROWS = 1_048_575
+# Worker threads writing XLSX exports, off the Streamlit script thread
+EXPORT_WORKERS = 2
+
+# Batch reports (src/visualization/batch_reports.py): directory of the daily
+# PDFs and worker processes rendering them (None uses every CPU)
+REPORTS_DIR = 'reports/daily'
+REPORT_WORKERS = None
+
+# Dataset profiling (DataExploring.profile): columns with at most
+# PROFILE_EXACT_LIMIT distinct values get exact value counts, the others a
+# HyperLogLog distinct count (2**PROFILE_HLL_PRECISION registers, about 1%
+# error) and their PROFILE_TOP_K most frequent values. Rows are read in
+# chunks of PROFILE_CHUNK_SIZE.
+PROFILE_EXACT_LIMIT = 1000
+PROFILE_HLL_PRECISION = 14
+PROFILE_TOP_K = 10
+PROFILE_CHUNK_SIZE = 100_000
+
+# DANE DIVIPOLA codes and names of the departamentos and municipios, the
+# spellings Departamento and Municipio are canonicalized to, and the memo
+# of the raw spellings already resolved (kept across refreshes). The table
+# ships with the code, so it is found whatever the working directory.
+GAZETTEER_PATH = os.path.join(ROOT_DIR, 'references', 'divipola.csv')
+GAZETTEER_MEMO_PATH = 'data/interim/gazetteer_memo.json'
+# Smallest similarity (difflib ratio of the folded names) of a fuzzy match
+GAZETTEER_MATCH_CUTOFF = 0.85
+# Common names of departamentos far from their DIVIPOLA names
+GAZETTEER_ALIASES = {
+    'Bogotá': 'Bogotá, D.C.',
+    'San Andrés':
+        'Archipiélago de San Andrés, Providencia y Santa Catalina',
+    'San Andrés y Providencia':
+        'Archipiélago de San Andrés, Providencia y Santa Catalina',
+    'Guajira': 'La Guajira',
+    'Valle': 'Valle del Cauca',
+}
+
+# Patterns (case insensitive) replaced in every cell of the daily-actions frame
+CLEANING_PATTERNS = {
+    r'%20': ' '
+}
+
+# Formats tried, in order, when parsing the 'Fecha' column
+DATE_FORMATS = ['%d/%m/%Y', '%d/%m/%y', '%Y-%m-%d', '%d-%m-%Y',
+                '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M']
+
+# Low-cardinality columns are categoricals, the free text is Arrow-backed
 DAILY_ACTIONS_DTYPES_DICT = {
-    'Usuario': object, 
-    'Tipo Usuario': object,
-    'Departamento': object,
-    'Municipio': object,
-    'Actividades rutinarias': object,
-    'Fecha': object
+    'Usuario': 'category',
+    'Tipo Usuario': 'category',
+    'Departamento': 'category',
+    'Municipio': 'category',
+    'Actividades rutinarias': 'string[pyarrow]',
+    'Fecha': 'datetime64[ns]'
 }
\ No newline at end of file
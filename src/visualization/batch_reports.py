@@ -0,0 +1,161 @@
+'''
+Headless daily reports: the national PDF and one PDF per Departamento.
+
+    python src/visualization/batch_reports.py [--output-dir reports/daily]
+        [--workers N] [--snapshot]
+
+The dataset is built once (from Google Sheets, or from the local history
+with --snapshot), split by Departamento and rendered on a process pool,
+outside Streamlit. The PDFs are written to <output-dir>/<fecha>/ and the
+throughput is printed in pages per second.
+'''
+import argparse
+import datetime
+import hashlib
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.data.make_dataset import DailyActionsSync, DailyActionsWrangling
+from src.data.history_store import HistoryStore, read_legacy_snapshot
+from src.instrumentation import stage
+from src.utils import REPORT_COLUMNS, REPORT_WORKERS, REPORTS_DIR
+from src.visualization.pdf_report import format_date, generate_pdf
+
+REPORT_TITLE = 'Acciones de Libertad Religiosa'
+
+
+def slugify(name):
+    '''
+    File name of a report: ASCII, lowercase, words joined by _
+    '''
+    name = unicodedata.normalize('NFKD', str(name))
+    name = name.encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_') or 'sin_nombre'
+
+
+def unique_slug(name, taken):
+    '''
+    slugify(name), followed by a short hash of name if another name of taken
+    (the slugs already given) has the same slug, so no report overwrites
+    another. The slug is added to taken.
+    '''
+    slug = slugify(name)
+    if slug in taken:
+        digest = hashlib.blake2b(str(name).encode('utf-8'),
+                                 digest_size=4).hexdigest()
+        slug = f'{slug}_{digest}'
+    taken.add(slug)
+    return slug
+
+
+def page_count(pdf):
+    '''
+    Pages of a ReportLab PDF, from the /Count of its page tree
+    '''
+    return max(int(count) for count in re.findall(rb'/Count (\d+)', pdf))
+
+
+def partitions(df):
+    '''
+    Yield (file name, title, rows) of the national report and of the report
+    of every Departamento
+    '''
+    taken = {'consolidado_nacional'}
+    yield 'consolidado_nacional', f'{REPORT_TITLE}, Consolidado Nacional', df
+    for departamento, rows in df.groupby('Departamento', observed=True,
+                                         sort=True):
+        yield (unique_slug(departamento, taken),
+               f'{REPORT_TITLE}, {departamento}', rows)
+
+
+def render_report(df, title, report_date, path):
+    '''
+    Render one report to path (in a worker process) and return the path,
+    pages, rows and seconds taken
+    '''
+    start = time.perf_counter()
+    pdf = generate_pdf(df, report_date=report_date, title=title).getvalue()
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf)
+    os.replace(tmp_path, path)
+    return path, page_count(pdf), len(df), time.perf_counter() - start
+
+
+def load_dataset(from_snapshot=False, history=None):
+    '''
+    Report columns of the whole dataset, with their display names. The
+    history is updated from the sheets (only the changed sheets are cleaned
+    and their months rewritten) unless from_snapshot, which reads every
+    month of the history (or the snapshot of older versions).
+    '''
+    history = history or HistoryStore()
+    df = None
+    if from_snapshot:
+        df = history.read()
+        if df is None:
+            df = read_legacy_snapshot()
+    if df is None:
+        # Only the sheets changed since the history was last updated are
+        # cleaned again
+        sync = DailyActionsSync(history)
+        df = DailyActionsWrangling().make_daily_actions_dataset(sync=sync)
+    df = df[list(REPORT_COLUMNS)]
+    df.columns = list(REPORT_COLUMNS.values())
+    return df
+
+
+def render_reports(df, output_dir, workers=REPORT_WORKERS, report_date=None):
+    '''
+    Render the national and the per-Departamento reports of df on a process
+    pool and return the (path, pages, rows, seconds) of every report. The
+    largest reports are submitted first, so the national one never starts
+    last and holds up the whole batch.
+    '''
+    report_date = report_date or format_date()
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = sorted(partitions(df), key=lambda job: len(job[2]), reverse=True)
+    results = []
+    with stage('batch_reports', rows_in=len(df), reports=len(jobs)) as record:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(render_report, rows, title, report_date,
+                                       os.path.join(output_dir, f'{name}.pdf'))
+                       for name, title, rows in jobs]
+            for future in as_completed(futures):
+                path, pages, rows, seconds = future.result()
+                print(f"{path}: {pages} páginas, {rows} filas, "
+                      f"{seconds:.1f} s")
+                results.append((path, pages, rows, seconds))
+        record.rows_out = sum(rows for _, _, rows, _ in results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output-dir', default=REPORTS_DIR)
+    parser.add_argument('--workers', type=int, default=REPORT_WORKERS)
+    parser.add_argument('--snapshot', action='store_true',
+                        help='use the local history instead of the sheets')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = load_dataset(from_snapshot=args.snapshot)
+    print(f"Dataset: {len(df)} filas en {time.perf_counter() - start:.1f} s")
+
+    # Same clock as the report dates (UTC-5)
+    now = datetime.datetime.now() - datetime.timedelta(hours=5)
+    output_dir = os.path.join(args.output_dir, now.strftime('%Y_%m_%d'))
+    start = time.perf_counter()
+    results = render_reports(df, output_dir, workers=args.workers)
+    seconds = time.perf_counter() - start
+    pages = sum(pages for _, pages, _, _ in results)
+    print(f"{len(results)} reportes, {pages} páginas en {seconds:.1f} s: "
+          f"{pages / seconds:.1f} páginas/s, en {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
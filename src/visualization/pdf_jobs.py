@@ -0,0 +1,112 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from src.data.dedupe import frame_digest
+from src.utils import EXPORT_WORKERS, PDF_WORKERS, PDF_CACHE_SIZE
+
+
+class PdfJob:
+    '''
+    A PDF (or another export) being rendered on the worker pool, with its
+    progress
+    '''
+
+    def __init__(self, key):
+        self.key = key
+        self.rows_done = 0
+        self.total_rows = 0
+        self.future = None
+
+    def update(self, rows_done, total_rows):
+        self.rows_done = rows_done
+        self.total_rows = total_rows
+
+    @property
+    def progress(self):
+        if self.done():
+            return 1.0
+        return self.rows_done / self.total_rows if self.total_rows else 0.0
+
+    def done(self):
+        return self.future.done()
+
+    def failed(self):
+        return self.future.done() and self.future.exception() is not None
+
+    def result(self, timeout=None):
+        '''
+        PDF bytes, waiting for the job to finish if needed
+        '''
+        return self.future.result(timeout)
+
+
+class PdfExporter:
+    '''
+    Renders PDFs on a small worker pool, off the Streamlit script thread.
+    Jobs are kept in an LRU keyed on the hash of the frame and the report
+    timestamp (minute) bucket, so an identical export is rendered only once
+    and returned instantly afterwards, even while it is still in flight.
+    The worker reads the frame given while it renders: callers that may
+    mutate it meanwhile submit with copy=True (the app never mutates its
+    shared frame, so exports do not copy the filtered rows).
+    '''
+
+    def __init__(self, max_workers=PDF_WORKERS, cache_size=PDF_CACHE_SIZE):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='pdf')
+        self.cache_size = cache_size
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, df, report_date=None, copy=False):
+        # reportlab is only imported with the first export
+        from src.visualization.pdf_report import format_date
+        report_date = report_date or format_date()
+        return self.submit_job((frame_digest(df), report_date), df,
+                               report_date, copy=copy)
+
+    def submit_job(self, key, df, *args, copy=False):
+        '''
+        The job of key, rendering df (with args) with self.render unless an
+        identical one is cached or in flight. With copy, the worker renders
+        a copy of df.
+        '''
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is not None and not job.failed():
+                self.jobs.move_to_end(key)
+                return job
+
+            job = PdfJob(key)
+            if copy:
+                df = df.copy()
+            job.future = self.executor.submit(self.render, df, *args, job)
+            self.jobs[key] = job
+            while len(self.jobs) > self.cache_size:
+                self.jobs.popitem(last=False)
+        return job
+
+    @staticmethod
+    def render(df, report_date, job):
+        from src.visualization.pdf_report import generate_pdf
+        pdf = generate_pdf(df, report_date=report_date, progress=job.update)
+        return pdf.getvalue()
+
+
+class XlsxExporter(PdfExporter):
+    '''
+    Writes XLSX exports on a worker pool with an LRU of its own, the way
+    PdfExporter renders PDFs: a large export never holds the Streamlit
+    script thread, and an identical one is written only once
+    '''
+
+    def __init__(self, max_workers=EXPORT_WORKERS, cache_size=PDF_CACHE_SIZE):
+        super().__init__(max_workers, cache_size)
+
+    def submit(self, df, copy=False):
+        return self.submit_job((frame_digest(df),), df, copy=copy)
+
+    @staticmethod
+    def render(df, job):
+        from src.visualization.table_export import export_xlsx
+        return export_xlsx(df, progress=job.update)
@@ -0,0 +1,396 @@
+import datetime
+import functools
+import threading
+from itertools import chain
+from io import BytesIO
+from xml.sax.saxutils import escape
+import numpy as np
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import (SimpleDocTemplate, Table, TableStyle,
+                                Paragraph, Flowable)
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_LEFT
+from src.instrumentation import stage
+
+SPANISH_MONTHS = ["enero", "febrero", "marzo", "abril", "mayo", "junio",
+                  "julio", "agosto", "septiembre", "octubre", "noviembre",
+                  "diciembre"]
+
+LOGO_PATH = 'reports/figures/Logo_Partido.jpeg'
+
+# Default Table paddings, used to size the cells before building each table
+CELL_H_PADDING = 12
+CELL_V_PADDING = 6
+
+# Rows converted to text at a time
+PDF_ROW_CHUNK = 1000
+
+# Column widths are sized on the text of at most PDF_WIDTH_SAMPLE rows, so
+# that PDF_WIDTH_QUANTILE of the cells of every column fit in one line
+PDF_WIDTH_SAMPLE = 5000
+PDF_WIDTH_QUANTILE = 0.95
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def format_date():
+    now = datetime.datetime.now() - datetime.timedelta(hours=5)
+    day = now.strftime("%d")
+    month = now.month
+    year = now.strftime("%Y")
+    hour_24 = now.hour
+    minute = now.strftime("%M")
+    if hour_24 == 0:
+        hour_12 = 12
+        period = 'AM'
+    elif hour_24 < 12:
+        hour_12 = hour_24
+        period = 'AM'
+    elif hour_24 == 12:
+        hour_12 = 12
+        period = 'PM'
+    else:
+        hour_12 = hour_24 - 12
+        period = 'PM'
+    spanish_month = SPANISH_MONTHS[month - 1]
+    formatted_date = (f"{day} de {spanish_month} de {year} "
+                      f"{hour_12}:{minute} {period}")
+
+    return formatted_date
+
+
+class FlowableStream(list):
+    '''
+    List of flowables fed lazily from an iterator. SimpleDocTemplate.build
+    consumes its list from the front, so only a few page tables are alive
+    at any time.
+    '''
+
+    def __init__(self, flowables, lookahead=2):
+        super().__init__()
+        self.flowables = iter(flowables)
+        self.lookahead = lookahead
+        self.fill()
+
+    def fill(self):
+        while super().__len__() < self.lookahead:
+            try:
+                self.append(next(self.flowables))
+            except StopIteration:
+                break
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self.fill()
+
+
+class CellParagraph(Paragraph):
+    '''
+    Paragraph that keeps its last line breaking: cells are measured before
+    the table is built and the table wraps them again with the same width.
+    '''
+
+    def wrap(self, availWidth, availHeight):
+        wrapped = getattr(self, 'wrapped', None)
+        if wrapped is None or wrapped[0] != availWidth:
+            self.wrapped = (availWidth, super().wrap(availWidth, availHeight))
+        return self.wrapped[1]
+
+
+@functools.lru_cache(maxsize=None)
+def glyph_width(code, font_name):
+    # Width of a character at size 1000 (0 for the padding of numpy strings)
+    return stringWidth(chr(code), font_name, 1000) if code else 0.0
+
+
+def text_widths(texts, font_name, font_size):
+    '''
+    Widths of many strings at once: their characters are looked up in a
+    table of glyph widths and summed per string (fonts without kerning,
+    the same as stringWidth)
+    '''
+    texts = np.asarray(texts, dtype=str)
+    if not texts.size:
+        return np.zeros(len(texts))
+    codes = texts.view(np.uint32).reshape(len(texts), -1)
+    chars, inverse = np.unique(codes, return_inverse=True)
+    widths = np.array([glyph_width(int(c), font_name) for c in chars])
+    widths = widths[inverse.reshape(codes.shape)].sum(axis=1)
+    return widths * font_size / 1000
+
+
+def text_frame(chunk):
+    '''
+    Text of the cells of a chunk: dates as dd/mm/yyyy, missing dates empty
+    '''
+    dates = chunk.select_dtypes('datetime').columns
+    chunk = chunk.astype({c: str for c in chunk.columns.difference(dates)})
+    return chunk.assign(**{c: chunk[c].dt.strftime('%d/%m/%Y').fillna('')
+                           for c in dates})
+
+
+def column_widths(df, total_width, style, sample=PDF_WIDTH_SAMPLE,
+                  quantile=PDF_WIDTH_QUANTILE):
+    '''
+    Widths of the table columns of df, filling total_width. Every column
+    asks for the width of quantile of its cells (on a sample of the rows)
+    and at least that of the longest word of its header. When they do not
+    all fit, the columns asking for less than an even share of the width
+    left get what they ask, and the others (the long text) share the rest
+    and wrap.
+    '''
+    if len(df) > sample:
+        df = df.iloc[np.linspace(0, len(df) - 1, sample).astype(int)]
+    text = text_frame(df)
+    wanted = []
+    for col in df.columns:
+        header = text_widths(str(col).split() or [''], style.fontName,
+                             style.fontSize).max()
+        cells = text_widths(text[col].to_numpy(), style.fontName,
+                            style.fontSize)
+        cell = np.quantile(cells, quantile) if len(cells) else 0
+        wanted.append(max(header, cell) + CELL_H_PADDING)
+    wanted = np.array(wanted)
+    if wanted.sum() <= total_width:
+        # Everything fits: the spare width is shared in proportion
+        return list(wanted * total_width / wanted.sum())
+
+    widths, remaining, left = wanted.copy(), total_width, len(wanted)
+    order = np.argsort(wanted, kind='stable')
+    for position, col in enumerate(order):
+        if wanted[col] > remaining / left:
+            break
+        remaining -= wanted[col]
+        left -= 1
+    wide = order[position:]
+    widths[wide] = wanted[wide] * remaining / wanted[wide].sum()
+    return list(widths)
+
+
+def single_line_cells(chunk, widths, style):
+    '''
+    Mask of the cells of every column of a chunk of text that fit in one
+    line of the column width
+    '''
+    return [(text_widths(chunk[c].to_numpy(), style.fontName, style.fontSize)
+             <= width) & ~chunk[c].str.contains('\n', regex=False).to_numpy()
+            for c, width in zip(chunk.columns, widths)]
+
+
+def chunk_rows(chunk, widths, style):
+    '''
+    Yield the cells and the height of every row of a chunk of text. The
+    cells are measured a column at a time: the ones fitting in one line
+    stay plain strings, only the others become Paragraphs.
+    '''
+    fits = single_line_cells(chunk, widths, style)
+    single_line = np.logical_and.reduce(fits)
+    for i, values in enumerate(chunk.itertuples(index=False, name=None)):
+        if single_line[i]:
+            yield list(values), style.leading + CELL_V_PADDING
+            continue
+        row, row_height = [], style.leading
+        for text, width, fit in zip(values, widths, fits):
+            if fit[i]:
+                row.append(text)
+                continue
+            paragraph = CellParagraph(escape(text), style)
+            row.append(paragraph)
+            row_height = max(row_height, paragraph.wrap(width, 10**6)[1])
+        yield row, row_height + CELL_V_PADDING
+
+
+def page_tables(df, col_widths, cell_style, table_style, first_height,
+                height, progress=None):
+    '''
+    Yield one Table per page, each with its own header row. Rows are turned
+    into text in chunks (see chunk_rows) and packed until the page height
+    is used. progress, if given, is called with the rows laid out so far
+    and the total.
+    '''
+    widths = [w - CELL_H_PADDING for w in col_widths]
+
+    header = [Paragraph(escape(str(col)), cell_style) for col in df.columns]
+    header_height = max(p.wrap(w, 10**6)[1] for p, w in zip(header, widths))
+    header_height += CELL_V_PADDING
+
+    def build_table(rows, heights):
+        table = Table([header] + rows, colWidths=col_widths,
+                      rowHeights=[header_height] + heights, repeatRows=1)
+        table.setStyle(table_style)
+        return table
+
+    available = first_height
+    rows, heights, used = [], [], header_height
+    done = 0
+    for start in range(0, len(df), PDF_ROW_CHUNK):
+        chunk = text_frame(df.iloc[start:start + PDF_ROW_CHUNK])
+        for row, row_height in chunk_rows(chunk, widths, cell_style):
+            if rows and used + row_height > available:
+                if progress is not None:
+                    progress(done, len(df))
+                yield build_table(rows, heights)
+                available = height
+                rows, heights, used = [], [], header_height
+            rows.append(row)
+            heights.append(row_height)
+            used += row_height
+            done += 1
+
+    if rows or not len(df):
+        yield build_table(rows, heights)
+    if progress is not None:
+        progress(done, len(df))
+
+
+class SharedJpeg(ImageReader):
+    '''
+    JPEG read and decoded once and drawn by every report, also from several
+    threads: each PDF embeds the original JPEG bytes from its own handle.
+    '''
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.data = self.fp.getvalue()
+        # Decoded now, drawImage names the image by its pixels
+        self.getRGBData()
+
+    def _jpeg_fh(self):
+        return BytesIO(self.data)
+
+
+class Logo(Flowable):
+    '''
+    Flowable drawing a shared image at a fixed size
+    '''
+
+    def __init__(self, image, width, height):
+        super().__init__()
+        self.image = image
+        self.width = width
+        self.height = height
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.image, 0, 0, self.width, self.height,
+                            mask='auto')
+
+
+class ReportTemplate:
+    '''
+    The parts every report shares, built once per process: the page
+    geometry, the paragraph and table styles, the decoded logo and the
+    layout of the report header
+    '''
+
+    def __init__(self, logo_path=LOGO_PATH):
+        self.pagesize = landscape(letter)
+        self.margins = {'leftMargin': 5, 'rightMargin': 5,
+                        'topMargin': 15, 'bottomMargin': 15}
+        self.width = (self.pagesize[0] - self.margins['leftMargin']
+                      - self.margins['rightMargin'])
+        # Space left for the tables: frame height minus its paddings
+        self.height = (self.pagesize[1] - self.margins['topMargin']
+                       - self.margins['bottomMargin'] - 12)
+
+        self.title_style = ParagraphStyle(
+            'Title',
+            fontName='Times-Bold',
+            fontSize=12,
+            alignment=TA_LEFT,
+            spaceAfter=10
+        )
+
+        self.subtitle_style = ParagraphStyle(
+            'Subtitle',
+            fontName='Times-Bold',
+            fontSize=10,
+            alignment=TA_LEFT,
+            spaceAfter=10
+        )
+
+        self.cell_style = ParagraphStyle(
+            'Custom',
+            fontName='Times-Roman',
+            fontSize=7,
+            leading=9,
+            alignment=TA_LEFT,
+            wordWrap='CJK',
+            maxLineLength=None,
+        )
+
+        self.table_style = TableStyle([
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('BOX', (0, 0), (-1, -1), 1, colors.black),
+            ('FONTNAME', (0, 0), (-1, -1), 'Times-Roman'),
+            ('FONTSIZE', (0, 0), (-1, -1), 7),
+            ('LEADING', (0, 0), (-1, -1), 9),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+
+        self.logo = SharedJpeg(logo_path)
+        self.logo_size = (60, 35)
+        self.header_widths = [self.width - 90, 90]
+        self.header_style = TableStyle([
+            ('SPAN', (0, 0), (0, 0)),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ALIGN', (1, 0), (1, 0), 'RIGHT')
+        ])
+
+    def header(self, title, report_date):
+        '''
+        Flowables of the report header (title, date and logo) and the space
+        they take on the first page
+        '''
+        title = Paragraph(escape(title), self.title_style)
+        subtitle = Paragraph(f"Cohorte {report_date}", self.subtitle_style)
+        logo = Logo(self.logo, *self.logo_size)
+        header_layout = Table([[title, logo], [subtitle, '']],
+                              colWidths=self.header_widths)
+        header_layout.setStyle(self.header_style)
+        empty_paragraph = Paragraph("<br/><br/>", self.cell_style)
+        header_height = header_layout.wrap(self.width, self.height)[1]
+        header_height += empty_paragraph.wrap(self.width, self.height)[1]
+        return [header_layout, empty_paragraph], header_height
+
+
+def get_report_template():
+    '''
+    Shared report template of the process, built on first use
+    '''
+    global _template
+    with _template_lock:
+        if _template is None:
+            _template = ReportTemplate()
+        return _template
+
+
+def generate_pdf(df, report_date=None, progress=None, title=None,
+                 col_widths=None):
+    template = get_report_template()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=template.pagesize,
+                            **template.margins)
+
+    title = title or "Acciones de Libertad Religiosa, Consolidado Nacional"
+    header, header_height = template.header(title,
+                                            report_date or format_date())
+    col_widths = col_widths or column_widths(df, template.width,
+                                             template.cell_style)
+    tables = page_tables(df, col_widths, template.cell_style,
+                         template.table_style,
+                         template.height - header_height, template.height,
+                         progress)
+    with stage('generate_pdf', rows_in=len(df)) as record:
+        doc.build(FlowableStream(chain(header, tables)))
+        record.rows_out = len(df)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,129 @@
+import codecs
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from src.utils import EXPORT_CHUNK_SIZE, XLSX_MAX_ROWS
+
+# Day 0 of the Excel (1900) date system
+EXCEL_EPOCH = pd.Timestamp('1899-12-30')
+
+
+def chunks(df, positions=None, chunk_size=EXPORT_CHUNK_SIZE):
+    '''
+    Yield the rows of df (only those at positions if given) in order, at
+    most chunk_size at a time, so an export never copies every filtered row
+    at once
+    '''
+    n_rows = len(df) if positions is None else len(positions)
+    for start in range(0, n_rows, chunk_size):
+        end = min(start + chunk_size, n_rows)
+        if positions is None:
+            yield df.iloc[start:end]
+        else:
+            yield df.iloc[positions[start:end]]
+
+
+def arrow_chunk(chunk):
+    '''
+    Arrow table of a chunk: dates without time, everything else as text
+    '''
+    columns = {}
+    for col in chunk.columns:
+        s = chunk[col]
+        if pd.api.types.is_datetime64_any_dtype(s.dtype):
+            columns[col] = pa.array(s.to_numpy(),
+                                    from_pandas=True).cast(pa.date32())
+        else:
+            columns[col] = pa.array(s.to_numpy(dtype=object),
+                                    type=pa.string(), from_pandas=True)
+    return pa.table(columns)
+
+
+def cell_values(s):
+    '''
+    Python values of a column for xlsxwriter, None where missing. Dates
+    become Excel serial day numbers, computed for the whole column at once.
+    '''
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        days = (s - EXCEL_EPOCH) / pd.Timedelta(days=1)
+        values = pd.Series(days, dtype=object)
+    else:
+        values = s.astype(object).astype(str)
+    return values.where(s.notna().to_numpy(), None).tolist()
+
+
+def export_csv(df, positions=None, chunk_size=EXPORT_CHUNK_SIZE):
+    '''
+    CSV bytes (UTF-8 with BOM, so Excel reads the accents) of the rows of df
+    at positions. Chunks are converted to Arrow and written by the Arrow
+    CSV writer, a column at a time.
+    '''
+    buffer = io.BytesIO()
+    buffer.write(codecs.BOM_UTF8)
+    writer = None
+    for chunk in chunks(df, positions, chunk_size):
+        table = arrow_chunk(chunk)
+        if writer is None:
+            writer = pa_csv.CSVWriter(buffer, table.schema)
+        writer.write_table(table)
+    if writer is None:
+        # No rows, only the header
+        writer = pa_csv.CSVWriter(buffer, arrow_chunk(df.iloc[:0]).schema)
+    writer.close()
+    return buffer.getvalue()
+
+
+def export_xlsx(df, positions=None, chunk_size=EXPORT_CHUNK_SIZE,
+                max_rows=XLSX_MAX_ROWS, progress=None):
+    '''
+    XLSX bytes of the rows of df at positions. The workbook is written in
+    xlsxwriter's constant_memory mode, which flushes every row once written,
+    so memory stays bounded by the chunk being written (and the rows must be
+    written in order, a record at a time). Sheets hold at most max_rows
+    rows, more rows continue in a new sheet. progress, if given, is called
+    with the rows written so far and the total after every chunk.
+    '''
+    # xlsxwriter is only imported with the first XLSX export
+    import xlsxwriter
+
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {
+        'constant_memory': True,
+        # Cells are text as typed, never formulas or links
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+    })
+    header = workbook.add_format({'bold': True})
+    date_format = workbook.add_format({'num_format': 'dd/mm/yyyy'})
+    columns = list(df.columns)
+    dates = [pd.api.types.is_datetime64_any_dtype(df[col].dtype)
+             for col in columns]
+
+    n_rows = len(df) if positions is None else len(positions)
+    worksheet, row, done = None, max_rows, 0
+    for chunk in chunks(df, positions, chunk_size):
+        for record in zip(*(cell_values(chunk[col]) for col in columns)):
+            if row >= max_rows:
+                number = len(workbook.worksheets()) + 1
+                worksheet = workbook.add_worksheet(f'Acciones {number}')
+                worksheet.write_row(0, 0, columns, header)
+                # The writer of every column, chosen once per sheet
+                writers = [
+                    (worksheet.write_number, date_format) if is_date
+                    else (worksheet.write_string, None)
+                    for is_date in dates]
+                row = 0
+            row += 1
+            for col, value in enumerate(record):
+                if value is not None:
+                    write, cell_format = writers[col]
+                    write(row, col, value, cell_format)
+        done += len(chunk)
+        if progress is not None:
+            progress(done, n_rows)
+    if worksheet is None:
+        # No rows, only the header
+        workbook.add_worksheet('Acciones 1').write_row(0, 0, columns, header)
+    workbook.close()
+    return buffer.getvalue()
@@ -1,237 +1,478 @@
 import streamlit as st
 import datetime
-from io import BytesIO
-from reportlab.lib.pagesizes import landscape, letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Image, Paragraph
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_LEFT
-from src.data.make_dataset import DailyActionsWrangling
-
-SPANISH_MONTHS = ["enero", "febrero", "marzo", "abril", "mayo", "junio",
-                  "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
-
-
-def format_date():
-    now = datetime.datetime.now() - datetime.timedelta(hours=5)
-    day = now.strftime("%d")
-    month = now.month
-    year = now.strftime("%Y")
-    hour_24 = now.hour
-    minute = now.strftime("%M")
-    if hour_24 == 0:
-        hour_12 = 12
-        period = 'AM'
-    elif hour_24 < 12:
-        hour_12 = hour_24
-        period = 'AM'
-    elif hour_24 == 12:
-        hour_12 = 12
-        period = 'PM'
-    else:
-        hour_12 = hour_24 - 12
-        period = 'PM'
-    spanish_month = SPANISH_MONTHS[month - 1]
-    formatted_date = f"{day} de {spanish_month} de {year} {hour_12}:{minute} {period}"
-
-    return formatted_date
-
-
-@st.cache_data
-def get_data():
-    daw = DailyActionsWrangling()
-    return daw.make_daily_actions_dataset()
-
-
-def generate_pdf(df):
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter),
-                            leftMargin=5, rightMargin=5, topMargin=15, bottomMargin=15)
-
-    styles = getSampleStyleSheet()
-
-    title_style = ParagraphStyle(
-        'Title',
-        fontName='Times-Bold',
-        fontSize=12,
-        alignment=TA_LEFT,
-        spaceAfter=10
-    )
-
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        fontName='Times-Bold',
-        fontSize=10,
-        alignment=TA_LEFT,
-        spaceAfter=10
+import math
+import time
+import pandas as pd
+from src.data.dataset_store import DatasetStore
+from src.data.history_store import HistoryStore, read_legacy_snapshot
+from src.data.make_dataset import DailyActionsSync
+from src.features.filter_index import FilterIndex
+from src.features.summary_cube import SummaryCube
+from src.instrumentation import enable_logging, stage, write_metrics
+from src.utils import REPORT_COLUMNS, TABLE_PAGE_SIZES
+from src.visualization.pdf_jobs import PdfExporter, XlsxExporter
+from src.visualization.table_export import export_csv
+
+FILTER_COLUMNS = ['Departamento', 'Municipio', 'Tipo usuario', 'Usuario',
+                  'Elemento esencial LR']
+RANGE_FILTER_COLUMNS = ['Fecha']
+TEXT_FILTER_COLUMNS = ['Acción diaria']
+# Display names of the summary cube dimensions
+SUMMARY_LABELS = {'Departamento': 'Departamento', 'Municipio': 'Municipio',
+                  'Acción': 'Elemento esencial LR', 'Semana': 'Semana',
+                  'Tipo Usuario': 'Tipo usuario'}
+FILTER_KEYS = ['search_filter', 'departamento_filter', 'municipio_filter',
+               'tipo_usuario_filter', 'usuario_filter', 'accion_filter',
+               'fecha_filter', 'history_start']
+
+
+def load_dataset(refresh, sync, history, previous=None, start=None):
+    '''
+    Load the months of the dataset from start on (the recent months by
+    default), from the local history unless refreshing, and prepare them for
+    the app. A refresh updates the history from the sheets and rereads only
+    the months it did not rewrite.
+    '''
+    cube = None
+    partitions, removed = {}, None
+    version = history.version()
+    empty = not history.manifest()['partitions']
+    # A history missing some of its files is rebuilt from the sheets
+    if refresh or empty or history.missing():
+        # The local snapshot of older versions is moved into the history once
+        df = read_legacy_snapshot() if empty and not refresh else None
+        if df is not None:
+            with stage('write_history', rows_in=len(df)) as record:
+                partitions, written = history.write(df)
+                record.rows_out = sum(len(partitions[month])
+                                      for month in written)
+        else:
+            # Only the sheets that changed since the last refresh are
+            # re-cleaned
+            with stage('make_dataset', incremental=True):
+                partitions, added, removed = sync.refresh()
+    start = start or history.recent_start()
+    df = history.read(start, partitions)
+    if (removed is not None and previous is not None
+            and previous[3]['version'] == version
+            and previous[3]['start'] == start):
+        # previous holds the same months of the history before this refresh:
+        # apply its changes
+        with stage('aggregate', incremental=True):
+            cube = previous[2].updated(
+                [HistoryStore.in_scope(f, start) for f in added],
+                [HistoryStore.in_scope(f, start) for f in removed])
+    scope = {'start': start, 'default': history.recent_start(),
+             'months': history.months(), 'version': history.version()}
+    return prepare_dataset(df, cube) + (scope,)
+
+
+def prepare_dataset(data, cube=None):
+    '''
+    Keep the report columns of a freshly loaded dataset, with their display
+    names, and build its filter index and (unless given) summary cube once
+    '''
+    if cube is None:
+        with stage('aggregate', rows_in=len(data), incremental=False):
+            cube = SummaryCube.from_frame(data)
+    df = data[list(REPORT_COLUMNS)]
+    df.columns = list(REPORT_COLUMNS.values())
+    index = FilterIndex(df, FILTER_COLUMNS, RANGE_FILTER_COLUMNS,
+                        TEXT_FILTER_COLUMNS)
+    return df, index, cube
+
+
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
+
+
+@st.cache_resource
+def get_dataset_store():
+    # One dataset (and filter index) shared by every session
+    history = get_history_store()
+    sync = DailyActionsSync(history)
+    return DatasetStore(lambda refresh, previous, **options: load_dataset(
+        refresh, sync, history, previous, **options))
+
+
+@st.cache_resource
+def get_pdf_exporter():
+    # One worker pool and PDF cache shared by every session
+    return PdfExporter()
+
+
+@st.cache_resource
+def get_xlsx_exporter():
+    # One worker pool and XLSX cache shared by every session
+    return XlsxExporter()
+
+
+def wait_for(job, text):
+    '''
+    Show the progress of an export job until it is done, return its bytes
+    '''
+    progress_bar = st.progress(0.0, text=f"{text}...")
+    while not job.done():
+        progress_bar.progress(
+            job.progress,
+            text=f"{text}... {job.rows_done} de {job.total_rows} filas")
+        time.sleep(0.2)
+    progress_bar.empty()
+    return job.result()
+
+
+def render_filters(index, positions=None):
+    '''
+    Draw the cascading filters and return the row positions (among
+    positions, all rows if None) matching them, None while no filter is set
+    '''
+    # Text search over the daily actions, first so the options below follow it
+    search_filter = st.text_input(
+        'Buscar en acciones diarias',
+        key="search_filter",
+        placeholder="Palabras o comienzos de palabras, p. ej. reunion alcald"
     )
-
-    custom_paragraph_style = ParagraphStyle(
-        'Custom',
-        fontName='Times-Roman',
-        fontSize=7,
-        leading=9,
-        alignment=TA_LEFT,
-        wordWrap='CJK',
-        maxLineLength=None,
-    )
-
-    data = [[Paragraph(str(col), custom_paragraph_style) for col in df.columns]]
-    for i, row in df.iterrows():
-        data.append([Paragraph(str(cell), custom_paragraph_style) for cell in row])
-
-    col_widths = [40, 45, 55, 55, 120, 55, 180]
-
-    table = Table(data, colWidths=col_widths, repeatRows=1)
-
-    style = TableStyle([
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('BOX', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, 0), (-1, 0), 'Times-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 7),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('WORDWRAP', (0, 0), (-1, -1), 1),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT')
-    ])
-    table.setStyle(style)
-
-    logo = Image("reports/figures/Logo_Partido.jpeg", width=60, height=35)
-
-    title = Paragraph("Acciones de Libertad Religiosa, Consolidado Nacional", title_style)
-    formatted_date = format_date()
-    subtitle_text = f"Cohorte {formatted_date}"
-    subtitle = Paragraph(subtitle_text, subtitle_style)
-
-    empty_paragraph = Paragraph("<br/><br/>", custom_paragraph_style)
-
-    header_layout = Table([[title, logo], [subtitle, '']], colWidths=[450, 90])
-
-    header_layout.setStyle(TableStyle([
-        ('SPAN', (0, 0), (0, 0)),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT')
-    ]))
-
-    elements = [header_layout, empty_paragraph, table]
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
-
-
-def main():
-    st.title('Acciones Diarias')
-
-    # Initialize filters in session state if not already set
-    if 'departamento_filter' not in st.session_state:
-        st.session_state.departamento_filter = 'Todos'
-    if 'municipio_filter' not in st.session_state:
-        st.session_state.municipio_filter = []
-    if 'tipo_usuario_filter' not in st.session_state:
-        st.session_state.tipo_usuario_filter = []
-    if 'usuario_filter' not in st.session_state:
-        st.session_state.usuario_filter = []
-    if 'accion_filter' not in st.session_state:
-        st.session_state.accion_filter = []
-    if 'fecha_filter' not in st.session_state:
-        st.session_state.fecha_filter = []
-
-    # Clear Filters Button
-    if st.button('Limpiar filtros', key="clear_filters"):
-        st.session_state.departamento_filter = 'Todos'
-        st.session_state.municipio_filter = []
-        st.session_state.tipo_usuario_filter = []
-        st.session_state.usuario_filter = []
-        st.session_state.accion_filter = []
-        st.session_state.fecha_filter = []
-
-    # Refresh Button
-    refresh = st.button('Refrescar datos')
-
-    if 'data' not in st.session_state or refresh:
-        st.session_state.data = get_data()
-
-    df = st.session_state.data
-    df = df[['Acción', 'Fecha', 'Departamento', 'Municipio', 'Tipo Usuario', 'Usuario', 'Actividades rutinarias']]
-    df.columns = ['Elemento esencial LR', 'Fecha', 'Departamento', 'Municipio', 'Tipo usuario', 'Usuario', 'Acción diaria']
-
-    # Start with the original DataFrame
-    filtered_df = df.copy()
+    if search_filter.strip():
+        positions = index.search('Acción diaria', search_filter, positions)
 
     # Departamento filter
     departamento_filter = st.selectbox(
         'Departamento', 
-        ['Todos'] + sorted(df['Departamento'].unique()),
+        ['Todos'] + index.options('Departamento', positions),
         key="departamento_filter"
     )
     if departamento_filter != 'Todos':
-        filtered_df = filtered_df[filtered_df['Departamento'] == departamento_filter]
+        positions = index.select('Departamento', [departamento_filter],
+                                 positions)
 
     # Municipio filter
     municipio_filter = st.multiselect(
         'Municipio', 
-        sorted(filtered_df['Municipio'].unique()),
+        index.options('Municipio', positions),
         key="municipio_filter",
         placeholder="Elige una o varias opciones"
     )
     if municipio_filter:
-        filtered_df = filtered_df[filtered_df['Municipio'].isin(municipio_filter)]
+        positions = index.select('Municipio', municipio_filter, positions)
 
     # Tipo usuario filter
     tipo_usuario_filter = st.multiselect(
         'Tipo usuario', 
-        sorted(filtered_df['Tipo usuario'].unique()),
+        index.options('Tipo usuario', positions),
         key="tipo_usuario_filter",
         placeholder="Elige una o varias opciones"
     )
     if tipo_usuario_filter:
-        filtered_df = filtered_df[filtered_df['Tipo usuario'].isin(tipo_usuario_filter)]
+        positions = index.select('Tipo usuario', tipo_usuario_filter,
+                                 positions)
 
     # Usuario filter
     usuario_filter = st.multiselect(
         'Usuario', 
-        sorted(filtered_df['Usuario'].unique()),
+        index.options('Usuario', positions),
         key="usuario_filter",
         placeholder="Elige una o varias opciones"
     )
     if usuario_filter:
-        filtered_df = filtered_df[filtered_df['Usuario'].isin(usuario_filter)]
+        positions = index.select('Usuario', usuario_filter, positions)
 
     # Elemento esencial LR filter
     accion_filter = st.multiselect(
         'Elemento esencial LR', 
-        sorted(filtered_df['Elemento esencial LR'].unique()),
+        index.options('Elemento esencial LR', positions),
         key="accion_filter",
         placeholder="Elige una o varias opciones"
     )
     if accion_filter:
-        filtered_df = filtered_df[filtered_df['Elemento esencial LR'].isin(accion_filter)]
-
-    # Fecha filter
-    fecha_filter = st.multiselect(
-        'Fecha', 
-        sorted(filtered_df['Fecha'].unique()),
+        positions = index.select('Elemento esencial LR', accion_filter,
+                                 positions)
+
+    # Fecha filter (range over the whole dataset, queried on the sorted dates)
+    fecha_bounds = index.bounds('Fecha')
+    fecha_filter = st.date_input(
+        'Fecha',
+        min_value=(pd.Timestamp(fecha_bounds[0]).date()
+                   if fecha_bounds else None),
+        max_value=(pd.Timestamp(fecha_bounds[1]).date()
+                   if fecha_bounds else None),
         key="fecha_filter",
-        placeholder="Elige una o varias opciones"
+        format="DD/MM/YYYY"
     )
     if fecha_filter:
-        filtered_df = filtered_df[filtered_df['Fecha'].isin(fecha_filter)]
-
-    # Display the filtered DataFrame
-    st.write(" ")
-    st.dataframe(filtered_df)
-
-    # Export to PDF
-    now = (datetime.datetime.now() - datetime.timedelta(hours=5)).strftime("%Y_%m_%d-%H_%M")
+        # A single picked date selects that day, the end date is inclusive
+        start = pd.Timestamp(fecha_filter[0])
+        end = pd.Timestamp(fecha_filter[-1]) + pd.Timedelta(days=1)
+        positions = index.select_range('Fecha', start, end, positions)
+
+    return positions
+
+
+def render_table(df, positions):
+    '''
+    Show one page of the filtered rows. Only the rows of the page are sliced
+    from the row positions and sent to the browser (as Arrow), so every
+    rerun sends the same amount of data whatever the size of the dataset.
+    '''
+    n_rows = len(df) if positions is None else len(positions)
+
+    size_col, page_col = st.columns(2)
+    page_size = size_col.selectbox('Filas por página', TABLE_PAGE_SIZES,
+                                   key="table_page_size")
+    n_pages = max(1, math.ceil(n_rows / page_size))
+    if st.session_state.get('table_page', 1) > n_pages:
+        st.session_state.table_page = n_pages
+    page = page_col.number_input('Página', min_value=1, max_value=n_pages,
+                                 step=1, key="table_page")
+
+    start = (page - 1) * page_size
+    end = min(start + page_size, n_rows)
+    rows = slice(start, end) if positions is None else positions[start:end]
+    page_df = df.iloc[rows]
+
+    if n_rows:
+        st.caption(f"Filas {start + 1}-{end} de {format_count(n_rows)} "
+                   f"(página {page} de {n_pages})")
+    else:
+        st.caption("Ninguna fila coincide con los filtros")
+    st.dataframe(
+        page_df,
+        column_config={'Fecha': st.column_config.DateColumn(
+            'Fecha', format="DD/MM/YYYY")}
+    )
+    return page_df
+
+
+def format_count(n):
+    return f"{n:,}".replace(',', '.')
+
+
+def format_month(month):
+    # 'YYYY-MM' partitions shown as MM/YYYY
+    return f"{month[5:]}/{month[:4]}"
+
+
+def render_summary(cube, since=None):
+    '''
+    KPIs and roll-ups answered from the summary cube, from the month of
+    since on (the rows of the Detalle view) and within the weeks chosen.
+    Choosing a departamento drills down from departamentos to its
+    municipios.
+    '''
+    departamento_col, accion_col, tipo_col = st.columns(3)
+    filters = {}
+    departamento = departamento_col.selectbox(
+        'Departamento', ['Todos'] + cube.options('Departamento'),
+        key="summary_departamento")
+    if departamento != 'Todos':
+        filters['Departamento'] = [departamento]
+    filters['Acción'] = accion_col.multiselect(
+        'Elemento esencial LR', cube.options('Acción', filters),
+        key="summary_accion", placeholder="Elige una o varias opciones")
+    filters['Tipo Usuario'] = tipo_col.multiselect(
+        'Tipo usuario', cube.options('Tipo Usuario', filters),
+        key="summary_tipo_usuario", placeholder="Elige una o varias opciones")
+
+    semana_col, columns_col = st.columns(2)
+    semanas = semana_col.date_input('Semanas', value=(), key="summary_semanas",
+                                    format="DD/MM/YYYY")
+    start = semanas[0] if semanas else None
+    end = semanas[-1] if semanas else None
+    columns = columns_col.selectbox(
+        'Columnas', ['Ninguna', 'Acción', 'Tipo Usuario', 'Semana'],
+        format_func=lambda d: SUMMARY_LABELS.get(d, d), key="summary_columns")
+    columns = None if columns == 'Ninguna' else columns
+
+    rows = 'Municipio' if departamento != 'Todos' else 'Departamento'
+    by_rows = cube.rollup([rows], filters=filters, start=start, end=end,
+                          since=since)
+    by_week = cube.rollup(['Semana'], filters=filters, start=start, end=end,
+                          since=since)
+
+    total_metric, rows_metric, weeks_metric = st.columns(3)
+    # Rows without Departamento or Municipio are not in by_rows
+    total_metric.metric('Acciones',
+                        format_count(cube.total(filters, start, end,
+                                                since)))
+    places = 'Municipios' if rows == 'Municipio' else 'Departamentos'
+    rows_metric.metric(f"{places} con acciones", format_count(len(by_rows)))
+    weeks_metric.metric('Semanas con acciones',
+                        format_count(len(by_week.dropna())))
+
+    table = by_rows
+    if columns is not None:
+        table = cube.rollup([rows], columns, filters, start, end, since)
+    if columns == 'Semana':
+        table.columns = [c.strftime('%d/%m/%Y') for c in table.columns]
+    elif columns is not None:
+        table.columns = [str(c) for c in table.columns]
+    table.index.name = SUMMARY_LABELS[rows]
+    st.dataframe(table)
+
+    st.caption('Acciones por semana')
+    st.bar_chart(by_week.dropna(), y='Acciones')
+
+
+def select_history(store, dataset):
+    '''
+    Draw the choice of the first month shown, reloading the dataset with
+    older months if needed. Returns the dataset and the first date shown
+    (None if it holds no older months than asked for).
+    '''
+    scope = dataset.data[3]
+    # Months shown: the recent ones by default, older ones are loaded on demand
+    if st.session_state.get('history_start') not in scope['months']:
+        st.session_state.history_start = scope['default']
+    history_start = st.selectbox('Historial desde', scope['months'],
+                                 format_func=format_month,
+                                 key="history_start")
+    if history_start is not None and history_start < scope['start']:
+        with st.spinner('Cargando meses anteriores...'):
+            dataset = store.reload(seen=dataset, start=history_start)
+        scope = dataset.data[3]
+    # The shared dataset may hold older months than this session asked for
+    since = None
+    if history_start is not None and history_start > scope['start']:
+        since = pd.Timestamp(f'{history_start}-01')
+    return dataset, since
+
+
+def render_exports(df, positions, n_rows, now):
+    '''
+    Export buttons of the rows of df at positions (all rows if None)
+    '''
     if st.button('Exportar como PDF'):
-        pdf_buffer = generate_pdf(filtered_df)
+        # Only the export needs every filtered row
+        filtered_df = df if positions is None else df.iloc[positions]
+        job = get_pdf_exporter().submit(filtered_df)
         st.download_button(
             label="Descargar PDF",
-            data=pdf_buffer,
+            data=wait_for(job, "Generando PDF"),
             file_name=f"acciones_diarias-{now}.pdf",
             mime="application/pdf"
         )
 
+    # Export the rows as CSV, written in chunks straight from the positions
+    if st.button('Exportar como CSV'):
+        with stage('export_csv', rows_in=n_rows):
+            data = export_csv(df, positions)
+        st.download_button(
+            label="Descargar CSV",
+            data=data,
+            file_name=f"acciones_diarias-{now}.csv",
+            mime="text/csv"
+        )
+    # Excel is written cell by cell (several seconds per 100.000 rows), on
+    # the export workers like the PDF
+    if st.button('Exportar como Excel'):
+        filtered_df = df if positions is None else df.iloc[positions]
+        with stage('export_xlsx', rows_in=n_rows):
+            job = get_xlsx_exporter().submit(filtered_df)
+            data = wait_for(job, "Generando Excel")
+        st.download_button(
+            label="Descargar Excel",
+            data=data,
+            file_name=f"acciones_diarias-{now}.xlsx",
+            mime=("application/vnd.openxmlformats-officedocument."
+                  "spreadsheetml.sheet")
+        )
+
+
+def main():
+    st.title('Acciones Diarias')
+    view = st.radio('Vista', ['Detalle', 'Resumen'], horizontal=True,
+                    key="view")
+
+    # Initialize filters in session state if not already set
+    if 'search_filter' not in st.session_state:
+        st.session_state.search_filter = ''
+    if 'departamento_filter' not in st.session_state:
+        st.session_state.departamento_filter = 'Todos'
+    if 'municipio_filter' not in st.session_state:
+        st.session_state.municipio_filter = []
+    if 'tipo_usuario_filter' not in st.session_state:
+        st.session_state.tipo_usuario_filter = []
+    if 'usuario_filter' not in st.session_state:
+        st.session_state.usuario_filter = []
+    if 'accion_filter' not in st.session_state:
+        st.session_state.accion_filter = []
+    if 'fecha_filter' not in st.session_state:
+        st.session_state.fecha_filter = ()
+    if 'table_page' not in st.session_state:
+        st.session_state.table_page = 1
+
+    # Clear Filters Button
+    if st.button('Limpiar filtros', key="clear_filters"):
+        st.session_state.search_filter = ''
+        st.session_state.departamento_filter = 'Todos'
+        st.session_state.municipio_filter = []
+        st.session_state.tipo_usuario_filter = []
+        st.session_state.usuario_filter = []
+        st.session_state.accion_filter = []
+        st.session_state.fecha_filter = ()
+        st.session_state.history_start = None
+
+    # Refresh Button
+    refresh = st.button('Refrescar datos')
+
+    store = get_dataset_store()
+    if refresh:
+        # Rebuild from Google Sheets and update the changed months of the
+        # history
+        try:
+            dataset = store.refresh()
+        except Exception:
+            # The other sessions keep being served the current version
+            st.error('No se pudieron actualizar los datos desde Google '
+                     'Sheets.')
+            dataset = store.get()
+    else:
+        dataset = store.get()
+        # The history may have been written since by another process (e.g.
+        # make_dataset.py): served as is while rebuilt in the background
+        if dataset.data[3]['version'] != get_history_store().version():
+            store.invalidate(seen=dataset)
+            dataset = store.get()
+        seen = st.session_state.get('data_version', dataset.version)
+        if seen != dataset.version:
+            st.info('Los datos se actualizaron desde la última consulta.')
+
+    dataset, since = select_history(store, dataset)
+    df, index, cube, _ = dataset.data
+    # Sessions only keep the version they are looking at, not the data
+    st.session_state.data_version = dataset.version
+
+    if view == 'Resumen':
+        with stage('summary'):
+            render_summary(cube, since)
+        write_metrics()
+        return
+
+    with stage('filter', rows_in=len(df)) as record:
+        positions = (None if since is None
+                     else index.select_from('Fecha', since))
+        positions = render_filters(index, positions)
+        record.rows_out = len(df) if positions is None else len(positions)
+
+    # Back to the first page whenever the filters or the data change
+    filters = (dataset.version,) + tuple(str(st.session_state[key])
+                                         for key in FILTER_KEYS)
+    if st.session_state.get('table_filters') != filters:
+        st.session_state.table_filters = filters
+        st.session_state.table_page = 1
+
+    # Display one page of the filtered DataFrame
+    st.write(" ")
+    with stage('render_table', rows_in=record.rows_out) as table_record:
+        page_df = render_table(df, positions)
+        table_record.rows_out = len(page_df)
+
+    # Export to PDF
+    now = (datetime.datetime.now() - datetime.timedelta(hours=5)).strftime("%Y_%m_%d-%H_%M")
+    render_exports(df, positions, record.rows_out, now)
+
+    write_metrics()
+
 if __name__ == "__main__":
+    enable_logging()
     main()
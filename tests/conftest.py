@@ -0,0 +1,28 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The tests import the pipeline (src); the fakes (fake_gspread, synthetic)
+# live next to them
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from src.data import collect_data, gazetteer  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def session_gazetteer():
+    return gazetteer.Gazetteer(memo_path=None)
+
+
+@pytest.fixture(autouse=True)
+def no_side_effects(monkeypatch, session_gazetteer):
+    '''
+    Every test runs with a gazetteer that writes no memo and a scheduler
+    without quota waits
+    '''
+    monkeypatch.setattr(gazetteer, '_gazetteer', session_gazetteer)
+    scheduler = collect_data.RequestScheduler(requests_per_minute=10**9,
+                                              burst=10**6)
+    monkeypatch.setattr(collect_data, 'scheduler', scheduler)
@@ -0,0 +1,108 @@
+'''
+In-memory stand-in for a gspread client, serving DataFrames as worksheets.
+Only the calls used by src/data/collect_data.py are implemented.
+
+Errors of the Sheets API can be injected: scripted HTTP statuses raised by
+the next reads of a sheet, and a share of reads failing at random with a
+429 or a 5xx, raised as the gspread APIError of the real client.
+'''
+import json
+import random
+import threading
+import time
+import gspread
+import requests
+
+# Reason phrases of the statuses injected
+STATUS_MESSAGES = {
+    403: 'The caller does not have permission',
+    429: 'Quota exceeded for quota metric Read requests',
+    500: 'Internal error encountered.',
+    502: 'Bad Gateway',
+    503: 'The service is currently unavailable.',
+    504: 'Deadline exceeded',
+}
+
+# Statuses of the reads failing at random
+RANDOM_ERROR_STATUSES = [429, 500, 503]
+
+
+def api_error(status):
+    '''
+    APIError raised by gspread for an HTTP error status
+    '''
+    response = requests.models.Response()
+    response.status_code = status
+    response._content = json.dumps({'error': {
+        'code': status,
+        'message': STATUS_MESSAGES.get(status, 'Error'),
+    }}).encode('utf-8')
+    return gspread.exceptions.APIError(response)
+
+
+class FakeWorksheet:
+    '''
+    errors are the statuses raised by the next get_all_records calls, one
+    per call; error_rate is the share of the other calls failing with a
+    status of RANDOM_ERROR_STATUSES
+    '''
+
+    def __init__(self, title, df, latency=0.0, errors=(), error_rate=0.0,
+                 rng=None):
+        self.title = title
+        self.df = df
+        self.latency = latency
+        self.errors = list(errors)
+        self.error_rate = error_rate
+        self.rng = rng or random.Random(0)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get_all_records(self):
+        # A fresh list of dicts on every call, as the API returns
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+            status = self.errors.pop(0) if self.errors else None
+            if status is None and self.rng.random() < self.error_rate:
+                status = self.rng.choice(RANDOM_ERROR_STATUSES)
+        if status is not None:
+            raise api_error(status)
+        return self.df.to_dict('records')
+
+
+class FakeWorkbook:
+
+    def __init__(self, worksheets):
+        self.sheets = {sheet.title: sheet for sheet in worksheets}
+
+    def worksheets(self):
+        return list(self.sheets.values())
+
+    def worksheet(self, title):
+        if title not in self.sheets:
+            raise gspread.WorksheetNotFound(title)
+        return self.sheets[title]
+
+
+class FakeClient:
+    '''
+    Client whose workbook holds the given sheets (name -> DataFrame);
+    latency is the seconds every get_all_records call waits. errors maps a
+    sheet name to the statuses raised by its next reads, and error_rate is
+    the share of reads failing at random (seeded by seed).
+    '''
+
+    def __init__(self, sheets, latency=0.0, errors=None, error_rate=0.0,
+                 seed=0):
+        errors = errors or {}
+        rng = random.Random(seed)
+        self.workbook = FakeWorkbook([
+            FakeWorksheet(title, df, latency, errors.get(title, ()),
+                          error_rate, rng)
+            for title, df in sheets.items()])
+        self.opens = 0
+
+    def open_by_key(self, key):
+        self.opens += 1
+        return self.workbook
@@ -0,0 +1,157 @@
+'''
+Synthetic daily-actions sheets for the tests and the benchmarks.
+
+The sheets have the columns of the eight DAILY_ACTIONS_SHEET_DICT sheets,
+the 33 departamentos and 1,121 municipios of the gazetteer, a few hundred
+users, dates in the formats of DATE_FORMATS, case and accent misspellings,
+%20-encoded and whitespace noise, and a share of duplicated rows (some
+exact, some differing only in that noise). synthetic_columns gives
+columns of mixed values for the cleaning stage.
+'''
+import unicodedata
+import numpy as np
+import pandas as pd
+from src.utils import DAILY_ACTIONS_SHEET_DICT, GAZETTEER_PATH
+
+TIPOS_USUARIO = ['Enlace Departamental', 'Enlace Municipal', 'Coordinador',
+                 'Delegado', 'Asesor']
+
+ACTIVIDADES = ['Reunión con la mesa de libertad religiosa',
+               'Visita a la alcaldía',
+               'Mesa de trabajo con líderes religiosos',
+               'Capacitación en política pública',
+               'Seguimiento al plan de desarrollo', 'Socialización del comité']
+
+# Share of the rows of every sheet
+SHEET_WEIGHTS = [0.30, 0.08, 0.12, 0.05, 0.20, 0.10, 0.07, 0.08]
+
+DATE_PATTERNS = ['%d/%m/%Y', '%d/%m/%y', '%Y-%m-%d', '%d-%m-%Y',
+                 '%d/%m/%Y %H:%M:%S']
+DATE_WEIGHTS = [0.80, 0.05, 0.08, 0.05, 0.02]
+
+
+def municipios():
+    '''
+    Departamento and name of every municipio of the gazetteer
+    '''
+    table = pd.read_csv(GAZETTEER_PATH, dtype=str)
+    return (table['departamento'].to_numpy(dtype=object),
+            table['municipio'].to_numpy(dtype=object))
+
+
+def strip_accents(value):
+    return ''.join(c for c in unicodedata.normalize('NFKD', value)
+                   if not unicodedata.combining(c))
+
+
+def add_misspellings(values, rng, rate):
+    '''
+    Write a share rate of values as typed by hand: upper or lower case, or
+    without accents
+    '''
+    values = pd.Series(values, dtype=object)
+    variant = np.where(rng.random(len(values)) < rate,
+                       rng.integers(0, 3, len(values)), -1)
+    for kind, spell in enumerate([str.upper, str.lower, strip_accents]):
+        if (variant == kind).any():
+            values[variant == kind] = values[variant == kind].map(spell)
+    return values.to_numpy()
+
+
+def add_noise(values, rng, rate):
+    '''
+    %20-encode the spaces and pad with whitespace a share rate of values
+    '''
+    values = pd.Series(values, dtype=object)
+    noisy = rng.random(len(values)) < rate
+    if noisy.any():
+        changed = values[noisy].str.replace(' ', '%20', regex=False)
+        pad = rng.random(noisy.sum()) < 0.5
+        changed[pad] = ' ' + changed[pad] + ' '
+        values[noisy] = changed
+    return values.to_numpy()
+
+
+def synthetic_sheet(n_rows, rng, noise_rate=0.05, duplicate_rate=0.05):
+    '''
+    Raw sheet as read from Google Sheets (all values text)
+    '''
+    n_unique = max(1, int(round(n_rows * (1 - duplicate_rate))))
+    departamentos, names = municipios()
+    municipio = rng.integers(0, len(names), n_unique)
+    usuarios = np.array([f'usuario{k:03d}@libertadreligiosa.gov.co'
+                         for k in range(400)], dtype=object)
+
+    start = np.datetime64('2023-01-01')
+    days = rng.integers(0, 730, n_unique).astype('timedelta64[D]')
+    dates = pd.Series(start + days)
+    pattern = rng.choice(len(DATE_PATTERNS), n_unique, p=DATE_WEIGHTS)
+    fecha = np.empty(n_unique, dtype=object)
+    for i, fmt in enumerate(DATE_PATTERNS):
+        fecha[pattern == i] = dates[pattern == i].dt.strftime(fmt).to_numpy()
+    fecha[rng.random(n_unique) < 0.001] = ''
+
+    actividad = (pd.Series(rng.choice(ACTIVIDADES, n_unique)) + ' '
+                 + pd.Series(rng.integers(0, 10**6, n_unique)).astype(str))
+    df = pd.DataFrame({
+        'Usuario': rng.choice(usuarios, n_unique),
+        'Tipo Usuario': rng.choice(TIPOS_USUARIO, n_unique),
+        'Departamento': add_noise(
+            add_misspellings(departamentos[municipio], rng, noise_rate),
+            rng, noise_rate),
+        'Municipio': add_noise(
+            add_misspellings(names[municipio], rng, noise_rate),
+            rng, noise_rate),
+        'Actividades rutinarias': add_noise(
+            actividad.to_numpy(dtype=object), rng, noise_rate),
+        'Fecha': fecha,
+    })
+
+    # Duplicates of earlier rows, half of them with their text re-noised
+    n_duplicates = n_rows - n_unique
+    if n_duplicates > 0:
+        duplicates = df.iloc[rng.integers(0, n_unique, n_duplicates)]
+        duplicates = duplicates.reset_index(drop=True)
+        renoise = rng.random(n_duplicates) < 0.5
+        for col in ['Municipio', 'Actividades rutinarias']:
+            values = duplicates[col].to_numpy(dtype=object)
+            values[renoise] = add_noise(values[renoise], rng, 1.0)
+            duplicates[col] = values
+        df = pd.concat([df, duplicates], ignore_index=True)
+    return df
+
+
+def synthetic_sheets(n_rows, seed=0, sheet_dict=DAILY_ACTIONS_SHEET_DICT,
+                     **kwargs):
+    '''
+    Sheet name -> raw DataFrame for every sheet of sheet_dict, n_rows in total
+    '''
+    rng = np.random.default_rng(seed)
+    weights = np.array(SHEET_WEIGHTS[:len(sheet_dict)])
+    sizes = np.floor(weights / weights.sum() * n_rows).astype(int)
+    sizes[0] += n_rows - sizes.sum()
+    return {sheet: synthetic_sheet(int(size), rng, **kwargs)
+            for sheet, size in zip(sheet_dict, sizes)}
+
+
+def synthetic_columns(n_rows, seed=123):
+    '''
+    Raw columns of %20 and whitespace noise, mixed Python types and
+    missing values, as clean_series may get them
+    '''
+    rng = np.random.default_rng(seed)
+    words = np.array(['Bogotá', 'Cali', 'Medellín', 'San%20Andrés', ' Pasto ',
+                      'El%20Carmen%20de%20Bolívar', 'Tumaco\t', '%20', ''])
+    mixed = np.array(['texto', 'a%20b ', 7, 3.5, 0.1, np.nan, None, True,
+                      '  '], dtype=object)
+    return {
+        'Municipio': pd.Series(rng.choice(words, n_rows), dtype=object),
+        'Actividades rutinarias': pd.Series(
+            [f' Reunión%20con%20{i} ' if i % 3 else f'Visita {i}'
+             for i in rng.integers(0, 10**6, n_rows)],
+            dtype=object),
+        'Usuario': pd.Series(rng.choice(mixed, n_rows), dtype=object),
+        'Fecha': pd.Series(rng.integers(1, 10**4, n_rows), dtype=object),
+        'Acción': pd.Series(pd.Categorical(
+            rng.choice(['PPLR', ' POT', 'PD%20'], n_rows))),
+    }
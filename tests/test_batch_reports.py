@@ -0,0 +1,12 @@
+import pandas as pd
+from src.visualization.batch_reports import partitions
+
+
+def test_colliding_names_get_their_own_file():
+    df = pd.DataFrame({'Departamento': ['Bogotá', 'bogota', 'BOGOTÁ ',
+                                        'Consolidado Nacional', 'Cauca']})
+    names = [name for name, _, _ in partitions(df)]
+    assert len(set(names)) == len(names) == 6
+    assert names[0] == 'consolidado_nacional' and 'cauca' in names
+    # Names are the same from one run to the next
+    assert names == [name for name, _, _ in partitions(df)]
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic import synthetic_columns
+from src.data.make_dataset import DailyActionsWrangling
+
+
+def legacy(s):
+    '''
+    Per-cell clean_column, the reference of clean_series
+    '''
+    return s.apply(DailyActionsWrangling.clean_column)
+
+
+def assert_same_as_legacy(s):
+    cleaned = DailyActionsWrangling.clean_series(s)
+    values = cleaned.astype(object).tolist()
+    expected = legacy(s).astype(object).tolist()
+    # Only the missing values of a categorical are not text
+    missing = s.isna().to_numpy()
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        missing[:] = False
+    assert all(type(v) is str for v in cleaned[~missing])
+    assert cleaned[missing].isna().all()
+    assert [str(v) for v in values] == [str(v) for v in expected]
+    assert cleaned.index.equals(s.index)
+    return cleaned
+
+
+def test_percent_20_is_a_space():
+    s = pd.Series(['San%20Andrés', 'El%20Carmen%20de%20Bolívar', '%20',
+                   ' Pasto%20', 'a%20%20b'], dtype=object)
+    cleaned = assert_same_as_legacy(s)
+    assert cleaned.tolist() == ['San Andrés', 'El Carmen de Bolívar', '',
+                                'Pasto', 'a  b']
+
+
+def test_patterns_ignore_case():
+    patterns = {r'\bcra\b': 'Carrera'}
+    s = pd.Series(['CRA 7', 'cra 8', 'Cra.9'], dtype=object)
+    cleaned = DailyActionsWrangling.clean_series(s, patterns)
+    assert cleaned.tolist() == ['Carrera 7', 'Carrera 8', 'Carrera.9']
+
+
+def test_mixed_types_are_cleaned_as_text():
+    # 1, 1.0 and True factorize together, their text differs
+    s = pd.Series([1, 1.0, '1', True, 3.5, 'a%20b ', 0], dtype=object)
+    cleaned = assert_same_as_legacy(s)
+    assert cleaned.tolist() == ['1', '1.0', '1', 'True', '3.5', 'a b', '0']
+
+
+def test_missing_values_keep_their_text():
+    s = pd.Series(['x', None, np.nan, 'None', '  ', pd.NA], dtype=object)
+    cleaned = assert_same_as_legacy(s)
+    assert cleaned.tolist() == ['x', 'None', 'nan', 'None', '', '<NA>']
+
+
+def test_categorical_keeps_its_dtype():
+    s = pd.Series(pd.Categorical(['PD%20', ' POT', 'PD%20', 'PPLR']))
+    cleaned = assert_same_as_legacy(s)
+    assert isinstance(cleaned.dtype, pd.CategoricalDtype)
+    assert sorted(cleaned.cat.categories) == ['PD', 'POT', 'PPLR']
+
+
+def test_categorical_keeps_missing_values():
+    s = pd.Series(pd.Categorical(['POT%20', None, 'PD']))
+    cleaned = assert_same_as_legacy(s)
+    assert isinstance(cleaned.dtype, pd.CategoricalDtype)
+    assert cleaned.isna().tolist() == [False, True, False]
+
+
+@pytest.mark.parametrize('values', [
+    ['POT', ' POT', 'PD'],
+    ['POT', ' POT', None],
+])
+def test_categorical_falls_back_to_text(values):
+    # Categories equal once cleaned
+    s = pd.Series(pd.Categorical(values))
+    cleaned = assert_same_as_legacy(s)
+    assert cleaned.dtype == object
+
+
+def test_empty_column():
+    s = pd.Series([], dtype=object)
+    assert len(DailyActionsWrangling.clean_series(s)) == 0
+
+
+@pytest.mark.parametrize('name', list(synthetic_columns(1)))
+def test_synthetic_columns_match_clean_column(name):
+    assert_same_as_legacy(synthetic_columns(5000, seed=7)[name])
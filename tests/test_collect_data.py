@@ -0,0 +1,194 @@
+import threading
+import time
+import gspread
+import pandas as pd
+import pytest
+import requests
+from fake_gspread import FakeClient, api_error
+from src.data import collect_data
+from src.data.collect_data import RequestScheduler, SingleFlight, TokenBucket
+
+
+class Clock:
+    '''
+    Fake monotonic clock, advanced by its own sleep
+    '''
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Flaky:
+    '''
+    Callable raising the given exceptions on its first calls
+    '''
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def scheduler(clock, max_retries=5):
+    '''
+    RequestScheduler whose quota and backoff run on clock
+    '''
+    instance = RequestScheduler(max_retries=max_retries, backoff_base=1,
+                                backoff_max=32, sleep=clock.sleep)
+    instance.bucket = TokenBucket(100, 100, clock=clock, sleep=clock.sleep)
+    return instance
+
+
+def test_token_bucket_spends_its_burst_then_waits():
+    clock = Clock()
+    bucket = TokenBucket(rate=2, capacity=3, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == pytest.approx([0.5, 0.5])
+    # Idle time refills up to capacity only
+    clock.now += 60
+    for _ in range(3):
+        bucket.acquire()
+    assert len(clock.sleeps) == 2
+
+
+@pytest.mark.parametrize('error', [
+    api_error(429), api_error(500), api_error(503),
+    requests.exceptions.ConnectionError(), requests.exceptions.Timeout(),
+])
+def test_transient_errors_are_retried(error):
+    clock = Clock()
+    func = Flaky(error, error)
+    assert scheduler(clock).call(func) == 'ok'
+    assert func.calls == 3
+    # Full jitter within the exponential backoff
+    assert len(clock.sleeps) == 2
+    assert 0 <= clock.sleeps[0] <= 1 and 0 <= clock.sleeps[1] <= 2
+
+
+@pytest.mark.parametrize('error', [api_error(403), api_error(404),
+                                   ValueError('bad sheet')])
+def test_other_errors_are_not_retried(error):
+    clock = Clock()
+    func = Flaky(error)
+    with pytest.raises(type(error)):
+        scheduler(clock).call(func)
+    assert func.calls == 1 and clock.sleeps == []
+
+
+def test_retries_give_up():
+    clock = Clock()
+    func = Flaky(*[api_error(429)] * 10)
+    with pytest.raises(gspread.exceptions.APIError) as raised:
+        scheduler(clock, max_retries=3).call(func)
+    assert raised.value.code == 429
+    assert func.calls == 4
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return object()
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(
+        flight.do('key', work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(
+        flight.do('key', work))) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    # Followers are waiting on the leader's call
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert len(calls) == 1
+    assert len(results) == 5 and all(r is results[0] for r in results)
+    # Once done, the next call runs again
+    assert flight.do('key', work) is not results[0]
+
+
+def test_single_flight_shares_the_exception():
+    flight = SingleFlight()
+    with pytest.raises(ValueError):
+        flight.do('key', Flaky(ValueError('boom')))
+    assert flight.calls == {}
+
+
+@pytest.fixture
+def sheets():
+    return {f'Hoja {i}': pd.DataFrame({'Fecha': ['01/02/2024'] * 3,
+                                       'Usuario': ['a', 'b', str(i)]})
+            for i in range(3)}
+
+
+@pytest.fixture
+def no_wait(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(collect_data, 'scheduler', scheduler(clock))
+    return clock
+
+
+def test_sheet_reads_are_retried(sheets, no_wait):
+    gc = FakeClient(sheets, errors={'Hoja 1': [429, 503]})
+    frames = collect_data.read_google_spreadsheets(list(sheets), gc=gc)
+    for frame, df in zip(frames, sheets.values()):
+        pd.testing.assert_frame_equal(frame, df)
+    assert gc.workbook.sheets['Hoja 1'].calls == 3
+    assert gc.workbook.sheets['Hoja 0'].calls == 1
+
+
+def test_random_errors_are_retried(sheets, no_wait):
+    gc = FakeClient(sheets, error_rate=0.5, seed=1)
+    for _ in range(5):
+        collect_data.read_google_spreadsheets(list(sheets), gc=gc)
+    calls = sum(sheet.calls for sheet in gc.workbook.worksheets())
+    assert calls > 15
+
+
+def test_permission_error_is_raised(sheets, no_wait):
+    gc = FakeClient(sheets, errors={'Hoja 2': [403]})
+    with pytest.raises(gspread.exceptions.APIError) as raised:
+        collect_data.read_google_spreadsheets(list(sheets), gc=gc)
+    assert raised.value.code == 403
+    assert gc.workbook.sheets['Hoja 2'].calls == 1
+
+
+def test_concurrent_reads_share_one_fetch(sheets):
+    gc = FakeClient(sheets, latency=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        collect_data.read_google_spreadsheets(list(sheets), gc=gc)))
+        for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(results) == 4
+    assert all(frames is results[0] for frames in results)
+    assert gc.opens == 1
+    assert all(sheet.calls == 1 for sheet in gc.workbook.worksheets())
@@ -0,0 +1,164 @@
+import threading
+import pytest
+from src.data.dataset_store import DatasetStore
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Source:
+    '''
+    load function counting its calls; fails while failing is set and waits
+    for release when given one
+    '''
+
+    def __init__(self):
+        self.calls = []
+        self.failing = False
+        self.release = None
+
+    def __call__(self, refresh, previous, **options):
+        self.calls.append((refresh, previous, options))
+        if self.release is not None:
+            self.release.wait(5)
+        if self.failing:
+            raise ConnectionError('Sheets unavailable')
+        return len(self.calls)
+
+
+def wait_update(store):
+    thread = store.updating
+    if thread is not None:
+        thread.join(5)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def source():
+    return Source()
+
+
+@pytest.fixture
+def store(source, clock):
+    return DatasetStore(source, ttl=600, retry_backoff=30, clock=clock)
+
+
+def test_first_load_raises(store, source):
+    source.failing = True
+    with pytest.raises(ConnectionError):
+        store.get()
+    assert store.current is None
+    source.failing = False
+    assert store.get().data == 2
+    # The first load reads the local data
+    assert source.calls[-1][0] is False
+
+
+def test_expired_version_is_served_while_rebuilding(store, source, clock):
+    first = store.get()
+    source.release = threading.Event()
+    clock.now = 601
+    # Callers get the expired version at once, the rebuild runs behind
+    assert store.get() is first
+    assert store.get() is first
+    assert store.updating is not None
+    source.release.set()
+    wait_update(store)
+    assert len(source.calls) == 2
+    second = store.get()
+    assert second.version == 2 and second.data == 2
+    # A TTL rebuild refreshes from the source with the data it replaces
+    assert source.calls[-1][:2] == (True, 1)
+
+
+def test_failed_rebuild_keeps_serving_and_backs_off(store, source, clock,
+                                                    caplog):
+    first = store.get()
+    source.failing = True
+    clock.now = 601
+    assert store.get() is first
+    wait_update(store)
+    assert 'Dataset rebuild failed' in caplog.text
+    assert store.failures == 1 and store.retry_at == 631
+
+    # No attempt before the backoff is over
+    clock.now = 630
+    assert store.get() is first
+    assert store.updating is None and len(source.calls) == 2
+    clock.now = 632
+    assert store.get() is first
+    wait_update(store)
+    assert len(source.calls) == 3 and store.retry_at == 632 + 60
+
+    # Back to normal once a rebuild succeeds
+    source.failing = False
+    clock.now = 700
+    store.get()
+    wait_update(store)
+    assert store.get().version == 2
+    assert store.failures == 0 and store.retry_at is None
+
+
+def test_backoff_stops_growing_at_ttl(store, source, clock):
+    store.get()
+    source.failing = True
+    for _ in range(8):
+        clock.now = max(clock.now, store.retry_at or 0) + 601
+        store.get()
+        wait_update(store)
+    assert store.retry_at == clock.now + 600
+
+
+def test_explicit_refresh_raises_to_its_caller(store, source):
+    first = store.get()
+    source.failing = True
+    with pytest.raises(ConnectionError):
+        store.refresh()
+    assert store.get() is first
+
+
+def test_reload_keeps_options(store, source):
+    first = store.get()
+    version = store.reload(start='2024-01')
+    assert source.calls[-1] == (False, 1, {'start': '2024-01'})
+    # A caller asking for the same reload while it ran shares its result
+    assert store.reload(seen=first, start='2024-01') is version
+    assert len(source.calls) == 2
+
+
+def test_refresh_goes_back_to_default_options(store, source, clock):
+    store.get()
+    store.reload(start='2024-01')
+    clock.now = 601
+    store.get()
+    wait_update(store)
+    assert source.calls[-1] == (True, 2, {})
+    assert store.options == {}
+
+
+def test_invalidate_rebuilds_in_background(store, source):
+    first = store.get()
+    source.release = threading.Event()
+    store.invalidate(seen=first)
+    # Not expired by age, still rebuilt behind while first is served
+    assert store.get() is first
+    assert store.updating is not None
+    source.release.set()
+    wait_update(store)
+    second = store.get()
+    assert second.version == 2 and not store.stale
+    assert source.calls[-1][:2] == (True, 1)
+    # A caller invalidating the version it saw does not drop a newer one
+    store.invalidate(seen=first)
+    assert store.get() is second and store.updating is None
+    assert len(source.calls) == 2
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+from src.data.dedupe import FingerprintSet, drop_duplicate_rows, \
+    frame_digest, row_fingerprints
+
+
+def frame():
+    return pd.DataFrame({
+        'Departamento': ['Cauca', 'Cauca', 'Antioquia', 'Cauca'],
+        'Usuario': ['ana', 'ana', 'luis', 'ana'],
+        'Actividades rutinarias': ['a', 'a', 'b', 'c'],
+    })
+
+
+def test_categorical_and_object_columns_hash_alike():
+    df = frame()
+    categorical = df.astype({'Departamento': 'category',
+                             'Usuario': 'category'})
+    np.testing.assert_array_equal(row_fingerprints(df),
+                                  row_fingerprints(categorical))
+
+
+def test_drop_duplicate_rows_keeps_the_first():
+    df = drop_duplicate_rows(frame())
+    assert df['Actividades rutinarias'].tolist() == ['a', 'b', 'c']
+    assert df.index.tolist() == [0, 1, 2]
+
+
+def test_seen_rows_are_dropped_and_new_ones_added():
+    df = frame()
+    seen = FingerprintSet()
+    drop_duplicate_rows(df.iloc[:2], seen=seen)
+    assert len(seen) == 1
+    df = drop_duplicate_rows(df.iloc[2:], seen=seen)
+    assert df['Actividades rutinarias'].tolist() == ['b', 'c']
+    assert len(seen) == 3
+    assert seen.contains(row_fingerprints(frame())).all()
+
+
+def test_save_and_load(tmp_path):
+    seen = FingerprintSet(row_fingerprints(frame()))
+    path = str(tmp_path / 'seen' / 'sheet.npy')
+    seen.save(path)
+    loaded = FingerprintSet.load(path)
+    np.testing.assert_array_equal(loaded.values, seen.values)
+    assert loaded.values.dtype == np.uint64
+    # A set never saved loads empty
+    assert len(FingerprintSet.load(str(tmp_path / 'missing.npy'))) == 0
+
+
+def test_frame_digest_changes_with_values_and_columns():
+    df = frame()
+    assert frame_digest(df) == frame_digest(frame())
+    assert frame_digest(df) != frame_digest(df.iloc[:3])
+    assert frame_digest(df) != frame_digest(df.rename(columns={
+        'Usuario': 'usuario'}))
+    # The index is left out
+    assert frame_digest(df) == frame_digest(df.set_axis(range(4, 8)))
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.features.filter_index import FilterIndex
+
+ACCIONES = ['PPLR', 'Cooperación', 'Comités LR', 'POT', 'Enlaces']
+
+
+def random_frame(n_rows, seed):
+    '''
+    Filter columns with missing values: an ordered 'Acción' (with an unused
+    category), an unordered categorical with unused categories, text and
+    dates with NaT
+    '''
+    rng = np.random.default_rng(seed)
+    departamentos = np.array(['Cauca', 'Antioquia', 'Nariño', None],
+                             dtype=object)
+    departamento = rng.choice(departamentos, n_rows, p=[0.4, 0.3, 0.2, 0.1])
+    fecha = pd.Timestamp('2024-01-01') + pd.to_timedelta(
+        rng.integers(0, 120, n_rows), unit='D')
+    fecha = fecha.where(rng.random(n_rows) > 0.1)
+    return pd.DataFrame({
+        'Acción': pd.Categorical(rng.choice(ACCIONES[:-1], n_rows),
+                                 categories=ACCIONES, ordered=True),
+        'Departamento': pd.Categorical(
+            departamento, categories=['Cauca', 'Antioquia', 'Nariño', 'Meta']),
+        'Usuario': rng.choice(np.array(['ana', 'luis', 'eva', None],
+                                       dtype=object), n_rows),
+        'Fecha': fecha,
+    })
+
+
+def build(df):
+    return FilterIndex(df, ['Acción', 'Departamento', 'Usuario'], ['Fecha'])
+
+
+def random_positions(n_rows, rng, share):
+    return np.flatnonzero(rng.random(n_rows) < share)
+
+
+def expected_options(s):
+    present = s.dropna()
+    if isinstance(s.dtype, pd.CategoricalDtype) and s.cat.ordered:
+        return [c for c in s.cat.categories if c in set(present)]
+    return sorted(set(present))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_options(seed):
+    df = random_frame(500, seed)
+    index = build(df)
+    rng = np.random.default_rng(seed)
+    for col in ['Acción', 'Departamento', 'Usuario']:
+        assert index.options(col) == expected_options(df[col])
+        for share in (0.01, 0.3, 1.0):
+            positions = random_positions(len(df), rng, share)
+            assert index.options(col, positions) == expected_options(
+                df[col].iloc[positions])
+    # Ordered categories keep their order, not the alphabetical one
+    assert index.options('Acción') == ACCIONES[:-1]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_select(seed):
+    df = random_frame(500, seed)
+    index = build(df)
+    rng = np.random.default_rng(seed)
+    queries = {
+        'Acción': [['PPLR'], ['POT', 'Cooperación'], ['Enlaces'], ACCIONES],
+        'Departamento': [['Nariño'], ['Cauca', 'Antioquia'], ['Meta'],
+                         ['Narnia']],
+        'Usuario': [['eva'], ['ana', 'luis', 'eva'], []],
+    }
+    for col, value_lists in queries.items():
+        for values in value_lists:
+            mask = df[col].isin(values).to_numpy()
+            assert index.select(col, values).tolist() == (
+                np.flatnonzero(mask).tolist())
+            # Small and large positions go through both strategies
+            for share in (0.01, 0.5, 1.0):
+                positions = random_positions(len(df), rng, share)
+                expected = positions[mask[positions]]
+                result = index.select(col, values, positions)
+                assert result.tolist() == expected.tolist()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_select_range_and_from(seed):
+    df = random_frame(500, seed)
+    index = build(df)
+    rng = np.random.default_rng(seed)
+    fecha = df['Fecha']
+    assert index.bounds('Fecha') == (fecha.min(), fecha.max())
+    for start, end in [('2024-01-10', '2024-02-01'),
+                       ('2024-03-01', '2024-03-02'),
+                       ('2023-01-01', '2025-01-01'),
+                       ('2024-02-01', '2024-01-01')]:
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        mask = ((fecha >= start) & (fecha < end)).to_numpy()
+        from_mask = ((fecha >= start) | fecha.isna()).to_numpy()
+        assert index.select_range('Fecha', start, end).tolist() == (
+            np.flatnonzero(mask).tolist())
+        assert index.select_from('Fecha', start).tolist() == (
+            np.flatnonzero(from_mask).tolist())
+        for share in (0.01, 0.5, 1.0):
+            positions = random_positions(len(df), rng, share)
+            result = index.select_range('Fecha', start, end, positions)
+            assert result.tolist() == positions[mask[positions]].tolist()
+            result = index.select_from('Fecha', start, positions)
+            assert result.tolist() == positions[from_mask[positions]].tolist()
+
+
+def test_empty_positions():
+    df = random_frame(200, 0)
+    index = build(df)
+    empty = np.array([], dtype=np.intp)
+    assert index.options('Departamento', empty) == []
+    assert len(index.select('Departamento', ['Cauca'], empty)) == 0
+    assert len(index.select_range('Fecha', pd.Timestamp('2024-01-01'),
+                                  pd.Timestamp('2025-01-01'), empty)) == 0
+    assert len(index.select_from('Fecha', pd.Timestamp('2024-01-01'),
+                                 empty)) == 0
+
+
+def test_all_nat_fecha():
+    df = random_frame(200, 1)
+    df['Fecha'] = pd.NaT
+    index = build(df)
+    assert index.bounds('Fecha') is None
+    start, end = pd.Timestamp('2024-01-01'), pd.Timestamp('2025-01-01')
+    assert len(index.select_range('Fecha', start, end)) == 0
+    positions = np.arange(0, 200, 3)
+    assert len(index.select_range('Fecha', start, end, positions)) == 0
+    # Rows without Fecha are kept by select_from, as in the Detalle view
+    assert index.select_from('Fecha', start).tolist() == list(range(200))
+    assert index.select_from('Fecha', start, positions).tolist() == (
+        positions.tolist())
@@ -0,0 +1,35 @@
+import pandas as pd
+from src.data.gazetteer import Gazetteer
+
+
+def test_table_is_found_from_any_working_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    gazetteer = Gazetteer(memo_path=None)
+    assert len(gazetteer.departamentos) >= 33
+
+
+def test_spellings_are_canonicalized(session_gazetteer):
+    df = pd.DataFrame({'Departamento': ['ANTIOQUIA', 'antioquia', 'Narnia'],
+                       'Municipio': ['medellin', 'Medellín ', 'Cair']})
+    df = session_gazetteer.canonicalize(df)
+    assert df['Departamento'].tolist() == ['Antioquia', 'Antioquia', 'Narnia']
+    assert df['Municipio'].tolist() == ['Medellín', 'Medellín', 'Cair']
+
+
+def test_missing_values_stay_missing(session_gazetteer):
+    df = pd.DataFrame({'Departamento': ['Antioquia', 'Cauca', None],
+                       'Municipio': ['medellin', None, 'popayan']})
+    df = session_gazetteer.canonicalize(df)
+    assert df['Departamento'].tolist()[:2] == ['Antioquia', 'Cauca']
+    assert df['Municipio'].tolist()[::2] == ['Medellín', 'popayan']
+    assert df['Departamento'].isna().tolist() == [False, False, True]
+    assert df['Municipio'].isna().tolist() == [False, True, False]
+
+    df = pd.DataFrame({'Departamento': pd.Categorical([None, None]),
+                       'Municipio': ['popayan', None]})
+    df = session_gazetteer.canonicalize(df)
+    assert df['Departamento'].isna().all()
+    assert df['Municipio'].tolist()[0] == 'popayan'
+    # Pairs with a missing value are not memoized
+    assert not any(pd.isna(v) for pair in session_gazetteer.memo
+                   for v in pair)
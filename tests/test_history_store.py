@@ -0,0 +1,100 @@
+import multiprocessing
+import threading
+import time
+import pandas as pd
+from src.data.history_store import HistoryStore, read_legacy_snapshot
+from src.data.make_dataset import DailyActionsWrangling
+from src.data.snapshot import write_snapshot
+
+
+def history_frame(version, n_months=6):
+    '''
+    A small cleaned dataset, different for every version
+    '''
+    fecha = pd.date_range('2024-01-15', periods=n_months, freq='MS')
+    return pd.DataFrame({
+        'Acción': pd.Categorical(['PPLR'] * n_months),
+        'Fecha': fecha,
+        'Departamento': ['Cauca'] * n_months,
+        'Municipio': ['Popayán'] * n_months,
+        'Usuario': [f'usuario{version}'] * n_months,
+    })
+
+
+def write_versions(directory, versions):
+    history = HistoryStore(directory)
+    for version in versions:
+        history.write(history_frame(version))
+
+
+def test_legacy_snapshot_gets_fecha_parsed(tmp_path):
+    path = str(tmp_path / 'daily_actions.parquet')
+    write_snapshot(pd.DataFrame({'Fecha': ['3/2/2024', '', 'mañana'],
+                                 'Usuario': ['ana', 'luis', 'ana']}), path)
+    df = read_legacy_snapshot(path)
+    assert df['Fecha'].tolist()[0] == pd.Timestamp('2024-02-03')
+    assert df['Fecha'].isna().tolist() == [False, True, True]
+    assert df.attrs['fecha_parse_failures'] == 1
+
+
+def test_parsed_snapshot_is_read_as_is(tmp_path):
+    path = str(tmp_path / 'daily_actions.parquet')
+    fecha = pd.to_datetime(['2024-02-03', None])
+    write_snapshot(pd.DataFrame({'Fecha': fecha, 'Usuario': ['ana', 'luis']}),
+                   path)
+    df = read_legacy_snapshot(path)
+    pd.testing.assert_series_equal(df['Fecha'], pd.Series(fecha, name='Fecha'),
+                                   check_dtype=False)
+    assert read_legacy_snapshot(str(tmp_path / 'missing.parquet')) is None
+
+
+def test_empty_history(tmp_path):
+    history = HistoryStore(str(tmp_path / 'history'))
+    assert history.read() is None
+    history.write(history_frame(0).head(0))
+    df = history.read()
+    assert len(df) == 0 and df.attrs['fecha_parse_failures'] == 0
+    pd.testing.assert_frame_equal(df, DailyActionsWrangling.empty_dataset())
+
+
+def test_concurrent_writers_and_readers(tmp_path):
+    directory = str(tmp_path / 'history')
+    HistoryStore(directory).write(history_frame(0))
+    context = multiprocessing.get_context('fork')
+    writers = [context.Process(target=write_versions,
+                               args=(directory, range(start, 40, 2)))
+               for start in (1, 2)]
+    for writer in writers:
+        writer.start()
+    history = HistoryStore(directory)
+    # Every read sees a whole history, never files removed under it
+    while any(writer.is_alive() for writer in writers):
+        df = history.read()
+        assert len(df) == 6 and df['Usuario'].nunique() == 1
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+    assert history.missing() == []
+    assert history.read()['Usuario'][0] in ('usuario38', 'usuario39')
+    assert [name for name in (tmp_path / 'history').iterdir()
+            if name.suffix == '.tmp'] == []
+
+
+def test_writers_wait_for_each_other(tmp_path):
+    history = HistoryStore(str(tmp_path / 'history'))
+    other = HistoryStore(str(tmp_path / 'history'))
+    written = threading.Event()
+
+    def write():
+        other.write(history_frame(1))
+        written.set()
+
+    with history.writing():
+        # Reentrant within the thread holding it
+        history.write(history_frame(0))
+        thread = threading.Thread(target=write)
+        thread.start()
+        time.sleep(0.2)
+        assert not written.is_set()
+    thread.join()
+    assert history.read()['Usuario'][0] == 'usuario1'
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+from fake_gspread import FakeClient
+from synthetic import synthetic_sheets
+from src.data.make_dataset import DailyActionsWrangling
+from src.utils import DAILY_ACTIONS_SHEET_DICT, SHEET_COLUMNS
+
+
+def phased(gc):
+    '''
+    Dataset of the whole-frame stages
+    '''
+    df = DailyActionsWrangling.concat_columns(DAILY_ACTIONS_SHEET_DICT, gc=gc)
+    df = DailyActionsWrangling.clean_all_columns(df)
+    df = DailyActionsWrangling.parse_dates(df)
+    return DailyActionsWrangling.format_columns(df)
+
+
+@pytest.fixture
+def sheets():
+    return synthetic_sheets(2000, seed=1)
+
+
+def test_streamed_matches_phased(sheets):
+    gc = FakeClient(sheets)
+    df = DailyActionsWrangling.make_daily_actions_dataset(None, gc=gc)
+    expected = phased(gc)
+    pd.testing.assert_frame_equal(df, expected, check_categorical=False)
+    failures = expected.attrs['fecha_parse_failures']
+    assert df.attrs['fecha_parse_failures'] == failures
+
+
+def test_empty_sheet(sheets):
+    # get_all_records gives [] for a sheet with only its header
+    name = list(DAILY_ACTIONS_SHEET_DICT)[2]
+    sheets[name] = pd.DataFrame()
+    gc = FakeClient(sheets)
+    df = DailyActionsWrangling.make_daily_actions_dataset(None, gc=gc)
+    expected = phased(gc)
+    assert len(df) == len(expected) > 0
+    assert DAILY_ACTIONS_SHEET_DICT[name] not in set(df['Acción'])
+    pd.testing.assert_frame_equal(df, expected, check_categorical=False)
+
+
+def test_every_sheet_empty():
+    gc = FakeClient({name: pd.DataFrame()
+                     for name in DAILY_ACTIONS_SHEET_DICT})
+    df = DailyActionsWrangling.make_daily_actions_dataset(None, gc=gc)
+    assert len(df) == 0
+    assert list(df.columns) == ['Acción'] + SHEET_COLUMNS
+
+
+def test_memory_report(sheets):
+    gc = FakeClient(sheets)
+    df = DailyActionsWrangling.concat_columns(DAILY_ACTIONS_SHEET_DICT, gc=gc)
+    df = DailyActionsWrangling.parse_dates(
+        DailyActionsWrangling.clean_all_columns(df))
+    report = DailyActionsWrangling.memory_report(
+        df, DailyActionsWrangling.format_columns(df))
+    assert report.index.tolist() == list(df.columns) + ['Total']
+    assert report.loc['Total', 'before'] == report['before'][:-1].sum()
+    # The dtype plan shrinks every text column
+    assert (report.loc['Departamento':'Actividades rutinarias', 'ratio']
+            < 1).all()
+    assert report.loc['Total', 'ratio'] < 0.5
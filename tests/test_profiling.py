@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+from fake_gspread import FakeClient
+from synthetic import synthetic_sheets
+from src.data.make_dataset import DataExploring, DailyActionsWrangling
+from src.data.profiling import ColumnProfiler, HeavyHitters, HyperLogLog
+from src.utils import DAILY_ACTIONS_SHEET_DICT
+
+
+@pytest.mark.parametrize('n', [10, 1000, 100_000])
+def test_hyperloglog_error_bound(n):
+    sketch = HyperLogLog(precision=12)
+    sketch.add(np.arange(n))
+    # Three standard errors of 1.04 / sqrt(2**12)
+    assert abs(sketch.count() - n) <= max(1, 3 * 1.04 / 64 * n)
+
+
+def test_hyperloglog_merge():
+    whole, first, second = (HyperLogLog(precision=10) for _ in range(3))
+    values = [f'valor{i}' for i in range(5000)]
+    whole.add(values)
+    first.add(values[:3000])
+    second.add(values[2000:])
+    first.merge(second)
+    np.testing.assert_array_equal(first.registers, whole.registers)
+    # Values seen again do not count twice
+    whole.add(values[:100])
+    assert whole.count() == first.count()
+
+
+def test_heavy_hitters_merge():
+    rng = np.random.default_rng(0)
+    values = pd.Series(rng.zipf(1.5, 20_000) % 500)
+    heavy = HeavyHitters(capacity=20)
+    for start in range(0, len(values), 1000):
+        chunk = values.iloc[start:start + 1000]
+        heavy.add_counts(chunk.value_counts(sort=False))
+    truth = values.value_counts()
+    assert len(heavy.counts) <= 20
+    assert heavy.error <= len(values) / 21
+    kept = truth.reindex(heavy.counts.index)
+    assert (heavy.counts <= kept).all()
+    assert (heavy.counts >= kept - heavy.error).all()
+    # Every value more frequent than the error is kept
+    assert set(truth[truth > heavy.error].index) <= set(heavy.counts.index)
+    assert heavy.top(3).index.tolist() == truth.index[:3].tolist()
+
+
+def test_column_profiler_exact():
+    s = pd.Series(['a', 'b', ' ', None, 'a', '', 'c', 'a', np.nan, 'b'])
+    profiler = ColumnProfiler('x')
+    for start in range(0, len(s), 3):
+        profiler.update(s.iloc[start:start + 3])
+    result = profiler.result()
+    assert result['rows'] == 10 and result['missing'] == 4
+    assert result['distinct'] == 3 and result['distinct_exact']
+    assert result['value_counts'] == {'a': 3, 'b': 2, 'c': 1}
+    assert result['top'][0] == ('a', 3) and result['top_error'] == 0
+    assert result['parse_failures'] is None
+
+
+def test_column_profiler_sketch_and_parse():
+    s = pd.Series([f'{i % 28 + 1:02d}/01/2024' for i in range(3000)]
+                  + ['no es fecha'] * 5 + [str(i) for i in range(3000)])
+    parse = DataExploring.date_parser('Fecha')
+    profiler = ColumnProfiler('Fecha', parse, exact_limit=100, top_k=3)
+    for start in range(0, len(s), 500):
+        profiler.update(s.iloc[start:start + 500])
+    result = profiler.result()
+    assert not result['distinct_exact'] and result['value_counts'] is None
+    assert abs(result['distinct'] - 3029) <= 3029 * 0.05
+    assert result['parse_failures'] == 3005
+    assert result['parse_failure_rate'] == 3005 / len(s)
+
+
+def test_profile_of_fetched_sheets():
+    gc = FakeClient(synthetic_sheets(300, seed=2))
+    frames = [df for _, df in DailyActionsWrangling.fetch_sheets(
+        DAILY_ACTIONS_SHEET_DICT, gc=gc)]
+    streamed = DataExploring().profile(
+        DailyActionsWrangling.fetch_sheets(DAILY_ACTIONS_SHEET_DICT, gc=gc))
+    whole = pd.concat(frames, ignore_index=True)
+    assert streamed.attrs['rows'] == len(whole)
+    pd.testing.assert_frame_equal(streamed, DataExploring().profile(frames))
+    expected = DataExploring().profile(whole, chunk_size=len(whole))
+    columns = ['rows', 'missing', 'distinct', 'parse_failures']
+    pd.testing.assert_frame_equal(streamed[columns],
+                                  expected.loc[streamed.index, columns])
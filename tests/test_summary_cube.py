@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.data.make_dataset import DailyActionsWrangling
+from src.features.filter_index import FilterIndex
+from src.features.summary_cube import MEASURE, SummaryCube
+
+ACCIONES = ['PPLR', 'Cooperación', 'Comités LR', 'POT']
+
+
+def random_frame(n_rows, seed):
+    '''
+    Cleaned rows with missing Departamento, Municipio and Fecha
+    '''
+    rng = np.random.default_rng(seed)
+    places = [('Cauca', 'Popayán'), ('Cauca', 'Piendamó'),
+              ('Antioquia', 'Medellín'), ('Antioquia', None), (None, None)]
+    departamento, municipio = zip(*[places[i] for i in rng.choice(
+        len(places), n_rows, p=[0.3, 0.2, 0.3, 0.1, 0.1])])
+    fecha = pd.Timestamp('2024-01-20') + pd.to_timedelta(
+        rng.integers(0, 90, n_rows), unit='D')
+    return pd.DataFrame({
+        'Acción': pd.Categorical(rng.choice(ACCIONES, n_rows),
+                                 categories=ACCIONES, ordered=True),
+        'Fecha': fecha.where(rng.random(n_rows) > 0.1),
+        'Departamento': pd.Categorical(departamento),
+        'Municipio': pd.Categorical(municipio),
+        'Tipo Usuario': rng.choice(['Enlace', 'Coordinador'], n_rows),
+    })
+
+
+def cuboid_counts(cube):
+    '''
+    Every cuboid as counts by its dimensions (missing values included)
+    '''
+    return {key: cells.astype({d: object for d in key})
+            .groupby(list(key), dropna=False)[MEASURE].sum()
+            for key, cells in cube.cuboids.items()}
+
+
+def assert_same_cube(cube, expected):
+    counts, expected_counts = cuboid_counts(cube), cuboid_counts(expected)
+    assert counts.keys() == expected_counts.keys()
+    for key in counts:
+        pd.testing.assert_series_equal(counts[key], expected_counts[key])
+
+
+@pytest.fixture
+def frames():
+    df = random_frame(1000, 0)
+    return df.iloc[:700], df.iloc[700:]
+
+
+def test_updated_with_added_rows(frames):
+    a, b = frames
+    cube = SummaryCube.from_frame(a).updated([b], [])
+    expected = SummaryCube.from_frame(DailyActionsWrangling.concat_frames(
+        [a, b]))
+    assert_same_cube(cube, expected)
+    assert cube.total() == 1000
+
+
+def test_updated_with_removed_rows(frames):
+    a, b = frames
+    whole = DailyActionsWrangling.concat_frames([a, b])
+    cube = SummaryCube.from_frame(whole).updated([], [b])
+    assert_same_cube(cube, SummaryCube.from_frame(a))
+    # Cells counted down to zero are dropped
+    assert (cube.cells[MEASURE] > 0).all()
+    # No change, the same cube
+    assert cube.updated() is cube
+
+
+def test_rollup(frames):
+    df = frames[0]
+    cube = SummaryCube.from_frame(df)
+    by_departamento = cube.rollup(['Departamento'])[MEASURE]
+    expected = df.groupby('Departamento', observed=True)['Acción'].size()
+    assert by_departamento.to_dict() == expected.to_dict()
+
+    filters = {'Departamento': ['Cauca'], 'Acción': ['PPLR', 'POT']}
+    table = cube.rollup(['Municipio'], 'Acción', filters)
+    rows = df[(df['Departamento'] == 'Cauca')
+              & df['Acción'].isin(['PPLR', 'POT'])]
+    expected = pd.crosstab(rows['Municipio'], rows['Acción'])
+    assert (table.loc[expected.index, expected.columns].to_numpy()
+            == expected.to_numpy()).all()
+
+    start, end = pd.Timestamp('2024-02-07'), pd.Timestamp('2024-03-10')
+    by_week = cube.rollup(['Semana'], start=start, end=end)[MEASURE]
+    week = df['Fecha'] - pd.to_timedelta(df['Fecha'].dt.dayofweek, unit='D')
+    # Whole weeks: from the Monday of start to the week starting by end
+    first = start - pd.Timedelta(days=start.dayofweek)
+    in_range = (week >= first) & (week <= end)
+    assert by_week.sum() == in_range.sum()
+    assert by_week.index.min() == first
+
+
+def test_total(frames):
+    df = frames[0]
+    cube = SummaryCube.from_frame(df)
+    assert cube.total() == len(df)
+    # Rows without Departamento or Municipio count in the total
+    by_rows = cube.rollup(['Departamento'])[MEASURE].sum()
+    assert cube.total() == len(df) > by_rows
+    filters = {'Acción': ['Cooperación'], 'Tipo Usuario': ['Enlace']}
+    assert cube.total(filters) == int(
+        ((df['Acción'] == 'Cooperación')
+         & (df['Tipo Usuario'] == 'Enlace')).sum())
+    assert cube.total({'Departamento': ['Narnia']}) == 0
+
+
+@pytest.mark.parametrize('history_start', ['2024-02', '2024-03', '2024-04'])
+def test_total_since_matches_detalle(frames, history_start):
+    df = frames[0]
+    cube = SummaryCube.from_frame(df)
+    # As select_history and the Detalle view do for the same history_start
+    since = pd.Timestamp(f'{history_start}-01')
+    index = FilterIndex(df, ['Acción', 'Tipo Usuario'], ['Fecha'])
+    detalle = index.select_from('Fecha', since)
+    # The month may start mid-week, the weeks before it are not counted
+    assert cube.total(since=since) == len(detalle)
+    filters = {'Acción': ['PPLR', 'POT'], 'Tipo Usuario': ['Enlace']}
+    for col, values in filters.items():
+        detalle = index.select(col, values, detalle)
+    assert cube.total(filters, since=since) == len(detalle)
+    by_week = cube.rollup(['Semana'], filters=filters, since=since)[MEASURE]
+    assert by_week.sum() == df.iloc[detalle]['Fecha'].notna().sum()
+
+
+def test_options(frames):
+    cube = SummaryCube.from_frame(frames[0])
+    assert cube.options('Departamento') == ['Antioquia', 'Cauca']
+    assert cube.options('Municipio', {'Departamento': ['Cauca']}) == [
+        'Piendamó', 'Popayán']
+    # 'Acción' keeps the order of the sheets
+    assert cube.options('Acción') == ACCIONES
+    assert cube.options('Acción', {'Departamento': ['Narnia']}) == []
@@ -0,0 +1,181 @@
+import os
+import pandas as pd
+import pytest
+from fake_gspread import FakeClient
+from synthetic import synthetic_sheets
+from src.data.history_store import HistoryStore
+from src.data.make_dataset import DailyActionsSync, DailyActionsWrangling
+from src.utils import DAILY_ACTIONS_SHEET_DICT
+
+SHEETS = list(DAILY_ACTIONS_SHEET_DICT)
+
+
+def full_rebuild(gc, directory):
+    '''
+    The history written from a dataset built from scratch
+    '''
+    history = HistoryStore(directory)
+    history.write(DailyActionsWrangling().make_daily_actions_dataset(gc=gc))
+    return history.read()
+
+
+def set_sheet(gc, name, df):
+    gc.workbook.sheets[name].df = df
+
+
+def sheet(gc, name):
+    return gc.workbook.sheets[name].df
+
+
+def assert_same_dataset(df, expected):
+    pd.testing.assert_frame_equal(df, expected, check_categorical=False)
+    failures = expected.attrs['fecha_parse_failures']
+    assert df.attrs['fecha_parse_failures'] == failures
+
+
+@pytest.fixture
+def gc():
+    return FakeClient(synthetic_sheets(2000, seed=2))
+
+
+@pytest.fixture
+def history(tmp_path):
+    return HistoryStore(str(tmp_path / 'history'))
+
+
+@pytest.fixture
+def expected(gc, tmp_path):
+    return lambda: full_rebuild(gc, str(tmp_path / 'expected'))
+
+
+def test_first_refresh_cleans_every_sheet(gc, history, expected):
+    sync = DailyActionsSync(history)
+    partitions, added, removed = sync.refresh(gc=gc)
+    assert sync.changed == SHEETS
+    assert len(added) == len(SHEETS) and removed is None
+    assert set(partitions) == set(history.manifest()['partitions'])
+    assert_same_dataset(history.read(), expected())
+
+
+def test_unchanged_sheets_are_not_cleaned_again(gc, history):
+    sync = DailyActionsSync(history)
+    sync.refresh(gc=gc)
+    version = history.version()
+    partitions, added, removed = sync.refresh(gc=gc)
+    assert sync.changed == [] and added == [] and removed == []
+    assert partitions == {} and history.version() == version
+
+
+def test_appended_rows(gc, history, expected):
+    sync = DailyActionsSync(history)
+    sync.refresh(gc=gc)
+    name = SHEETS[1]
+    extra = synthetic_sheets(300, seed=3)[SHEETS[0]]
+    # Copies of rows already kept are dropped as duplicates
+    set_sheet(gc, name, pd.concat([sheet(gc, name), extra,
+                                   sheet(gc, name).head(20)],
+                                  ignore_index=True))
+    partitions, added, removed = sync.refresh(gc=gc)
+    assert sync.changed == [name]
+    # Only the new rows are cleaned, nothing is removed
+    assert removed == []
+    assert len(added) == 1 and 0 < len(added[0]) <= len(extra)
+    assert set(partitions) == set(HistoryStore.partition(added[0]))
+    assert_same_dataset(history.read(), expected())
+
+
+def test_edited_sheet(gc, history, expected):
+    sync = DailyActionsSync(history)
+    sync.refresh(gc=gc)
+    before = history.read()
+    name = SHEETS[0]
+    df_new = sheet(gc, name).copy()
+    df_new.loc[0, 'Usuario'] = 'Usuario editado'
+    set_sheet(gc, name, df_new)
+    _, added, removed = sync.refresh(gc=gc)
+    assert sync.changed == [name]
+    accion = DAILY_ACTIONS_SHEET_DICT[name]
+    # Every row of the sheet is replaced
+    assert sum(len(df) for df in removed) == (before['Acción'] == accion).sum()
+    assert len(added) == 1 and set(added[0]['Acción']) == {accion}
+    df = history.read()
+    assert 'Usuario editado' in set(df['Usuario'])
+    assert_same_dataset(df, expected())
+
+
+def test_emptied_and_refilled_sheet(gc, history, expected):
+    sync = DailyActionsSync(history)
+    sync.refresh(gc=gc)
+    name = SHEETS[3]
+    df_new = sheet(gc, name)
+    # get_all_records gives [] for a sheet with only its header
+    set_sheet(gc, name, pd.DataFrame())
+    sync.refresh(gc=gc)
+    assert sync.changed == [name]
+    df = history.read()
+    assert DAILY_ACTIONS_SHEET_DICT[name] not in set(df['Acción'])
+    assert_same_dataset(df, expected())
+
+    set_sheet(gc, name, df_new)
+    sync.refresh(gc=gc)
+    assert sync.changed == [name]
+    assert_same_dataset(history.read(), expected())
+
+
+def test_state_survives_a_restart(gc, history, expected):
+    DailyActionsSync(history).refresh(gc=gc)
+    name = SHEETS[2]
+    extra = synthetic_sheets(200, seed=4)[SHEETS[0]]
+    set_sheet(gc, name, pd.concat([sheet(gc, name), extra],
+                                  ignore_index=True))
+    # A new process reads the sheet fingerprints from the history
+    sync = DailyActionsSync(HistoryStore(history.directory))
+    _, _, removed = sync.refresh(gc=gc)
+    assert sync.changed == [name] and removed == []
+    assert_same_dataset(history.read(), expected())
+
+
+def test_full_write_drops_the_sync_state(gc, history):
+    sync = DailyActionsSync(history)
+    sync.refresh(gc=gc)
+    history.write(history.read())
+    assert history.sheets() == {}
+    assert os.listdir(os.path.join(history.directory, 'seen')) == []
+    _, _, removed = sync.refresh(gc=gc)
+    assert sync.changed == SHEETS and removed is None
+
+
+def test_failed_refresh_keeps_nothing(gc, history):
+    sync = DailyActionsSync(history)
+    sync.refresh(gc=gc)
+    version, sheets = history.version(), history.sheets()
+    set_sheet(gc, SHEETS[0], sheet(gc, SHEETS[0]).head(10))
+    del gc.workbook.sheets[SHEETS[-1]]
+    with pytest.raises(Exception):
+        sync.refresh(gc=gc)
+    assert sync.refreshes == 1
+    assert history.version() == version and history.sheets() == sheets
+
+
+def test_missing_partition_is_rebuilt(gc, history, expected):
+    sync = DailyActionsSync(history)
+    sync.refresh(gc=gc)
+    month, entry = sorted(history.manifest()['partitions'].items())[0]
+    os.remove(history.path(month, entry['digest']))
+    with pytest.raises(FileNotFoundError):
+        history.read()
+    # The sheets did not change, but the next refresh rebuilds the history
+    partitions, added, removed = sync.refresh(gc=gc)
+    assert sync.changed == SHEETS and removed is None
+    assert history.missing() == []
+    assert_same_dataset(history.read(), expected())
+
+
+def test_every_sheet_empty(history):
+    gc = FakeClient({name: pd.DataFrame() for name in SHEETS})
+    sync = DailyActionsSync(history)
+    df = DailyActionsWrangling().make_daily_actions_dataset(gc=gc, sync=sync)
+    assert sync.changed == SHEETS
+    assert history.months() == []
+    assert_same_dataset(
+        df, DailyActionsWrangling().make_daily_actions_dataset(gc=gc))
@@ -0,0 +1,87 @@
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from src.features.text_index import (TextIndex, expand_ranges, query_terms,
+                                     tokenize)
+
+WORDS = ['Reunión', 'reunion', 'alcaldía,', 'Alcaldía.', 'NIÑOS', 'niños',
+         'líderes', 'mesa', 'mesa-técnica', 'comité', '12', 'plan_2024',
+         '(visita)', 'visita', 'capacitación', 'ñandú']
+
+
+def reference_tokens(text):
+    '''
+    Folded word tokens of a text, with plain Python
+    '''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return [token for token in re.split(r'[^\w]+', text) if token]
+
+
+def reference_search(texts, query, positions=None):
+    terms = reference_tokens(query)
+    rows = range(len(texts)) if positions is None else positions
+    return [row for row in rows
+            if not pd.isna(texts[row])
+            and all(any(token.startswith(term)
+                        for token in reference_tokens(texts[row]))
+                    for term in terms)]
+
+
+def random_texts(n_rows, seed):
+    rng = np.random.default_rng(seed)
+    texts = [' '.join(rng.choice(WORDS, rng.integers(1, 6)))
+             for _ in range(n_rows)]
+    return [None if rng.random() < 0.1 else text for text in texts]
+
+
+def test_expand_ranges():
+    starts, counts = np.array([5, 0, 9, 2]), np.array([2, 0, 3, 1])
+    assert expand_ranges(starts, counts).tolist() == [5, 6, 9, 10, 11, 2]
+
+
+def test_tokenize_folds_and_splits():
+    texts = ['Reunión con la alcaldía, NIÑOS', 'mesa-técnica mesa mesa']
+    vocabulary, tokens, text_positions = tokenize(pa.array(texts))
+    assert list(vocabulary) == sorted(vocabulary)
+    for position, text in enumerate(texts):
+        found = vocabulary[tokens[text_positions == position]].tolist()
+        assert found == reference_tokens(text)
+    assert query_terms('  Alcaldía, ÑANDÚ!  ') == ['alcaldia', 'nandu']
+    assert query_terms('') == [] and query_terms(None) == []
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_search_matches_reference(seed):
+    texts = random_texts(300, seed)
+    index = TextIndex(pd.Series(texts, dtype=object))
+    rng = np.random.default_rng(seed)
+    positions = np.flatnonzero(rng.random(len(texts)) < 0.4)
+    for query in ['reunion', 'REUNIÓN', 'alcald', 'alcaldía,', 'ninos',
+                  'ñan', 'mesa tecn', 'lider reun', 'plan_2', '1', 'visita)',
+                  'comite mesa 12', 'xyz', 'r', 'n']:
+        assert index.search(query).tolist() == reference_search(texts, query)
+        assert index.search(query, positions).tolist() == reference_search(
+            texts, query, positions)
+
+
+def test_repeated_tokens_and_missing_texts():
+    texts = ['mesa mesa mesa', None, 'Mesa, mesa-mesa', np.nan, 'visita']
+    index = TextIndex(pd.Series(texts, dtype=object))
+    rows = index.search('mesa')
+    # Every row once, in order, whatever the times the token repeats in it
+    assert rows.tolist() == [0, 2]
+    assert index.search('visita mesa').tolist() == []
+
+
+def test_empty_query_returns_positions():
+    index = TextIndex(pd.Series(random_texts(50, 0), dtype=object))
+    positions = np.array([3, 7, 11])
+    assert index.search('', positions) is positions
+    assert index.search(' ,;- ', positions) is positions
+    assert index.search('') is None
+    empty = np.array([], dtype=np.intp)
+    assert len(index.search('mesa', empty)) == 0